@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+"""
+Compares time needed for creating history comments by analyze_differences
+and by the previous DeepDiff based implementation, and checks that both of
+them create the same comments. Data resembling metric, metric template,
+probe and profiles history is generated, so no tenant data is needed.
+
+Usage: history_differences_benchmark.py [number of repetitions]
+"""
+import os
+import sys
+import timeit
+
+import django
+import json
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Poem.settings')
+django.setup()
+
+from deepdiff import DeepDiff
+
+from Poem.helpers.history_helpers import analyze_differences, \
+    inline_models_to_dicts
+
+
+def deepdiff_differences(old_data, new_data):
+    # implementation of analyze_differences before the structural one
+    inlines = ['config', 'attribute', 'dependency', 'flags', 'files',
+               'parameter', 'fileparameter', 'dependancy']
+
+    foreignkeys = ['probekey', 'package', 'group']
+
+    changed = []
+    added = []
+    deleted = []
+    msg = []
+    if old_data:
+        res = DeepDiff(old_data, new_data, ignore_order=True)
+
+        # I'm numbering how many times the for loop has passed because foreign
+        # keys are serialized in lists
+        passed = 0
+        added_groups = list()
+        deleted_groups = list()
+        added_rules = list()
+        deleted_rules = list()
+        if 'iterable_item_removed' in res:
+            for key, value in res['iterable_item_removed'].items():
+                field = key.split('[')[1][0:-1].strip('\'')
+                if field in foreignkeys:
+                    passed += 1
+                    pass
+                elif field == 'groups':
+                    deleted_groups.append(value['name'])
+                elif field == 'rules':
+                    deleted_rules.append(value['metric'])
+                else:
+                    msg.append(
+                        {
+                            'deleted': {
+                                'fields': [field], 'object': value
+                            }
+                        }
+                    )
+
+        if 'iterable_item_added' in res:
+            for key, value in res['iterable_item_added'].items():
+                field = key.split('[')[1][0:-1].strip('\'')
+                if field in foreignkeys:
+                    passed += 1
+                    pass
+                elif field == 'groups':
+                    added_groups.append(value['name'])
+                elif field == 'rules':
+                    added_rules.append(value['metric'])
+                else:
+                    msg.append(
+                        {
+                            'added': {
+                                'fields': [field], 'object': value
+                            }
+                        }
+                    )
+
+        if added_groups or deleted_groups:
+            for item in added_groups:
+                if item in deleted_groups:
+                    deleted_groups.remove(item)
+                    msg.append(
+                        {
+                            'changed': {
+                                'fields': ['groups'], 'object': [item]
+                            }
+                        }
+                    )
+
+                else:
+                    msg.append(
+                        {
+                            'added': {
+                                'fields': ['groups'], 'object': [item]
+                            }
+                        }
+                    )
+
+            for item in deleted_groups:
+                msg.append(
+                    {
+                        'deleted': {
+                            'fields': ['groups'], 'object': [item]
+                        }
+                    }
+                )
+
+        if added_rules or deleted_rules:
+            for item in added_rules:
+                if item in deleted_rules:
+                    deleted_rules.remove(item)
+                    msg.append(
+                        {
+                            'changed': {
+                                'fields': ['rules'], 'object': [item]
+                            }
+                        }
+                    )
+
+                else:
+                    msg.append(
+                        {
+                            'added': {
+                                'fields': ['rules'], 'object': [item]
+                            }
+                        }
+                    )
+
+            for item in deleted_rules:
+                msg.append(
+                    {
+                        'deleted': {
+                            'fields': ['rules'], 'object': [item]
+                        }
+                    }
+                )
+
+        if passed > 0:
+            res = DeepDiff(old_data, new_data)
+
+        if 'dictionary_item_added' in res:
+            for item in res['dictionary_item_added']:
+                added.append(item.split('[')[1][0:-1].strip('\''))
+
+        if 'type_changes' in res:
+            for key, value in res['type_changes'].items():
+                field = key.split('[')[1][0:-1].strip('\'')
+
+                if value['new_value'] is None:
+                    deleted.append(field)
+
+                if value['old_value'] is None:
+                    added.append(field)
+
+                if not value['new_value'] is None and \
+                        not value['old_value'] is None:
+                    changed.append(field)
+
+        if 'values_changed' in res:
+            for key, value in res['values_changed'].items():
+                field = key.split('[')[1][1:-2]
+                try:
+                    if field in inlines:
+                        old = inline_models_to_dicts(value['old_value'])
+                        new = inline_models_to_dicts(value['new_value'])
+                        deleted_fields = []
+                        changed_fields = []
+                        added_fields = []
+                        res = DeepDiff(old, new, ignore_order=True)
+                        if 'values_changed' in res:
+                            for k, v in res['values_changed'].items():
+                                changed_fields.append(
+                                    k.split('[')[1][0:-1].strip('\'')
+                                )
+
+                        if 'dictionary_item_added' in res:
+                            for item in res['dictionary_item_added']:
+                                added_fields.append(
+                                    item.split('[')[1][0:-1].strip('\'')
+                                )
+
+                        if 'dictionary_item_removed' in res:
+                            for item in res['dictionary_item_removed']:
+                                deleted_fields.append(
+                                    item.split('[')[1][0:-1].strip('\'')
+                                )
+
+                        if deleted_fields:
+                            msg.append(
+                                {'deleted': {
+                                    'fields': [field],
+                                    'object': sorted(deleted_fields)
+                                }}
+                            )
+
+                        if changed_fields:
+                            msg.append(
+                                {'changed': {
+                                    'fields': [field],
+                                    'object': sorted(changed_fields)
+                                }}
+                            )
+
+                        if added_fields:
+                            msg.append(
+                                {'added': {'fields': [field],
+                                           'object': sorted(added_fields)}}
+                            )
+
+                    else:
+                        if not value['new_value']:
+                            deleted.append(field)
+
+                        elif not value['old_value']:
+                            added.append(field)
+
+                        else:
+                            if field != 'tags':
+                                changed.append(field)
+
+                except KeyError:
+                    pass
+
+        if added:
+            msg.append({'added': {'fields': sorted(list(set(added)))}})
+        if changed:
+            msg.append({'changed': {'fields': sorted(list(set(changed)))}})
+        if deleted:
+            msg.append({'deleted': {'fields': sorted(list(set(deleted)))}})
+
+        return json.dumps(msg)
+    else:
+        return 'Initial version.'
+
+
+def inline(prefix, n, changed=()):
+    return json.dumps([
+        '{}-key{} {}-value{}{}'.format(
+            prefix, i, prefix, i, '-new' if i in changed else ''
+        ) for i in range(n)
+    ])
+
+
+def metric(version=0):
+    return {
+        'name': 'argo.metric-{}'.format(version),
+        'mtype': ['Active'],
+        'tags': [['tag{}'.format(i)] for i in range(version, version + 5)],
+        'probekey': ['argo-probe', '1.0.{}'.format(version)],
+        'description': 'Description {}.'.format(version),
+        'group': ['EGI'],
+        'parent': '' if version else 'parent-metric',
+        'probeexecutable': '["argo-probe"]',
+        'config': inline('config', 10, changed=range(version)),
+        'attribute': inline('attribute', 5 + version),
+        'dependancy': inline('dependency', 5 - version),
+        'flags': inline('flags', 5, changed=(version,)),
+        'files': inline('files', 5),
+        'parameter': inline('parameter', 10 + version),
+        'fileparameter': inline('fileparameter', 5)
+    }
+
+
+def metrictemplate(version=0):
+    data = metric(version)
+    data['dependency'] = data.pop('dependancy')
+    del data['group']
+    return data
+
+
+def probe(version=0):
+    return {
+        'name': 'argo-probe',
+        'package': ['nagios-plugins-argo', '1.0.{}'.format(version)],
+        'description': 'Description {}.'.format(version),
+        'comment': 'Version {}.'.format(version),
+        'repository': 'https://github.com/ARGOeu/nagios-plugins-argo',
+        'docurl': 'https://github.com/ARGOeu/nagios-plugins-argo/README.md'
+    }
+
+
+def metricprofile(version=0):
+    return {
+        'name': 'PROFILE',
+        'groupname': 'GROUP{}'.format(version),
+        'apiid': '00000000-oooo-kkkk-aaaa-aaeekkccnnee',
+        'description': 'Description {}.'.format(version),
+        'metricinstances': [
+            ['service{}'.format(i % 50), 'metric{}'.format(i)]
+            for i in range(version * 10, version * 10 + 500)
+        ]
+    }
+
+
+def aggregation(version=0):
+    return {
+        'name': 'PROFILE',
+        'groupname': 'GROUP',
+        'apiid': '00000000-oooo-kkkk-aaaa-aaeekkccnnee',
+        'endpoint_group': 'sites',
+        'metric_operation': 'AND',
+        'profile_operation': 'AND' if version else 'OR',
+        'metric_profile': 'PROFILE',
+        'groups': [
+            {
+                'name': 'Group{}'.format(i),
+                'operation': 'OR' if i < version * 5 else 'AND',
+                'services': [
+                    {'name': 'service{}'.format(j), 'operation': 'OR'}
+                    for j in range(i, i + 10)
+                ]
+            } for i in range(version, version + 50)
+        ]
+    }
+
+
+def thresholdsprofile(version=0):
+    return {
+        'name': 'PROFILE',
+        'groupname': 'GROUP',
+        'apiid': '00000000-oooo-kkkk-aaaa-aaeekkccnnee',
+        'rules': [
+            {
+                'host': 'host{}'.format(i),
+                'metric': 'metric{}'.format(i),
+                'thresholds': 'freshness=1s;10;9:;0;{}'.format(
+                    25 + version if i % 10 == 0 else 25
+                )
+            } for i in range(version, version + 200)
+        ]
+    }
+
+
+def comment_set(comment):
+    return set(json.dumps(item) for item in json.loads(comment))
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+    print('{:20} {:>12} {:>12} {:>8}'.format(
+        'object', 'deepdiff [s]', 'fields [s]', 'speedup'
+    ))
+    for generate in [metric, metrictemplate, probe, metricprofile,
+                     aggregation, thresholdsprofile]:
+        old_data = generate()
+        new_data = generate(1)
+
+        expected = deepdiff_differences(old_data, new_data)
+        comment = analyze_differences(old_data, new_data)
+        if comment_set(comment) != comment_set(expected):
+            print('{}: different comments:\n{}\n{}'.format(
+                generate.__name__, expected, comment
+            ))
+
+        before = timeit.timeit(
+            lambda: deepdiff_differences(old_data, new_data), number=number
+        )
+        after = timeit.timeit(
+            lambda: analyze_differences(old_data, new_data), number=number
+        )
+
+        print('{:20} {:12.4f} {:12.4f} {:7.1f}x'.format(
+            generate.__name__, before, after, before / after
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Measures history lookups done when saving, listing and deleting tenant
+objects, while tenant history table grows to millions of rows, and for a
+single object with a long history. Generated versions are inserted in a
+transaction which is rolled back in the end, so tenant data is left
+untouched.
+
+Usage: history_lookup_benchmark.py <schema> [rows rows ...]
+"""
+import os
+import random
+import sys
+import timeit
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Poem.settings')
+django.setup()
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+
+from Poem.helpers.history_helpers import get_version
+from Poem.poem import models as poem_models
+
+from tenant_schemas.utils import schema_context
+
+
+# number of versions of each generated object
+VERSIONS = 20
+
+# number of versions of the object with long history
+LONG_HISTORY_VERSIONS = 5000
+
+LONG_HISTORY_OBJECT_ID = 999999
+
+REPEAT = 100
+
+
+def insert_versions(content_types, start, stop):
+    """
+    Inserts versions with numbers from start to stop, evenly spread over
+    content types, each object getting VERSIONS versions.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO poem_tenanthistory (
+                object_id, serialized_data, object_repr, content_type_id,
+                date_created, comment, "user"
+            )
+            SELECT
+                1000000 + i / %(versions)s,
+                '[{"fields": {"name": "benchmark"}}]',
+                'benchmark-' || (i / %(versions)s)::text,
+                (%(content_types)s)[
+                    1 + i / %(versions)s %% %(n_content_types)s
+                ],
+                now() - (i %% %(versions)s) * interval '1 day',
+                'Benchmark version.',
+                'benchmark'
+            FROM generate_series(%(start)s, %(stop)s - 1) AS i
+            """,
+            {
+                'versions': VERSIONS,
+                'content_types': content_types,
+                'n_content_types': len(content_types),
+                'start': start,
+                'stop': stop
+            }
+        )
+        cursor.execute('ANALYZE poem_tenanthistory')
+
+
+def insert_long_history(content_type):
+    """
+    Inserts LONG_HISTORY_VERSIONS versions of a single object. Half of them
+    share the creation date, so that the id tiebreak is exercised as well.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO poem_tenanthistory (
+                object_id, serialized_data, object_repr, content_type_id,
+                date_created, comment, "user"
+            )
+            SELECT
+                %(object_id)s,
+                '[{"fields": {"name": "benchmark"}}]',
+                'benchmark-long',
+                %(content_type)s,
+                now() - (i / 2) * interval '1 minute',
+                'Benchmark version.',
+                'benchmark'
+            FROM generate_series(0, %(versions)s - 1) AS i
+            """,
+            {
+                'object_id': LONG_HISTORY_OBJECT_ID,
+                'content_type': content_type,
+                'versions': LONG_HISTORY_VERSIONS
+            }
+        )
+        cursor.execute('ANALYZE poem_tenanthistory')
+
+
+def lookups(content_type, object_id):
+    versions = poem_models.TenantHistory.objects.filter(
+        object_id=object_id, content_type_id=content_type
+    )
+
+    return {
+        'latest': lambda: get_version(versions),
+        'list': lambda: list(versions.order_by('-date_created', '-id')),
+        'delete': lambda: versions.exists()
+    }
+
+
+def random_lookups(content_types, rows):
+    object_id = 1000000 + random.randrange(rows) // VERSIONS
+    content_type = content_types[(object_id - 1000000) % len(content_types)]
+
+    return lookups(content_type, object_id)
+
+
+def time_lookups(funcs):
+    timings = dict()
+    for name, func in funcs.items():
+        timings[name] = timeit.timeit(func, number=REPEAT) / REPEAT * 1000
+
+    return timings
+
+
+def explain(content_type, object_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'EXPLAIN SELECT * FROM poem_tenanthistory '
+            'WHERE content_type_id = %s AND object_id = %s '
+            'ORDER BY date_created DESC, id DESC LIMIT 1',
+            [content_type, object_id]
+        )
+
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+
+    schema = sys.argv[1]
+    sizes = [int(size) for size in sys.argv[2:]] or \
+        [10000, 100000, 1000000, 3000000]
+
+    with schema_context(schema), transaction.atomic():
+        content_types = [
+            ContentType.objects.get_for_model(model).id for model in [
+                poem_models.Metric, poem_models.MetricProfiles,
+                poem_models.Aggregation, poem_models.ThresholdsProfiles
+            ]
+        ]
+
+        print('{:>10} {:>12} {:>12} {:>12}'.format(
+            'rows', 'latest [ms]', 'list [ms]', 'delete [ms]'
+        ))
+        inserted = 0
+        for size in sorted(sizes):
+            insert_versions(content_types, inserted, size)
+            inserted = size
+
+            timings = time_lookups(random_lookups(content_types, size))
+            print('{:>10} {:12.3f} {:12.3f} {:12.3f}'.format(
+                size, timings['latest'], timings['list'], timings['delete']
+            ))
+
+        print()
+        print(explain(content_types[0], 1000000))
+
+        insert_long_history(content_types[0])
+        timings = time_lookups(
+            lookups(content_types[0], LONG_HISTORY_OBJECT_ID)
+        )
+        print()
+        print('{} versions of one object:'.format(LONG_HISTORY_VERSIONS))
+        print('{:>10} {:>12} {:>12} {:>12}'.format(
+            'rows', 'latest [ms]', 'list [ms]', 'delete [ms]'
+        ))
+        print('{:>10} {:12.3f} {:12.3f} {:12.3f}'.format(
+            inserted + LONG_HISTORY_VERSIONS, timings['latest'],
+            timings['list'], timings['delete']
+        ))
+
+        print()
+        print(explain(content_types[0], LONG_HISTORY_OBJECT_ID))
+
+        transaction.set_rollback(True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,8 @@
-from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 
 import json
 
 from Poem.api import serializers
-from Poem.api.internal_views.utils import sync_webapi
 from Poem.api.views import NotFound
 from Poem.helpers.history_helpers import create_profile_history
 from Poem.poem import models as poem_models
@@ -89,8 +87,6 @@ class ListAggregations(APIView):
             )
 
     def get(self, request, aggregation_name=None):
-        sync_webapi(settings.WEBAPI_AGGREGATION, poem_models.Aggregation)
-
         if aggregation_name:
             try:
                 aggregation = poem_models.Aggregation.objects.get(
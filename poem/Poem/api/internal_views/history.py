@@ -1,15 +1,74 @@
 import datetime
 
 from Poem.api.internal_views.utils import one_value_inline, \
-    two_value_inline
+    two_value_inline, get_page_params, collate_c
 from Poem.api.views import NotFound
 from Poem.helpers.versioned_comments import new_comment
 from Poem.poem_super_admin import models as admin_models
+from django.db.models import Q, F, Value, Case, When, CharField
+from django.db.models.functions import Concat
+from rest_framework import status
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 
+# fields of each version, together with the way they are rendered
+version_fields = {
+    'probe': {
+        'name': lambda ver: ver.name,
+        'version': lambda ver: ver.package.version,
+        'package': lambda ver: ver.package.__str__(),
+        'description': lambda ver: ver.description,
+        'comment': lambda ver: ver.comment,
+        'repository': lambda ver: ver.repository,
+        'docurl': lambda ver: ver.docurl
+    },
+    'metrictemplate': {
+        'name': lambda ver: ver.name,
+        'mtype': lambda ver: ver.mtype.name,
+        'tags': lambda ver: [tag.name for tag in ver.tags.all()],
+        'probeversion': lambda ver: str(ver.probekey or ''),
+        'description': lambda ver: ver.description,
+        'parent': lambda ver: one_value_inline(ver.parent),
+        'probeexecutable': lambda ver: one_value_inline(ver.probeexecutable),
+        'config': lambda ver: two_value_inline(ver.config),
+        'attribute': lambda ver: two_value_inline(ver.attribute),
+        'dependency': lambda ver: two_value_inline(ver.dependency),
+        'flags': lambda ver: two_value_inline(ver.flags),
+        'files': lambda ver: two_value_inline(ver.files),
+        'parameter': lambda ver: two_value_inline(ver.parameter),
+        'fileparameter': lambda ver: two_value_inline(ver.fileparameter)
+    }
+}
+
+
+def sort_repr(obj):
+    """
+    Returns expression equal to object_repr of the version, compared by code
+    points like Python strings, so that listing is ordered by the database
+    the same way it used to be sorted in Python.
+    """
+    if obj == 'probe':
+        expression = Concat(
+            'name', Value(' ('), 'package__version', Value(')'),
+            output_field=CharField()
+        )
+
+    else:
+        expression = Case(
+            When(probekey__isnull=True, then=F('name')),
+            default=Concat(
+                'name', Value(' ['), 'probekey__name', Value(' ('),
+                'probekey__package__version', Value(')]'),
+                output_field=CharField()
+            ),
+            output_field=CharField()
+        )
+
+    return collate_c(expression)
+
+
 class ListVersions(APIView):
     authentication_classes = (SessionAuthentication,)
 
@@ -19,6 +78,28 @@ class ListVersions(APIView):
             'metrictemplate': admin_models.MetricTemplateHistory
         }
 
+        fields = version_fields[obj]
+        if request.query_params.get('fields'):
+            only = request.query_params['fields'].split(',')
+            if set(only).difference(fields):
+                return Response(
+                    {'detail': 'Unknown fields: {}.'.format(
+                        ', '.join(sorted(set(only).difference(fields)))
+                    )},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            fields = dict((field, fields[field]) for field in only)
+
+        vers = history_model[obj].objects.all()
+        if obj == 'probe':
+            vers = vers.select_related('package')
+        else:
+            vers = vers.select_related('mtype', 'probekey__package')
+            if 'tags' in fields:
+                vers = vers.prefetch_related('tags')
+
+        limit = None
         if name:
             history_instance = history_model[obj].objects.filter(name=name)
 
@@ -28,58 +109,52 @@ class ListVersions(APIView):
             else:
                 instance = history_instance[0].object_id
 
-                vers = history_model[obj].objects.filter(
+                vers = vers.filter(
                     object_id=instance
-                ).order_by('-date_created')
+                ).order_by('-date_created', '-id')
 
         else:
-            vers = history_model[obj].objects.all()
+            vers = vers.annotate(sort_repr=sort_repr(obj))
+
+            try:
+                limit, cursor = get_page_params(request)
+                if cursor is not None:
+                    last_id, _, last_repr = cursor.partition(':')
+                    vers = vers.filter(
+                        Q(sort_repr__gt=last_repr) |
+                        Q(sort_repr=last_repr, id__gt=int(last_id))
+                    )
+
+            except ValueError:
+                return Response(
+                    {'detail': 'Invalid limit or cursor.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            vers = vers.order_by('sort_repr', 'id')
+            if limit:
+                vers = vers[:limit + 1]
+
+        vers = list(vers)
 
         results = []
-        for ver in vers:
+        for ver in vers[:limit]:
             if obj == 'probe':
                 version = ver.package.version
-                fields = {
-                    'name': ver.name,
-                    'version': ver.package.version,
-                    'package': ver.package.__str__(),
-                    'description': ver.description,
-                    'comment': ver.comment,
-                    'repository': ver.repository,
-                    'docurl': ver.docurl
-                }
             else:
                 if ver.probekey:
-                    probekey = ver.probekey.__str__()
-                    version = ver.probekey.__str__().split(' ')[1][1:-1]
+                    version = ver.probekey.package.version
                 else:
-                    probekey = ''
                     version = datetime.datetime.strftime(
                         ver.date_created, '%Y-%m-%d %H:%M:%S'
                     )
-                fields = {
-                    'name': ver.name,
-                    'mtype': ver.mtype.name,
-                    'tags': [tag.name for tag in ver.tags.all()],
-                    'probeversion': probekey,
-                    'description': ver.description,
-                    'parent': one_value_inline(ver.parent),
-                    'probeexecutable': one_value_inline(
-                        ver.probeexecutable
-                    ),
-                    'config': two_value_inline(ver.config),
-                    'attribute': two_value_inline(ver.attribute),
-                    'dependency': two_value_inline(ver.dependency),
-                    'flags': two_value_inline(ver.flags),
-                    'files': two_value_inline(ver.files),
-                    'parameter': two_value_inline(ver.parameter),
-                    'fileparameter': two_value_inline(ver.fileparameter)
-                }
 
             results.append(dict(
                 id=ver.id,
                 object_repr=ver.__str__(),
-                fields=fields,
+                fields=dict(
+                    (field, render(ver)) for field, render in fields.items()
+                ),
                 user=ver.version_user,
                 date_created=datetime.datetime.strftime(
                     ver.date_created, '%Y-%m-%d %H:%M:%S'
@@ -88,10 +163,14 @@ class ListVersions(APIView):
                 version=version
             ))
 
-        if name:
-            results = sorted(results, key=lambda k: k['id'], reverse=True)
-        else:
-            results = sorted(results, key=lambda k: k['object_repr'])
+        if limit:
+            if len(vers) > limit:
+                last = vers[limit - 1]
+                next_cursor = '{}:{}'.format(last.id, last.sort_repr)
+            else:
+                next_cursor = None
+
+            return Response({'results': results, 'next': next_cursor})
 
         return Response(results)
 
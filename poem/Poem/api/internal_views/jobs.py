@@ -0,0 +1,60 @@
+import datetime
+import json
+
+from Poem.api.views import NotFound
+from Poem.helpers.job_helpers import enqueue_job
+from Poem.poem_super_admin import models as admin_models
+from django.db import connection
+from rest_framework import status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+def run_async(request):
+    return request.data.get('async', False) in [True, 'true', 'True']
+
+
+def job_accepted(func, request, **arguments):
+    """
+    Queues job, and returns response pointing to its status.
+    """
+    job = enqueue_job(func, arguments, user=request.user.username)
+
+    return Response(
+        {'job': job.id, 'url': '/api/v2/internal/jobs/{}'.format(job.id)},
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+def job_datetime(value):
+    if value:
+        return datetime.datetime.strftime(value, '%Y-%m-%dT%H:%M:%S.%f')
+
+    else:
+        return ''
+
+
+class ListJobs(APIView):
+    authentication_classes = (SessionAuthentication,)
+
+    def get(self, request, job_id):
+        try:
+            job = admin_models.Job.objects.get(
+                id=job_id, schema_name=connection.schema_name
+            )
+
+        except admin_models.Job.DoesNotExist:
+            raise NotFound(status=404, detail='Job not found')
+
+        return Response(dict(
+            id=job.id,
+            status=job.status,
+            progress=job.progress,
+            total=job.total,
+            result=json.loads(job.result) if job.result else dict(),
+            user=job.user,
+            date_created=job_datetime(job.date_created),
+            date_started=job_datetime(job.date_started),
+            date_finished=job_datetime(job.date_finished)
+        ))
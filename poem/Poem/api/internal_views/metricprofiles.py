@@ -2,9 +2,9 @@ from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 
 from Poem.api import serializers
-from Poem.api.internal_views.utils import sync_webapi
 from Poem.api.views import NotFound
 from Poem.helpers.history_helpers import create_profile_history
+from Poem.helpers.webapi_helpers import invalidate_webapi_data
 from Poem.poem import models as poem_models
 
 from rest_framework import status
@@ -50,6 +50,7 @@ class ListMetricProfiles(APIView):
                 profile, dict(request.data)['services'],
                 request.user, request.data['description']
             )
+            invalidate_webapi_data(settings.WEBAPI_METRIC)
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -65,8 +66,6 @@ class ListMetricProfiles(APIView):
             )
 
     def get(self, request, profile_name=None):
-        sync_webapi(settings.WEBAPI_METRIC, poem_models.MetricProfiles)
-
         if profile_name:
             try:
                 profile = poem_models.MetricProfiles.objects.get(
@@ -104,6 +103,7 @@ class ListMetricProfiles(APIView):
                 profile, dict(request.data)['services'],
                 request.user, request.data['description']
             )
+            invalidate_webapi_data(settings.WEBAPI_METRIC)
 
             return Response(status=status.HTTP_201_CREATED)
 
@@ -126,6 +126,7 @@ class ListMetricProfiles(APIView):
                 ).delete()
 
                 profile.delete()
+                invalidate_webapi_data(settings.WEBAPI_METRIC)
 
                 return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -1,8 +1,10 @@
 import json
+import time
 
 import requests
+from Poem.api.internal_views.jobs import run_async, job_accepted
 from Poem.api.internal_views.utils import one_value_inline, two_value_inline, \
-    inline_metric_for_db
+    inline_metric_for_db, iterate_by_name, stream_json
 from Poem.api.views import NotFound
 from Poem.helpers.history_helpers import create_history
 from Poem.helpers.metrics_helpers import import_metrics, update_metrics, \
@@ -10,11 +12,17 @@ from Poem.helpers.metrics_helpers import import_metrics, update_metrics, \
 from Poem.poem import models as poem_models
 from Poem.poem_super_admin import models as admin_models
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection
 from rest_framework import status
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+# number of seconds plan of metrics update made for dry run is kept
+UPDATE_PLAN_TIMEOUT = 300
+
+_update_plans = dict()
+
 
 class ListAllMetrics(APIView):
     authentication_classes = (SessionAuthentication,)
@@ -34,65 +42,59 @@ class ListPublicAllMetrics(ListAllMetrics):
     permission_classes = ()
 
 
+def metric_data(metric):
+    if metric.probekey:
+        probeversion = metric.probekey.__str__()
+    else:
+        probeversion = ''
+
+    if metric.group:
+        group = metric.group.name
+    else:
+        group = ''
+
+    return dict(
+        id=metric.id,
+        name=metric.name,
+        mtype=metric.mtype.name,
+        tags=[tag.name for tag in metric.tags.all()],
+        probeversion=probeversion,
+        group=group,
+        description=metric.description,
+        parent=one_value_inline(metric.parent),
+        probeexecutable=one_value_inline(metric.probeexecutable),
+        config=two_value_inline(metric.config),
+        attribute=two_value_inline(metric.attribute),
+        dependancy=two_value_inline(metric.dependancy),
+        flags=two_value_inline(metric.flags),
+        files=two_value_inline(metric.files),
+        parameter=two_value_inline(metric.parameter),
+        fileparameter=two_value_inline(metric.fileparameter)
+    )
+
+
 class ListMetric(APIView):
     authentication_classes = (SessionAuthentication,)
 
     def get(self, request, name=None):
         if name:
-            metrics = poem_models.Metric.objects.filter(name=name)
-            if metrics.count() == 0:
+            try:
+                metric = poem_models.Metric.objects.get(name=name)
+
+            except poem_models.Metric.DoesNotExist:
                 raise NotFound(status=404,
                                detail='Metric not found')
-        else:
-            metrics = poem_models.Metric.objects.all()
 
-        results = []
-        for metric in metrics:
-            config = two_value_inline(metric.config)
-            parent = one_value_inline(metric.parent)
-            probeexecutable = one_value_inline(metric.probeexecutable)
-            attribute = two_value_inline(metric.attribute)
-            dependancy = two_value_inline(metric.dependancy)
-            flags = two_value_inline(metric.flags)
-            files = two_value_inline(metric.files)
-            parameter = two_value_inline(metric.parameter)
-            fileparameter = two_value_inline(metric.fileparameter)
-
-            if metric.probekey:
-                probeversion = metric.probekey.__str__()
-            else:
-                probeversion = ''
+            return Response(metric_data(metric))
 
-            if metric.group:
-                group = metric.group.name
-            else:
-                group = ''
-
-            results.append(dict(
-                id=metric.id,
-                name=metric.name,
-                mtype=metric.mtype.name,
-                tags=[tag.name for tag in metric.tags.all()],
-                probeversion=probeversion,
-                group=group,
-                description=metric.description,
-                parent=parent,
-                probeexecutable=probeexecutable,
-                config=config,
-                attribute=attribute,
-                dependancy=dependancy,
-                flags=flags,
-                files=files,
-                parameter=parameter,
-                fileparameter=fileparameter
-            ))
-
-        results = sorted(results, key=lambda k: k['name'])
-
-        if name:
-            return Response(results[0])
         else:
-            return Response(results)
+            metrics = poem_models.Metric.objects.select_related(
+                'mtype', 'probekey', 'group'
+            ).prefetch_related('tags')
+
+            return stream_json(
+                metric_data(metric) for metric in iterate_by_name(metrics)
+            )
 
     def put(self, request):
         metric = poem_models.Metric.objects.get(name=request.data['name'])
@@ -284,6 +286,93 @@ class ImportMetrics(APIView):
         return Response(status=status.HTTP_200_OK, data=data)
 
 
+def package_metrictemplates(package, names):
+    """
+    Returns dict mapping each of the given names, which metric templates
+    have had in their history, to the version of that metric template for
+    the given package, or to None if there is no such version.
+    """
+    versions = dict()
+    for mt in admin_models.MetricTemplateHistory.objects.filter(
+        probekey__package=package
+    ).order_by('id'):
+        versions.setdefault(mt.object_id_id, mt)
+
+    metrictemplates = dict()
+    for name, object_id in admin_models.MetricTemplateHistory.objects.filter(
+        name__in=names
+    ).order_by('id').values_list('name', 'object_id'):
+        if name not in metrictemplates:
+            metrictemplates[name] = versions.get(object_id, None)
+
+    return metrictemplates
+
+
+def update_plan(package):
+    """
+    Returns changes needed for tenant's metrics to use the given package.
+    Plan made for dry run is reused until it expires, or until tenant's
+    metrics, probe versions or metric template versions are changed.
+    Expired plans are dropped whenever a plan is requested.
+    """
+    key = (connection.schema_name, package.id)
+    version = '{}:{}'.format(
+        poem_models.ChangeCounter.objects.current('metrics').version,
+        poem_models.ChangeCounter.objects.current('metrictemplates').version
+    )
+
+    now = time.monotonic()
+    for plan_key, plan in list(_update_plans.items()):
+        if now - plan['created'] >= UPDATE_PLAN_TIMEOUT:
+            _update_plans.pop(plan_key, None)
+
+    plan = _update_plans.get(key)
+    if plan and plan['version'] == version:
+        return plan
+
+    tenant_metrics = [
+        metric for metric in poem_models.Metric.objects.select_related(
+            'probekey__package'
+        ).order_by('id')
+        if metric.probekey and metric.probekey.package.name == package.name
+    ]
+    metrictemplates = package_metrictemplates(
+        package, [metric.name for metric in tenant_metrics]
+    )
+
+    plan = {
+        'version': version,
+        'created': now,
+        'updated': [],
+        'deleted': [],
+        'no_history': []
+    }
+    for metric in tenant_metrics:
+        if metric.name not in metrictemplates:
+            plan['no_history'].append(metric.name)
+
+        elif metrictemplates[metric.name]:
+            plan['updated'].append(
+                (metric.id, metric.name, metrictemplates[metric.name].id)
+            )
+
+        else:
+            plan['deleted'].append((metric.id, metric.name))
+
+    _update_plans[key] = plan
+
+    return plan
+
+
+def update_metrics_versions(name, version, user, progress=None):
+    """
+    Job updating tenant's metrics to the given package version.
+    """
+    return UpdateMetricsVersions().update(
+        name, version, user, progress=progress
+    )[0]
+
+
 class UpdateMetricsVersions(APIView):
     """
     We allow tenant users to pick package version they wish to install, and
@@ -291,76 +380,70 @@ class UpdateMetricsVersions(APIView):
     """
     authentication_classes = (SessionAuthentication,)
 
-    def _handle_metrics(self, name, version, user, dry_run=False, metrics=None):
+    def _handle_metrics(
+            self, name, version, user, dry_run=False, metrics=None,
+            progress=None
+    ):
         try:
             package = admin_models.Package.objects.get(
                 name=name, version=version
             )
 
+            plan = update_plan(package)
+
             # warning for metrics if there is no metric template history for
             # metric templates of that name
-            warning_no_tbh = []
+            warning_no_tbh = plan['no_history']
             # metrics deleted because they are not available in the given
             # package
-            deleted_not_in_package = []
+            deleted_not_in_package = [name for pk, name in plan['deleted']]
             # updated metrics
-            updated = []
+            updated = [name for pk, name, mt in plan['updated']]
             profile_warning = []
-            for metric in poem_models.Metric.objects.all():
-                if metric.probekey and \
-                        metric.probekey.package.name == package.name:
-                    mts_history = \
-                        admin_models.MetricTemplateHistory.objects.filter(
-                            name=metric.name
+            if dry_run:
+                for metric in deleted_not_in_package:
+                    value = metrics.get(metric, [])
+                    if len(value) == 1:
+                        profile_warning.append(
+                            'Metric {} is part of {} metric profile.'.format(
+                                metric, value[0]
+                            )
                         )
-                    if len(mts_history) > 0:
-                        mts = admin_models.MetricTemplateHistory.objects.filter(
-                            object_id=mts_history[0].object_id
+
+                    elif len(value) > 1:
+                        profile_warning.append(
+                            'Metric {} is part of {} metric '
+                            'profiles.'.format(metric, ', '.join(value))
                         )
-                        metrictemplate = None
-                        for mt in mts:
-                            if mt.probekey.package == package:
-                                metrictemplate = mt
-                                break
-
-                        if metrictemplate:
-                            if not dry_run:
-                                update_metrics(
-                                    metrictemplate, metric.name,
-                                    metric.probekey,
-                                    user=user
-                                )
-                            updated.append(metric.name)
 
-                        else:
-                            if dry_run:
-                                for key, value in metrics.items():
-                                    if metric.name == key:
-                                        if len(value) == 1:
-                                            profile_warning.append(
-                                                'Metric {} is part of {} '
-                                                'metric profile.'.format(
-                                                    metric.name, value[0]
-                                                )
-                                            )
-
-                                        else:
-                                            profile_warning.append(
-                                                'Metric {} is part of {} '
-                                                'metric profiles.'.format(
-                                                    metric.name, ', '.join(
-                                                        value
-                                                    )
-                                                )
-                                            )
+            else:
+                metrictemplates = admin_models.MetricTemplateHistory.objects.\
+                    select_related('probekey__package').prefetch_related(
+                        'tags'
+                    ).in_bulk([mt for pk, name, mt in plan['updated']])
+                tenant_metrics = poem_models.Metric.objects.select_related(
+                    'probekey'
+                ).in_bulk([pk for pk, name, mt in plan['updated']])
+
+                for done, (pk, name, mt) in enumerate(plan['updated'], 1):
+                    # metric template history might have been deleted since
+                    # the plan was made
+                    if mt in metrictemplates:
+                        update_metrics(
+                            metrictemplates[mt], name,
+                            tenant_metrics[pk].probekey, user=user
+                        )
 
-                            else:
-                                metric.delete()
+                    if progress:
+                        progress(done, len(plan['updated']))
 
-                            deleted_not_in_package.append(metric.name)
+                if plan['deleted']:
+                    poem_models.Metric.objects.filter(
+                        id__in=[pk for pk, name in plan['deleted']]
+                    ).delete()
 
-                    else:
-                        warning_no_tbh.append(metric.name)
+                # plan is no longer valid once it is carried out
+                _update_plans.pop((connection.schema_name, package.id), None)
 
             msg = dict()
             if deleted_not_in_package:
@@ -486,17 +569,16 @@ class UpdateMetricsVersions(APIView):
 
         return Response(msg, status=status_code)
 
-    def put(self, request):
+    def update(self, name, version, user, progress=None):
         msg, status_code, deleted = self._handle_metrics(
-            name=request.data['name'], version=request.data['version'],
-            user=request.user.username
+            name=name, version=version, user=user, progress=progress
         )
 
         warn_msg = []
         if deleted:
             try:
                 metrics_in_profiles = get_metrics_in_profiles(
-                    request.tenant.schema_name
+                    connection.schema_name
                 )
 
             except Exception:
@@ -544,4 +626,19 @@ class UpdateMetricsVersions(APIView):
         if warn_msg:
             msg['deleted'] += ' WARNING: ' + ' '.join(warn_msg)
 
+        return msg, status_code
+
+    def put(self, request):
+        if run_async(request):
+            return job_accepted(
+                update_metrics_versions, request,
+                name=request.data['name'], version=request.data['version'],
+                user=request.user.username
+            )
+
+        msg, status_code = self.update(
+            name=request.data['name'], version=request.data['version'],
+            user=request.user.username
+        )
+
         return Response(msg, status=status_code)
@@ -1,16 +1,18 @@
 import json
 
+from Poem.api.internal_views.jobs import run_async, job_accepted
 from Poem.api.internal_views.utils import one_value_inline, two_value_inline, \
-    inline_metric_for_db
+    inline_metric_for_db, iterate_by_name, stream_json
 from Poem.api.views import NotFound
 from Poem.helpers.history_helpers import create_history, update_comment
 from Poem.helpers.metrics_helpers import update_metrics, \
     get_metrics_in_profiles, delete_metrics_from_profile
-from Poem.poem.models import Metric, TenantHistory
+from Poem.poem.models import Metric, TenantHistory, bump_change_counter
 from Poem.poem_super_admin import models as admin_models
 from Poem.tenants.models import Tenant
 from django.contrib.contenttypes.models import ContentType
 from django.db import IntegrityError
+from django.db.models import Prefetch
 from rest_framework import status
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.response import Response
@@ -18,71 +20,178 @@ from rest_framework.views import APIView
 from tenant_schemas.utils import get_public_schema_name, schema_context
 
 
+def metrictemplate_data(metrictemplate):
+    ostag = []
+    if metrictemplate.probekey:
+        for repo in metrictemplate.probekey.package.repos.all():
+            ostag.append(repo.tag.name)
+
+    tags = []
+    for tag in metrictemplate.tags.all():
+        tags.append(tag.name)
+
+    if metrictemplate.probekey:
+        probeversion = metrictemplate.probekey.__str__()
+    else:
+        probeversion = ''
+
+    return dict(
+        id=metrictemplate.id,
+        name=metrictemplate.name,
+        mtype=metrictemplate.mtype.name,
+        ostag=ostag,
+        tags=sorted(tags),
+        probeversion=probeversion,
+        description=metrictemplate.description,
+        parent=one_value_inline(metrictemplate.parent),
+        probeexecutable=one_value_inline(metrictemplate.probeexecutable),
+        config=two_value_inline(metrictemplate.config),
+        attribute=two_value_inline(metrictemplate.attribute),
+        dependency=two_value_inline(metrictemplate.dependency),
+        flags=two_value_inline(metrictemplate.flags),
+        files=two_value_inline(metrictemplate.files),
+        parameter=two_value_inline(metrictemplate.parameter),
+        fileparameter=two_value_inline(metrictemplate.fileparameter)
+    )
+
+
+def metrictemplates_with_related():
+    return admin_models.MetricTemplate.objects.select_related(
+        'mtype', 'probekey__package'
+    ).prefetch_related(
+        'tags',
+        Prefetch(
+            'probekey__package__repos',
+            queryset=admin_models.YumRepo.objects.select_related('tag')
+        )
+    )
+
+
+def update_tenant_metrics(metrictemplate, name, probekey, progress=None):
+    """
+    Job propagating changes of metric template to tenants' metrics.
+    """
+    if probekey:
+        probekey = admin_models.ProbeHistory.objects.get(id=probekey)
+
+    msgs = update_metrics(
+        admin_models.MetricTemplate.objects.get(id=metrictemplate), name,
+        probekey, progress=progress
+    )
+
+    if msgs:
+        return {'detail': '\n'.join(msgs)}
+
+    else:
+        return dict()
+
+
+def delete_metric_templates(metrictemplates, progress=None):
+    schemas = list(
+        Tenant.objects.all().values_list('schema_name', flat=True)
+    )
+    schemas.remove(get_public_schema_name())
+
+    warning_message = []
+    for done, schema in enumerate(schemas, 1):
+        with schema_context(schema):
+            try:
+                mip = get_metrics_in_profiles(schema)
+            except Exception as e:
+                warning_message.append(
+                    '{}: Metrics are not removed from metric profiles. '
+                    'Unable to get metric profiles: {}'.format(
+                        schema, str(e)
+                    )
+                )
+                if progress:
+                    progress(done, len(schemas))
+
+                continue
+
+            metrics = dict(
+                Metric.objects.filter(
+                    name__in=metrictemplates
+                ).values_list('name', 'id')
+            )
+            if metrics:
+                TenantHistory.objects.filter(
+                    object_id__in=metrics.values(),
+                    content_type=ContentType.objects.get_for_model(Metric)
+                ).delete()
+                Metric.objects.filter(id__in=metrics.values()).delete()
+
+            # metrics in profiles are already indexed by metric name, so
+            # profiles affected are found in a single pass
+            profiles = dict()
+            for metric in metrictemplates:
+                if metric in metrics:
+                    for profile in mip.get(metric, []):
+                        profiles.setdefault(profile, []).append(metric)
+
+            if profiles:
+                for key, value in profiles.items():
+                    try:
+                        delete_metrics_from_profile(key, value)
+
+                    except Exception as e:
+                        if len(value) > 1:
+                            noun = 'Metrics {}'.format(', '.join(value))
+                        else:
+                            noun = 'Metric {}'.format(value[0])
+
+                        warning_message.append(
+                            '{}: {} not deleted from profile {}: {}'.format(
+                                schema, noun, key, str(e)
+                            )
+                        )
+
+        if progress:
+            progress(done, len(schemas))
+
+    response_message = dict()
+    mt = admin_models.MetricTemplate.objects.filter(
+        name__in=metrictemplates
+    )
+
+    mt.delete()
+
+    if len(metrictemplates) > 1:
+        msg = 'Metric templates {}'.format(', '.join(metrictemplates))
+
+    else:
+        msg = 'Metric template {}'.format(metrictemplates[0])
+
+    response_message.update({
+        'info': '{} successfully deleted.'.format(msg)
+    })
+
+    if warning_message:
+        response_message.update({'warning': '; '.join(warning_message)})
+
+    return response_message
+
+
 class ListMetricTemplates(APIView):
     authentication_classes = (SessionAuthentication,)
 
     def get(self, request, name=None):
         if name:
-            metrictemplates = admin_models.MetricTemplate.objects.filter(
-                name=name
-            )
-            if metrictemplates.count() == 0:
-                raise NotFound(status=404, detail='Metric template not found')
-        else:
-            metrictemplates = admin_models.MetricTemplate.objects.all()
+            try:
+                metrictemplate = metrictemplates_with_related().get(name=name)
 
-        results = []
-        for metrictemplate in metrictemplates:
-            config = two_value_inline(metrictemplate.config)
-            parent = one_value_inline(metrictemplate.parent)
-            probeexecutable = one_value_inline(metrictemplate.probeexecutable)
-            attribute = two_value_inline(metrictemplate.attribute)
-            dependency = two_value_inline(metrictemplate.dependency)
-            flags = two_value_inline(metrictemplate.flags)
-            files = two_value_inline(metrictemplate.files)
-            parameter = two_value_inline(metrictemplate.parameter)
-            fileparameter = two_value_inline(metrictemplate.fileparameter)
-
-            ostag = []
-            if metrictemplate.probekey:
-                for repo in metrictemplate.probekey.package.repos.all():
-                    ostag.append(repo.tag.name)
-
-            tags = []
-            for tag in metrictemplate.tags.all():
-                tags.append(tag.name)
-
-            if metrictemplate.probekey:
-                probeversion = metrictemplate.probekey.__str__()
-            else:
-                probeversion = ''
+            except admin_models.MetricTemplate.DoesNotExist:
+                raise NotFound(status=404, detail='Metric template not found')
 
-            results.append(dict(
-                id=metrictemplate.id,
-                name=metrictemplate.name,
-                mtype=metrictemplate.mtype.name,
-                ostag=ostag,
-                tags=sorted(tags),
-                probeversion=probeversion,
-                description=metrictemplate.description,
-                parent=parent,
-                probeexecutable=probeexecutable,
-                config=config,
-                attribute=attribute,
-                dependency=dependency,
-                flags=flags,
-                files=files,
-                parameter=parameter,
-                fileparameter=fileparameter
-            ))
-
-        results = sorted(results, key=lambda k: k['name'])
+            result = metrictemplate_data(metrictemplate)
+            del result['ostag']
+            return Response(result)
 
-        if name:
-            del results[0]['ostag']
-            return Response(results[0])
         else:
-            return Response(results)
+            return stream_json(
+                metrictemplate_data(metrictemplate) for metrictemplate in
+                iterate_by_name(metrictemplates_with_related())
+            )
 
     def post(self, request):
         if request.data['parent']:
@@ -334,6 +443,8 @@ class ListMetricTemplates(APIView):
                 admin_models.MetricTemplateHistory.objects.filter(
                     name=old_name, probekey=old_probekey
                 ).update(**new_data)
+                bump_change_counter('metrictemplates', all_tenants=True)
+                admin_models.update_metrictemplate_ostags([mt.id])
 
                 history = admin_models.MetricTemplateHistory.objects.get(
                     name=request.data['name'], probekey=new_probekey
@@ -347,6 +458,13 @@ class ListMetricTemplates(APIView):
                     for tag in tags_to_add:
                         history.tags.add(tag)
 
+                if run_async(request):
+                    return job_accepted(
+                        update_tenant_metrics, request,
+                        metrictemplate=mt.id, name=old_name,
+                        probekey=old_probekey.id if old_probekey else None
+                    )
+
                 msgs = update_metrics(mt, old_name, old_probekey)
 
                 if msgs:
@@ -364,20 +482,16 @@ class ListMetricTemplates(APIView):
             )
 
     def delete(self, request, name=None):
-        schemas = list(Tenant.objects.all().values_list('schema_name',
-                                                        flat=True))
-        schemas.remove(get_public_schema_name())
         if name:
             try:
                 mt = admin_models.MetricTemplate.objects.get(name=name)
-                for schema in schemas:
+                admin_models.History.objects.filter(
+                    object_id=mt.id,
+                    content_type=ContentType.objects.get_for_model(mt)
+                ).delete()
+                for schema in admin_models.metric_schemas(name=name):
                     with schema_context(schema):
                         try:
-                            admin_models.History.objects.filter(
-                                object_id=mt.id,
-                                content_type=ContentType.objects.get_for_model(
-                                    mt)
-                            ).delete()
                             m = Metric.objects.get(name=name)
                             TenantHistory.objects.filter(
                                 object_id=m.id,
@@ -420,59 +534,47 @@ class ListMetricTemplatesForImport(APIView):
     authentication_classes = (SessionAuthentication,)
 
     def get(self, request):
-        metrictemplates = admin_models.MetricTemplate.objects.all().order_by(
-            'name'
+        metrictemplates = admin_models.MetricTemplate.objects.select_related(
+            'mtype', 'probekey__package'
+        ).prefetch_related('tags').order_by('name')
+
+        # newest probe version available for each OS tag of metric template
+        probeversions = dict()
+        for entry in admin_models.MetricTemplateOSTag.objects.select_related(
+            'tag', 'probekey__package'
+        ):
+            probeversions.setdefault(entry.metrictemplate_id, dict()).update(
+                {entry.tag.name: entry.probekey.__str__()}
+            )
+
+        ostags = sorted(
+            admin_models.OSTag.objects.all().values_list('name', flat=True)
         )
 
         results = []
         for mt in metrictemplates:
-            vers = admin_models.MetricTemplateHistory.objects.filter(
-                object_id=mt
-            ).order_by('-date_created')
             if mt.probekey:
                 probeversion = mt.probekey.__str__()
-                tags = set()
-                probeversion_dict = dict()
-                for ver in vers:
-                    for repo in ver.probekey.package.repos.all():
-                        tags.add(repo.tag.name)
-                        if repo.tag.name not in probeversion_dict:
-                            probeversion_dict.update(
-                                {
-                                    repo.tag.name: ver.probekey.__str__()
-                                }
-                            )
-
-                tags = list(tags)
-
-                if 'CentOS 6' in probeversion_dict:
-                    centos6_probeversion = probeversion_dict['CentOS 6']
-                else:
-                    centos6_probeversion = ''
-
-                if 'CentOS 7' in probeversion_dict:
-                    centos7_probeversion = probeversion_dict['CentOS 7']
-                else:
-                    centos7_probeversion = ''
+                probeversion_dict = probeversions.get(mt.id, dict())
+                tags = sorted(probeversion_dict.keys())
 
             else:
-                tags = list(admin_models.OSTag.objects.all().values_list(
-                    'name', flat=True
-                ))
                 probeversion = ''
-                centos6_probeversion = ''
-                centos7_probeversion = ''
+                probeversion_dict = dict()
+                tags = ostags
 
-            tags.sort()
             results.append(
                 dict(
                     name=mt.name,
                     mtype=mt.mtype.name,
                     tags=sorted([tag.name for tag in mt.tags.all()]),
                     probeversion=probeversion,
-                    centos6_probeversion=centos6_probeversion,
-                    centos7_probeversion=centos7_probeversion,
-                    ostag=tags
+                    centos6_probeversion=probeversion_dict.get('CentOS 6', ''),
+                    centos7_probeversion=probeversion_dict.get('CentOS 7', ''),
+                    ostag=tags,
+                    ostag_probeversion=dict(
+                        (tag, probeversion_dict.get(tag, '')) for tag in tags
+                    )
                 )
             )
 
@@ -500,85 +602,15 @@ class BulkDeleteMetricTemplates(APIView):
     def post(self, request):
         metrictemplates = dict(request.data)['metrictemplates']
 
-        schemas = list(
-            Tenant.objects.all().values_list('schema_name', flat=True)
-        )
-        schemas.remove(get_public_schema_name())
-
-        warning_message = []
-        for schema in schemas:
-            with schema_context(schema):
-                try:
-                    mip = get_metrics_in_profiles(schema)
-                except Exception as e:
-                    warning_message.append(
-                        '{}: Metrics are not removed from metric profiles. '
-                        'Unable to get metric profiles: {}'.format(
-                            schema, str(e)
-                        )
-                    )
-                    continue
-
-                inter = set(metrictemplates).intersection(set(list(mip.keys())))
-                profiles = dict()
-                for metric in metrictemplates:
-                    try:
-                        instance = Metric.objects.get(name=metric)
-                        TenantHistory.objects.filter(
-                            object_id=instance.id
-                        ).delete()
-                        instance.delete()
-
-                    except Metric.DoesNotExist:
-                        continue
-
-                    for key, value in mip.items():
-                        if metric in inter and key == metric:
-                            for p in value:
-                                if p in profiles:
-                                    profiles.update({p: profiles[p] + [key]})
-                                else:
-                                    profiles.update({p: [key]})
-
-                if profiles:
-                    for key, value in profiles.items():
-                        try:
-                            delete_metrics_from_profile(key, value)
-
-                        except Exception as e:
-                            if len(value) > 1:
-                                noun = 'Metrics {}'.format(', '.join(value))
-                            else:
-                                noun = 'Metric {}'.format(value[0])
-
-                            warning_message.append(
-                                '{}: {} not deleted from profile {}: {}'.format(
-                                    schema, noun, key, str(e)
-                                )
-                            )
-
-        response_message = dict()
-        mt = admin_models.MetricTemplate.objects.filter(
-            name__in=metrictemplates
-        )
-
-        mt.delete()
-
-        if len(metrictemplates) > 1:
-            msg = 'Metric templates {}'.format(', '.join(metrictemplates))
-
-        else:
-            msg = 'Metric template {}'.format(metrictemplates[0])
-
-        response_message.update({
-            'info': '{} successfully deleted.'.format(msg)
-        })
-
-        if warning_message:
-            response_message.update({'warning': '; '.join(warning_message)})
+        if run_async(request):
+            return job_accepted(
+                delete_metric_templates, request,
+                metrictemplates=metrictemplates
+            )
 
         return Response(
-            data=response_message, status=status.HTTP_200_OK
+            data=delete_metric_templates(metrictemplates),
+            status=status.HTTP_200_OK
         )
 
 
@@ -2,8 +2,7 @@ import datetime
 
 from django.db import IntegrityError
 
-import json
-
+from Poem.api.internal_views.jobs import run_async, job_accepted
 from Poem.api.views import NotFound
 from Poem.helpers.history_helpers import create_history, update_comment
 from Poem.poem import models as poem_models
@@ -18,6 +17,21 @@ from rest_framework.views import APIView
 from tenant_schemas.utils import schema_context, get_public_schema_name
 
 
+def update_probe_in_metrics_history(probekey, progress=None):
+    """
+    Job renaming probe in history of tenants' metrics using it.
+    """
+    schemas = admin_models.metric_schemas(probekey=probekey)
+    for done, schema in enumerate(schemas, 1):
+        with schema_context(schema):
+            poem_models.update_metric_history_probekeys([probekey])
+
+        if progress:
+            progress(done, len(schemas))
+
+    return dict()
+
+
 class ListProbes(APIView):
     authentication_classes = (SessionAuthentication,)
 
@@ -79,11 +93,6 @@ class ListProbes(APIView):
             return Response(results)
 
     def put(self, request):
-        schemas = list(
-            Tenant.objects.all().values_list('schema_name', flat=True)
-        )
-        schemas.remove(get_public_schema_name())
-
         probe = admin_models.Probe.objects.get(id=request.data['id'])
         old_name = probe.name
         try:
@@ -163,33 +172,20 @@ class ListProbes(APIView):
                     )
                 })
                 history.update(**new_data)
+                poem_models.bump_change_counter('metrics', all_tenants=True)
+                admin_models.update_metrictemplate_ostags(
+                    admin_models.metrictemplates_with_packages([package])
+                )
 
                 # update Metric history in case probekey name has changed:
                 if request.data['name'] != old_name:
-                    for schema in schemas:
-                        with schema_context(schema):
-                            metrics = poem_models.Metric.objects.filter(
-                                probekey=probekey
-                            )
-
-                            for metric in metrics:
-                                vers = poem_models.TenantHistory.objects.filter(
-                                    object_id=metric.id
-                                )
-
-                                for ver in vers:
-                                    serialized_data = json.loads(
-                                        ver.serialized_data
-                                    )
-
-                                    serialized_data[0]['fields']['probekey'] = \
-                                        [request.data['name'],
-                                         package.version]
+                    if run_async(request):
+                        return job_accepted(
+                            update_probe_in_metrics_history, request,
+                            probekey=probekey.id
+                        )
 
-                                    ver.serialized_data = json.dumps(
-                                        serialized_data
-                                    )
-                                    ver.save()
+                    update_probe_in_metrics_history(probekey.id)
 
             return Response(status=status.HTTP_201_CREATED)
 
@@ -1,10 +1,14 @@
+import collections
 import datetime
+import hashlib
 
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection
 
 import json
 
-from Poem.api.internal_views.utils import one_value_inline, two_value_inline
+from Poem.api.internal_views.utils import one_value_inline, \
+    two_value_inline, get_page_params
 from Poem.api.views import NotFound
 from Poem.helpers.versioned_comments import new_comment
 from Poem.poem import models as poem_models
@@ -15,6 +19,188 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 
+# approximate number of bytes taken by rendered versions kept in memory by
+# all the tenants together; versions of metrics and profiles with large
+# configuration take more of it than the small ones, so the number of
+# cached versions adapts to the size of histories
+RENDERED_VERSIONS_CACHE_BYTES = 64 * 1024 * 1024
+
+_rendered_versions = collections.OrderedDict()
+_rendered_versions_bytes = 0
+
+
+def render_version(obj, ver):
+    version = datetime.datetime.strftime(
+        ver.date_created, '%Y%m%d-%H%M%S'
+    )
+    fields0 = json.loads(ver.serialized_data)[0]['fields']
+
+    if isinstance(obj, poem_models.Metric):
+        if fields0['probekey']:
+            probeversion = '{} ({})'.format(
+                fields0['probekey'][0], fields0['probekey'][1]
+            )
+        else:
+            probeversion = ''
+
+        if 'description' in fields0:
+            description = fields0['description']
+        else:
+            description = ''
+
+        if 'group' in fields0 and fields0['group']:
+            group = fields0['group'][0]
+
+        else:
+            group = ''
+
+        tags = []
+        if 'tags' in fields0:
+            tags = [tag[0] for tag in fields0['tags']]
+
+        fields = {
+            'name': fields0['name'],
+            'mtype': fields0['mtype'][0],
+            'tags': tags,
+            'group': group,
+            'probeversion': probeversion,
+            'description': description,
+            'parent': one_value_inline(fields0['parent']),
+            'probeexecutable': one_value_inline(
+                fields0['probeexecutable']
+            ),
+            'config': two_value_inline(fields0['config']),
+            'attribute': two_value_inline(
+                fields0['attribute']
+            ),
+            'dependancy': two_value_inline(
+                fields0['dependancy']
+            ),
+            'flags': two_value_inline(fields0['flags']),
+            'files': two_value_inline(fields0['files']),
+            'parameter': two_value_inline(
+                fields0['parameter']
+            ),
+            'fileparameter': two_value_inline(
+                fields0['fileparameter']
+            )
+        }
+
+    elif isinstance(obj, poem_models.MetricProfiles):
+        mi = [
+            {
+                'service': item[0], 'metric': item[1]
+            } for item in fields0['metricinstances']
+        ]
+        fields = {
+            'name': fields0['name'],
+            'groupname': fields0['groupname'],
+            'description': fields0.get('description', ''),
+            'apiid': fields0['apiid'],
+            'metricinstances': sorted(
+                mi, key=lambda k: k['service'].lower()
+            )
+        }
+
+    else:
+        fields = fields0
+
+    try:
+        comment = []
+        untracked_fields = [
+            'mtype', 'parent', 'probeexecutable',
+            'attribute', 'dependancy', 'flags', 'files',
+            'parameter', 'fileparameter'
+        ]
+        if isinstance(obj, poem_models.Metric):
+            untracked_fields.append('name')
+
+        for item in json.loads(ver.comment):
+            if 'changed' in item:
+                action = 'changed'
+
+            elif 'added' in item:
+                action = 'added'
+
+            else:
+                action = 'deleted'
+
+            if 'object' not in item[action]:
+                new_fields = []
+                for field in item[action]['fields']:
+                    if field not in untracked_fields:
+                        new_fields.append(field)
+
+                if new_fields:
+                    comment.append(
+                        {action: {'fields': new_fields}}
+                    )
+
+            else:
+                if item[action]['fields'][0] not in \
+                        untracked_fields:
+                    if item[action]['fields'][0] == 'config':
+                        if 'path' in item[action]['object']:
+                            item[action]['object'].remove('path')
+                    comment.append(item)
+
+        comment = json.dumps(comment)
+
+    except json.JSONDecodeError:
+        comment = ver.comment
+
+    return dict(
+        id=ver.id,
+        object_repr=ver.object_repr,
+        fields=fields,
+        user=ver.user,
+        date_created=datetime.datetime.strftime(
+            ver.date_created, '%Y-%m-%d %H:%M:%S'
+        ),
+        comment=new_comment(comment),
+        version=version
+    )
+
+
+def get_rendered_version(obj, ver):
+    """
+    Returns version rendered for listing. Rendered versions are cached by
+    history row id, and are rendered again only if the row was rewritten
+    in the meantime. Least recently used versions are dropped once the
+    cache grows over RENDERED_VERSIONS_CACHE_BYTES.
+    """
+    global _rendered_versions_bytes
+
+    key = (connection.schema_name, ver.id)
+    source = tuple(
+        hashlib.sha1(data.encode()).digest()
+        for data in [ver.serialized_data, ver.object_repr, ver.comment]
+    )
+
+    entry = _rendered_versions.get(key)
+    if entry and entry[0] == source:
+        _rendered_versions.move_to_end(key)
+        return entry[1]
+
+    if entry:
+        _rendered_versions_bytes -= entry[2]
+
+    rendered = render_version(obj, ver)
+    # rendered version holds about the same data as the history row
+    size = len(ver.serialized_data) + len(ver.object_repr) + \
+        len(ver.comment)
+    _rendered_versions[key] = (source, rendered, size)
+    _rendered_versions.move_to_end(key)
+    _rendered_versions_bytes += size
+
+    while _rendered_versions_bytes > RENDERED_VERSIONS_CACHE_BYTES and \
+            len(_rendered_versions) > 1:
+        _, (_, _, evicted) = _rendered_versions.popitem(last=False)
+        _rendered_versions_bytes -= evicted
+
+    return rendered
+
+
 class ListTenantVersions(APIView):
     authentication_classes = (SessionAuthentication,)
 
@@ -42,150 +228,42 @@ class ListTenantVersions(APIView):
 
                 raise NotFound(status=404, detail=msg)
 
+            try:
+                limit, cursor = get_page_params(request)
+                if cursor is not None:
+                    cursor = int(cursor)
+
+            except ValueError:
+                return Response(
+                    {'detail': 'Invalid limit or cursor.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
             vers = poem_models.TenantHistory.objects.filter(
                 object_id=obj.id,
                 content_type=ct
-            ).order_by('date_created')
+            ).order_by('-id')
 
-            if vers.count() == 0:
-                raise NotFound(status=404, detail='Version not found.')
+            if cursor is not None:
+                vers = vers.filter(id__lt=cursor)
 
+            if limit:
+                vers = list(vers[:limit + 1])
             else:
-                results = []
-                for ver in vers:
-                    version = datetime.datetime.strftime(
-                        ver.date_created, '%Y%m%d-%H%M%S'
-                    )
-                    fields0 = json.loads(ver.serialized_data)[0]['fields']
-
-                    if isinstance(obj, poem_models.Metric):
-                        if fields0['probekey']:
-                            probeversion = '{} ({})'.format(
-                                fields0['probekey'][0], fields0['probekey'][1]
-                            )
-                        else:
-                            probeversion = ''
-
-                        if 'description' in fields0:
-                            description = fields0['description']
-                        else:
-                            description = ''
-
-                        if 'group' in fields0 and fields0['group']:
-                            group = fields0['group'][0]
-
-                        else:
-                            group = ''
-
-                        tags = []
-                        if 'tags' in fields0:
-                            tags = [tag[0] for tag in fields0['tags']]
-
-                        fields = {
-                            'name': fields0['name'],
-                            'mtype': fields0['mtype'][0],
-                            'tags': tags,
-                            'group': group,
-                            'probeversion': probeversion,
-                            'description': description,
-                            'parent': one_value_inline(fields0['parent']),
-                            'probeexecutable': one_value_inline(
-                                fields0['probeexecutable']
-                            ),
-                            'config': two_value_inline(fields0['config']),
-                            'attribute': two_value_inline(
-                                fields0['attribute']
-                            ),
-                            'dependancy': two_value_inline(
-                                fields0['dependancy']
-                            ),
-                            'flags': two_value_inline(fields0['flags']),
-                            'files': two_value_inline(fields0['files']),
-                            'parameter': two_value_inline(
-                                fields0['parameter']
-                            ),
-                            'fileparameter': two_value_inline(
-                                fields0['fileparameter']
-                            )
-                        }
-
-                    elif isinstance(obj, poem_models.MetricProfiles):
-                        mi = [
-                            {
-                                'service': item[0], 'metric': item[1]
-                            } for item in fields0['metricinstances']
-                        ]
-                        fields = {
-                            'name': fields0['name'],
-                            'groupname': fields0['groupname'],
-                            'description': fields0.get('description', ''),
-                            'apiid': fields0['apiid'],
-                            'metricinstances': sorted(
-                                mi, key=lambda k: k['service'].lower()
-                            )
-                        }
-
-                    else:
-                        fields = fields0
-
-                    try:
-                        comment = []
-                        untracked_fields = [
-                            'mtype', 'parent', 'probeexecutable',
-                            'attribute', 'dependancy', 'flags', 'files',
-                            'parameter', 'fileparameter'
-                        ]
-                        if isinstance(obj, poem_models.Metric):
-                            untracked_fields.append('name')
-
-                        for item in json.loads(ver.comment):
-                            if 'changed' in item:
-                                action = 'changed'
-
-                            elif 'added' in item:
-                                action = 'added'
-
-                            else:
-                                action = 'deleted'
-
-                            if 'object' not in item[action]:
-                                new_fields = []
-                                for field in item[action]['fields']:
-                                    if field not in untracked_fields:
-                                        new_fields.append(field)
-
-                                if new_fields:
-                                    comment.append(
-                                        {action: {'fields': new_fields}}
-                                    )
-
-                            else:
-                                if item[action]['fields'][0] not in \
-                                        untracked_fields:
-                                    if item[action]['fields'][0] == 'config':
-                                        if 'path' in item[action]['object']:
-                                            item[action]['object'].remove('path')
-                                    comment.append(item)
-
-                        comment = json.dumps(comment)
-
-                    except json.JSONDecodeError:
-                        comment = ver.comment
-
-                    results.append(dict(
-                        id=ver.id,
-                        object_repr=ver.object_repr,
-                        fields=fields,
-                        user=ver.user,
-                        date_created=datetime.datetime.strftime(
-                            ver.date_created, '%Y-%m-%d %H:%M:%S'
-                        ),
-                        comment=new_comment(comment),
-                        version=version
-                    ))
-
-                results = sorted(results, key=lambda k: k['id'], reverse=True)
-                return Response(results)
+                vers = list(vers)
+
+            if not vers and cursor is None:
+                raise NotFound(status=404, detail='Version not found.')
+
+            results = [get_rendered_version(obj, ver) for ver in vers[:limit]]
+
+            if limit:
+                return Response({
+                    'results': results,
+                    'next': vers[limit - 1].id if len(vers) > limit else None
+                })
+
+            return Response(results)
 
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
@@ -1,8 +1,6 @@
-from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 
 from Poem.api import serializers
-from Poem.api.internal_views.utils import sync_webapi
 from Poem.api.views import NotFound
 from Poem.helpers.history_helpers import create_profile_history
 from Poem.poem.models import ThresholdsProfiles, GroupOfThresholdsProfiles, \
@@ -18,8 +16,6 @@ class ListThresholdsProfiles(APIView):
     authentication_classes = (SessionAuthentication,)
 
     def get(self, request, name=None):
-        sync_webapi(settings.WEBAPI_THRESHOLDS, ThresholdsProfiles)
-
         if name:
             try:
                 profile = ThresholdsProfiles.objects.get(name=name)
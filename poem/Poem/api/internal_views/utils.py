@@ -1,17 +1,41 @@
+import functools
 import json
 
-import requests
-from Poem.api.models import MyAPIKey
 from Poem.helpers.history_helpers import create_profile_history
+from Poem.helpers.webapi_helpers import get_webapi_data
 from Poem.poem import models as poem_models
 from Poem.poem_super_admin import models as admin_models
 from django.contrib.contenttypes.models import ContentType
+from django.db.models import F, CharField, Func
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
 from tenant_schemas.utils import schema_context, get_public_schema_name
 
 
+# inline fields have few distinct values which are repeated across metrics,
+# so each one is decoded only once
+INLINE_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=INLINE_CACHE_SIZE)
+def _load_inline(input):
+    return tuple(json.loads(input))
+
+
+@functools.lru_cache(maxsize=INLINE_CACHE_SIZE)
+def _split_inline(input):
+    results = []
+
+    for item in _load_inline(input):
+        key, _, value = item.partition(' ')
+        results.append((key, value))
+
+    return tuple(results)
+
+
 def one_value_inline(input):
     if input:
-        return json.loads(input)[0]
+        return _load_inline(input)[0]
     else:
         return ''
 
@@ -20,18 +44,8 @@ def two_value_inline(input):
     results = []
 
     if input:
-        data = json.loads(input)
-
-        for item in data:
-            if len(item.split(' ')) == 1:
-                results.append({
-                    'key': item.split(' ')[0],
-                    'value': ''
-                })
-            else:
-                val = ' '.join(item.split(' ')[1:])
-                results.append(({'key': item.split(' ')[0],
-                                 'value': val}))
+        for key, value in _split_inline(input):
+            results.append({'key': key, 'value': value})
 
     return results
 
@@ -54,93 +68,155 @@ def two_value_inline_dict(input):
     results = dict()
 
     if input:
-        data = json.loads(input)
-
-        for item in data:
-            if len(item.split(' ')) == 1:
-                results.update({item.split(' ')[0]: ''})
-            else:
-                val = ' '.join(item.split(' ')[1:])
-                results.update(({item.split(' ')[0]: val}))
+        results.update(_split_inline(input))
 
     return results
 
 
+# number of rows fetched from database at once when streaming listings
+STREAM_CHUNK_SIZE = 500
+
+
+def collate_c(expression):
+    """
+    Returns text expression compared by code points, the way Python sorts
+    strings, regardless of the database collation.
+    """
+    return Func(
+        expression, template='(%(expressions)s) COLLATE "C"',
+        output_field=CharField()
+    )
+
+
+def iterate_by_name(queryset, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Iterates over objects ordered by code points of their unique name,
+    fetching chunk_size rows at a time. Unlike queryset.iterator(),
+    prefetch_related() still applies to each chunk.
+    """
+    last = None
+
+    while True:
+        chunk = queryset.annotate(
+            sort_name=collate_c(F('name'))
+        ).order_by('sort_name')
+        if last is not None:
+            chunk = chunk.filter(sort_name__gt=last)
+
+        chunk = list(chunk[:chunk_size])
+        for obj in chunk:
+            yield obj
+
+        if len(chunk) < chunk_size:
+            break
+
+        last = chunk[-1].name
+
+
+def stream_json(items, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Returns response with JSON array of items which is written while items
+    are produced, instead of building the whole list in memory first.
+    """
+    def content():
+        buffer = ['[']
+
+        for i, item in enumerate(items):
+            if i:
+                buffer.append(',')
+
+            buffer.append(json.dumps(
+                item, cls=JSONEncoder, ensure_ascii=False,
+                separators=(',', ':')
+            ))
+
+            if len(buffer) >= chunk_size:
+                yield ''.join(buffer)
+                buffer = []
+
+        buffer.append(']')
+        yield ''.join(buffer)
+
+    return StreamingHttpResponse(content(), content_type='application/json')
+
+
+def get_page_params(request):
+    """
+    Returns limit and cursor query parameters of paginated listing, or None
+    for the ones which are not given. ValueError is raised if limit is not
+    positive integer.
+    """
+    limit = request.query_params.get('limit')
+    if limit is not None:
+        limit = int(limit)
+        if limit < 1:
+            raise ValueError('Limit must be positive.')
+
+    return limit, request.query_params.get('cursor') or None
+
+
 def sync_webapi(api, model):
-    token = MyAPIKey.objects.get(name="WEB-API")
-
-    headers = {'Accept': 'application/json', 'x-api-key': token.token}
-    response = requests.get(api,
-                            headers=headers,
-                            timeout=180)
-    response.raise_for_status()
-    data = response.json()['data']
-
-    data_api = set([p['id'] for p in data])
-    data_db = set(model.objects.all().values_list('apiid', flat=True))
-    entries_not_indb = data_api.difference(data_db)
-    entries_indb = data_api.intersection(data_db)
-
-    new_entries = []
-    for p in data:
-        if p['id'] in entries_not_indb:
-            new_entries.append(
-                dict(name=p['name'], description=p.get('description', ''),
-                     apiid=p['id'], groupname='')
-            )
-
-    if new_entries:
-        for entry in new_entries:
-            instance = model.objects.create(**entry)
-
-            if isinstance(instance, poem_models.MetricProfiles):
-                services = []
-                for item in data:
-                    if item['id'] == instance.apiid:
-                        for service in item['services']:
-                            for metric in service['metrics']:
-                                services.append(
-                                    dict(
-                                        service=service['service'],
-                                        metric=metric
-                                    )
-                                )
-                        description = item.get('description', '')
-                create_profile_history(instance, services, 'poem', description)
-
-            if isinstance(instance, poem_models.Aggregation):
-                for item in data:
-                    if item['id'] == instance.apiid:
-                        aggr_data = {
-                            'endpoint_group': item['endpoint_group'],
-                            'metric_operation': item['metric_operation'],
-                            'profile_operation': item['profile_operation'],
-                            'metric_profile': item['metric_profile']['name'],
-                            'groups': item['groups']
-                        }
-                create_profile_history(instance, aggr_data, 'poem')
-
-            if isinstance(instance, poem_models.ThresholdsProfiles):
-                for item in data:
-                    if item['id'] == instance.apiid:
-                        tp_data = {'rules': item['rules']}
-                create_profile_history(instance, tp_data, 'poem')
-
-    entries_deleted_onapi = data_db.difference(data_api)
-    for p in entries_deleted_onapi:
-        instance = model.objects.get(apiid=p)
+    # data is always revalidated, since it is written to the database
+    data = get_webapi_data(api, max_age=0)
+    data_api = dict((p['id'], p) for p in data)
+    data_db = dict(
+        (instance.apiid, instance) for instance in model.objects.all()
+    )
+
+    for apiid in set(data_api).difference(set(data_db)):
+        item = data_api[apiid]
+        description = item.get('description', '')
+        instance = model.objects.create(
+            name=item['name'], description=description, apiid=apiid,
+            groupname=''
+        )
+
+        if isinstance(instance, poem_models.MetricProfiles):
+            services = []
+            for service in item['services']:
+                for metric in service['metrics']:
+                    services.append(
+                        dict(service=service['service'], metric=metric)
+                    )
+            create_profile_history(instance, services, 'poem', description)
+
+        if isinstance(instance, poem_models.Aggregation):
+            aggr_data = {
+                'endpoint_group': item['endpoint_group'],
+                'metric_operation': item['metric_operation'],
+                'profile_operation': item['profile_operation'],
+                'metric_profile': item['metric_profile']['name'],
+                'groups': item['groups']
+            }
+            create_profile_history(instance, aggr_data, 'poem')
+
+        if isinstance(instance, poem_models.ThresholdsProfiles):
+            tp_data = {'rules': item['rules']}
+            create_profile_history(instance, tp_data, 'poem')
+
+    deleted_ids = [
+        data_db[apiid].id for apiid in set(data_db).difference(set(data_api))
+    ]
+    if deleted_ids:
         poem_models.TenantHistory.objects.filter(
-            object_id=instance.id,
+            object_id__in=deleted_ids,
             content_type=ContentType.objects.get_for_model(model)
         ).delete()
-        instance.delete()
-
-    for p in data:
-        if p['id'] in entries_indb:
-            instance = model.objects.get(apiid=p['id'])
-            instance.name = p['name']
-            instance.description = p.get('description', '')
-            instance.save()
+        model.objects.filter(id__in=deleted_ids).delete()
+
+    changed = []
+    for apiid in set(data_api).intersection(set(data_db)):
+        instance = data_db[apiid]
+        name = data_api[apiid]['name']
+        description = data_api[apiid].get('description', '')
+
+        if instance.name != name or instance.description != description:
+            instance.name = name
+            instance.description = description
+            changed.append(instance)
+
+    if changed:
+        model.objects.bulk_update(changed, ['name', 'description'])
 
 
 def get_tenant_resources(schema_name):
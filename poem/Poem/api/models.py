@@ -1,4 +1,8 @@
-from django.db import models
+import hashlib
+import time
+
+from django.db import connection, models
+from django.utils import timezone
 
 from rest_framework_api_key.crypto import KeyGenerator
 from rest_framework_api_key.models import AbstractAPIKey, BaseAPIKeyManager
@@ -18,6 +22,18 @@ class MyKeyGenerator(KeyGenerator):
         return key, prefix, hashed_key
 
 
+# number of seconds verified key is trusted without checking it again
+VERIFIED_KEY_CACHE_TIMEOUT = 60
+
+_verified_keys = dict()
+
+
+def _verified_key(key):
+    return (
+        connection.schema_name, hashlib.sha256(key.encode()).hexdigest()
+    )
+
+
 class MyAPIKeyManager(BaseAPIKeyManager):
     """
     Calling MyAPIKey.objects.create_key() should create a key with given token
@@ -43,6 +59,28 @@ class MyAPIKeyManager(BaseAPIKeyManager):
         return obj, key
 
     def is_valid(self, key):
+        """
+        Keys which passed the check are remembered for a short time, so that
+        polling clients do not go through the password hasher on every
+        request. Remembered key is still looked up by its id and token, so
+        that key revoked, deleted, expired or given new token by any process
+        is refused right away.
+        """
+        cache_key = _verified_key(key)
+        entry = _verified_keys.get(cache_key)
+        if entry and \
+                time.monotonic() - entry['verified'] < \
+                VERIFIED_KEY_CACHE_TIMEOUT:
+            if self.get_usable_keys().filter(
+                    id=entry['id'], token=key
+            ).filter(
+                    models.Q(expiry_date__isnull=True) |
+                    models.Q(expiry_date__gte=timezone.now())
+            ).exists():
+                return True
+
+        _verified_keys.pop(cache_key, None)
+
         queryset = self.get_usable_keys()
 
         try:
@@ -57,6 +95,11 @@ class MyAPIKeyManager(BaseAPIKeyManager):
         if api_key.has_expired:
             return False
 
+        _verified_keys[cache_key] = {
+            'id': api_key.id,
+            'verified': time.monotonic()
+        }
+
         return True
 
 
@@ -1,8 +1,10 @@
 import datetime
+from unittest.mock import patch
 
 from Poem.api import views_internal as views
 from Poem.api.models import MyAPIKey
 from Poem.users.models import CustUser
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import force_authenticate
 from tenant_schemas.test.cases import TenantTestCase
@@ -159,3 +161,51 @@ class ListAPIKeysAPIViewTests(TenantTestCase):
         self.assertEqual(
             response.data['detail'], 'API key name must be defined'
         )
+
+
+class MyAPIKeyManagerTests(TenantTestCase):
+    def setUp(self):
+        self.key, k = MyAPIKey.objects.create_key(name='EGI')
+
+    def test_valid_key(self):
+        self.assertTrue(MyAPIKey.objects.is_valid(self.key.token))
+
+    def test_wrong_key(self):
+        self.assertFalse(MyAPIKey.objects.is_valid('wrong_token'))
+
+    def test_verified_key_is_cached(self):
+        self.assertTrue(MyAPIKey.objects.is_valid(self.key.token))
+        with patch('Poem.api.models.MyAPIKey.is_valid') as mock_valid:
+            with self.assertNumQueries(1):
+                self.assertTrue(MyAPIKey.objects.is_valid(self.key.token))
+            self.assertFalse(mock_valid.called)
+
+    def test_key_revoked_by_other_process_is_not_valid(self):
+        self.assertTrue(MyAPIKey.objects.is_valid(self.key.token))
+        # queryset update sends no signals, like a save in other process
+        MyAPIKey.objects.filter(id=self.key.id).update(revoked=True)
+        self.assertFalse(MyAPIKey.objects.is_valid(self.key.token))
+
+    def test_key_with_rotated_token_is_not_valid(self):
+        old_token = self.key.token
+        self.assertTrue(MyAPIKey.objects.is_valid(old_token))
+        # token changed in other process, keeping the same row
+        MyAPIKey.objects.filter(id=self.key.id).update(token='new_token')
+        self.assertFalse(MyAPIKey.objects.is_valid(old_token))
+
+    def test_revoked_key_is_not_valid(self):
+        self.assertTrue(MyAPIKey.objects.is_valid(self.key.token))
+        self.key.revoked = True
+        self.key.save()
+        self.assertFalse(MyAPIKey.objects.is_valid(self.key.token))
+
+    def test_deleted_key_is_not_valid(self):
+        self.assertTrue(MyAPIKey.objects.is_valid(self.key.token))
+        self.key.delete()
+        self.assertFalse(MyAPIKey.objects.is_valid(self.key.token))
+
+    def test_expired_key_is_not_valid(self):
+        self.assertTrue(MyAPIKey.objects.is_valid(self.key.token))
+        self.key.expiry_date = timezone.now() - datetime.timedelta(days=1)
+        self.key.save()
+        self.assertFalse(MyAPIKey.objects.is_valid(self.key.token))
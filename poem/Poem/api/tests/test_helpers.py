@@ -4,10 +4,13 @@ from unittest.mock import patch, call
 
 import requests
 from Poem.api.models import MyAPIKey
-from Poem.helpers.history_helpers import create_comment, update_comment
+from Poem.helpers.history_helpers import create_comment, update_comment, \
+    analyze_differences
 from Poem.helpers.metrics_helpers import import_metrics, update_metrics, \
     update_metrics_in_profiles, get_metrics_in_profiles, \
-    delete_metrics_from_profile
+    delete_metrics_from_profile, for_each_tenant
+from Poem.helpers.webapi_helpers import get_webapi_data, \
+    invalidate_webapi_data, clear_webapi_data, get_webapi_token
 from Poem.poem import models as poem_models
 from Poem.poem_super_admin import models as admin_models
 from Poem.tenants.models import Tenant
@@ -16,15 +19,15 @@ from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core import serializers
 from django.core.management import call_command
-from django.db import connection
+from django.db import connection, transaction
 from django.test.testcases import TransactionTestCase
 from tenant_schemas.test.cases import TenantTestCase
 from tenant_schemas.utils import get_tenant_model, get_public_schema_name, \
     schema_context
 
-from .utils_test import mocked_func, mocked_web_api_metric_profile, \
-    mocked_web_api_metric_profile_put, mocked_web_api_metric_profiles, \
-    mocked_web_api_metric_profiles_empty, \
+from .utils_test import MockResponse, mocked_func, \
+    mocked_web_api_metric_profile, mocked_web_api_metric_profile_put, \
+    mocked_web_api_metric_profiles, mocked_web_api_metric_profiles_empty, \
     mocked_web_api_metric_profiles_wrong_token
 
 ALLOWED_TEST_DOMAIN = '.test.com'
@@ -709,6 +712,34 @@ class HistoryHelpersTests(TenantTestCase):
             }
         )
 
+    def test_create_comment_for_metric_compares_with_latest_version(self):
+        metric = poem_models.Metric.objects.get(id=self.metric1.id)
+        metric.description = 'Description for metric-2.'
+        metric.save()
+        serialized_data = serializers.serialize(
+            'json', [metric],
+            use_natural_foreign_keys=True,
+            use_natural_primary_keys=True
+        )
+        poem_models.TenantHistory.objects.create(
+            object_id=metric.id,
+            serialized_data=serialized_data,
+            object_repr=metric.__str__(),
+            content_type=self.ct_metric,
+            comment='[{"changed": {"fields": ["description"]}}]',
+            user='testuser'
+        )
+        metric.parent = ''
+        metric.save()
+        serialized_data = serializers.serialize(
+            'json', [metric],
+            use_natural_foreign_keys=True,
+            use_natural_primary_keys=True
+        )
+        with self.assertNumQueries(1):
+            comment = create_comment(metric, self.ct_metric, serialized_data)
+        self.assertEqual(comment, '[{"deleted": {"fields": ["parent"]}}]')
+
     def test_create_comment_for_metric_if_initial(self):
         mt = poem_models.Metric.objects.create(
             name='metric-template-2',
@@ -961,6 +992,59 @@ class HistoryHelpersTests(TenantTestCase):
         comment = create_comment(tp, self.ct_tp, json.dumps(data))
         self.assertEqual(comment, 'Initial version.')
 
+    def test_analyze_differences_ignores_order_of_items(self):
+        old_data = {
+            'name': 'TEST_PROFILE',
+            'metricinstances': [
+                ['AMGA', 'org.nagios.SAML-SP'],
+                ['APEL', 'org.apel.APEL-Pub']
+            ],
+            'config': '["maxCheckAttempts 3", "timeout 60"]'
+        }
+        new_data = {
+            'name': 'TEST_PROFILE',
+            'metricinstances': [
+                ['APEL', 'org.apel.APEL-Pub'],
+                ['AMGA', 'org.nagios.SAML-SP']
+            ],
+            'config': '["timeout 60", "maxCheckAttempts 3"]'
+        }
+        self.assertEqual(analyze_differences(old_data, new_data), '[]')
+
+    def test_analyze_differences_ignores_order_of_nested_items(self):
+        old_data = {
+            'name': 'TEST_PROFILE',
+            'groups': [
+                {
+                    'name': 'Group0',
+                    'operation': 'AND',
+                    'services': [
+                        {'name': 'AMGA', 'operation': 'OR'},
+                        {'name': 'APEL', 'operation': 'OR'}
+                    ]
+                }
+            ]
+        }
+        new_data = {
+            'name': 'TEST_PROFILE',
+            'groups': [
+                {
+                    'name': 'Group0',
+                    'operation': 'AND',
+                    'services': [
+                        {'name': 'APEL', 'operation': 'OR'},
+                        {'name': 'AMGA', 'operation': 'OR'}
+                    ]
+                }
+            ]
+        }
+        self.assertEqual(analyze_differences(old_data, new_data), '[]')
+        new_data['groups'][0]['services'][0]['operation'] = 'AND'
+        self.assertEqual(
+            json.loads(analyze_differences(old_data, new_data)),
+            [{'changed': {'fields': ['groups'], 'object': ['Group0']}}]
+        )
+
 
 class MetricsHelpersTests(TransactionTestCase):
     """
@@ -981,6 +1065,7 @@ class MetricsHelpersTests(TransactionTestCase):
             settings.ALLOWED_HOSTS.remove(ALLOWED_TEST_DOMAIN)
 
     def tearDown(self):
+        clear_webapi_data()
         connection.set_schema_to_public()
         self.tenant.delete()
 
@@ -2099,6 +2184,17 @@ class MetricsHelpersTests(TransactionTestCase):
             serialized_data2['fileparameter'], metric2.fileparameter
         )
 
+    def test_import_metrics_bumps_change_counter(self):
+        counter = poem_models.ChangeCounter.objects.current('metrics').counter
+        import_metrics(
+            ['eu.egi.cloud.OpenStack-VM', 'org.nagios.CertLifetime2'],
+            self.tenant, self.user
+        )
+        self.assertEqual(
+            poem_models.ChangeCounter.objects.get(name='metrics').counter,
+            counter + 1
+        )
+
     def test_import_passive_metric_successfully(self):
         self.assertEqual(poem_models.Metric.objects.all().count(), 5)
         success, warning, error, unavailable = import_metrics(
@@ -2771,9 +2867,40 @@ class MetricsHelpersTests(TransactionTestCase):
         self.assertEqual(metric.parameter, '["--project EGI"]')
         self.assertEqual(metric.fileparameter, '')
 
-    @patch('Poem.helpers.metrics_helpers.requests.put')
-    @patch('Poem.helpers.metrics_helpers.requests.get')
-    @patch('Poem.helpers.metrics_helpers.MyAPIKey.objects.get')
+    def test_for_each_tenant(self):
+        results = for_each_tenant(
+            lambda schema, n: (schema, connection.schema_name, n), 1
+        )
+        self.assertEqual(results, [('test', 'test', 1)])
+
+    @patch('Poem.helpers.metrics_helpers.Tenant.objects.all')
+    def test_for_each_tenant_in_parallel(self, mock_tenants):
+        mock_tenants.return_value.values_list.return_value = [
+            get_public_schema_name(), 'test', 'test', 'test'
+        ]
+        results = for_each_tenant(
+            lambda schema: (
+                schema, connection.schema_name,
+                poem_models.Metric.objects.all().count()
+            )
+        )
+        self.assertEqual(results, 3 * [('test', 'test', 5)])
+
+    @patch('Poem.helpers.metrics_helpers.Tenant.objects.all')
+    def test_for_each_tenant_inside_transaction(self, mock_tenants):
+        mock_tenants.return_value.values_list.return_value = [
+            get_public_schema_name(), 'test', 'test'
+        ]
+        with transaction.atomic():
+            poem_models.Metric.objects.all().delete()
+            results = for_each_tenant(
+                lambda schema: poem_models.Metric.objects.all().count()
+            )
+        self.assertEqual(results, [0, 0])
+
+    @patch('Poem.helpers.webapi_helpers.requests.Session.put')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    @patch('Poem.helpers.webapi_helpers.MyAPIKey.objects.get')
     def test_update_metrics_in_profiles(self, mock_key, mock_get, mock_put):
         with self.settings(WEBAPI_METRIC='https://mock.api.url'):
             mock_key.return_value = MyAPIKey(name='WEB-API', token='mock_key')
@@ -2805,12 +2932,61 @@ class MetricsHelpersTests(TransactionTestCase):
                             }
                         ]
                     }
-                )
+                ),
+                timeout=180
             )
             self.assertEqual(msgs, [])
 
-    @patch('Poem.helpers.metrics_helpers.requests.get')
-    @patch('Poem.helpers.metrics_helpers.MyAPIKey.objects.get')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.put')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    @patch('Poem.helpers.webapi_helpers.MyAPIKey.objects.get')
+    def test_update_metrics_in_multiple_profiles(
+            self, mock_key, mock_get, mock_put
+    ):
+        with self.settings(WEBAPI_METRIC='https://mock.api.url'):
+            mock_key.return_value = MyAPIKey(name='WEB-API', token='mock_key')
+            mock_get.side_effect = mocked_web_api_metric_profiles
+            msgs = update_metrics_in_profiles('metric2', 'new.metric2')
+            self.assertEqual(mock_put.call_count, 2)
+            self.assertEqual(
+                sorted([c[0][0] for c in mock_put.call_args_list]),
+                [
+                    'https://mock.api.url/'
+                    '11111111-2222-3333-4444-555555555555',
+                    'https://mock.api.url/'
+                    '66666666-7777-8888-9999-000000000000'
+                ]
+            )
+            for c in mock_put.call_args_list:
+                self.assertTrue(
+                    'new.metric2' in c[1]['data'] and
+                    '"metric2"' not in c[1]['data']
+                )
+            self.assertEqual(msgs, [])
+
+    @patch('Poem.helpers.webapi_helpers.requests.Session.put')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    @patch('Poem.helpers.webapi_helpers.MyAPIKey.objects.get')
+    def test_update_metrics_in_profiles_if_put_fails(
+            self, mock_key, mock_get, mock_put
+    ):
+        with self.settings(WEBAPI_METRIC='https://mock.api.url'):
+            mock_key.return_value = MyAPIKey(name='WEB-API', token='mock_key')
+            mock_get.side_effect = mocked_web_api_metric_profiles
+            mock_put.return_value = MockResponse(None, 404)
+            msgs = update_metrics_in_profiles('metric2', 'new.metric2')
+            self.assertEqual(mock_put.call_count, 2)
+            self.assertEqual(
+                msgs,
+                [
+                    'TEST: Error trying to update metric in metric profiles: '
+                    '404 Client Error: Not Found.'
+                    '\nPlease update metric profiles manually.'
+                ]
+            )
+
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    @patch('Poem.helpers.webapi_helpers.MyAPIKey.objects.get')
     def test_update_metrics_in_profiles_wrong_token(self, mock_key, mock_get):
         with self.settings(WEBAPI_METRIC='https://mock.api.url'):
             mock_key.return_value = MyAPIKey(name='WEB-API', token='wrong_key')
@@ -2836,9 +3012,9 @@ class MetricsHelpersTests(TransactionTestCase):
                 ]
             )
 
-    @patch('Poem.helpers.metrics_helpers.requests.put')
-    @patch('Poem.helpers.metrics_helpers.requests.get')
-    @patch('Poem.helpers.metrics_helpers.MyAPIKey.objects.get')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.put')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    @patch('Poem.helpers.webapi_helpers.MyAPIKey.objects.get')
     def test_update_metrics_in_profiles_if_response_empty(
             self, mock_key, mock_get, mock_put
     ):
@@ -2849,9 +3025,9 @@ class MetricsHelpersTests(TransactionTestCase):
             self.assertEqual(msgs, [])
             self.assertFalse(mock_put.called)
 
-    @patch('Poem.helpers.metrics_helpers.requests.put')
-    @patch('Poem.helpers.metrics_helpers.requests.get')
-    @patch('Poem.helpers.metrics_helpers.MyAPIKey.objects.get')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.put')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    @patch('Poem.helpers.webapi_helpers.MyAPIKey.objects.get')
     def test_update_metrics_in_profiles_if_same_name(
             self, mock_key, mock_get, mock_put
     ):
@@ -2862,8 +3038,8 @@ class MetricsHelpersTests(TransactionTestCase):
             self.assertEqual(msgs, [])
             self.assertFalse(mock_put.called)
 
-    @patch('Poem.helpers.metrics_helpers.requests.get')
-    @patch('Poem.helpers.metrics_helpers.MyAPIKey.objects.get')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    @patch('Poem.helpers.webapi_helpers.MyAPIKey.objects.get')
     def test_get_metrics_in_profiles(self, mock_key, mock_get):
         with self.settings(WEBAPI_METRIC='https://mock.api.url'):
             mock_key.return_value = MyAPIKey(name='WEB-API', token='mock_key')
@@ -2887,8 +3063,19 @@ class MetricsHelpersTests(TransactionTestCase):
                 }
             )
 
-    @patch('Poem.helpers.metrics_helpers.requests.get')
-    @patch('Poem.helpers.metrics_helpers.MyAPIKey.objects.get')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    @patch('Poem.helpers.webapi_helpers.MyAPIKey.objects.get')
+    def test_get_metrics_in_profiles_is_cached(self, mock_key, mock_get):
+        with self.settings(WEBAPI_METRIC='https://mock.api.url'):
+            mock_key.return_value = MyAPIKey(name='WEB-API', token='mock_key')
+            mock_get.side_effect = mocked_web_api_metric_profiles
+            metrics1 = get_metrics_in_profiles('test')
+            metrics2 = get_metrics_in_profiles('test')
+            mock_get.assert_called_once()
+            self.assertEqual(metrics1, metrics2)
+
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    @patch('Poem.helpers.webapi_helpers.MyAPIKey.objects.get')
     def test_get_metrics_in_profiles_wrong_token(self, mock_key, mock_get):
         with self.settings(WEBAPI_METRIC='https://mock.api.url'):
             mock_key.return_value = MyAPIKey(name='WEB-API', token='wrong_key')
@@ -2908,8 +3095,8 @@ class MetricsHelpersTests(TransactionTestCase):
                 'Error fetching WEB API data: API key not found.'
             )
 
-    @patch('Poem.helpers.metrics_helpers.requests.get')
-    @patch('Poem.helpers.metrics_helpers.MyAPIKey.objects.get')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    @patch('Poem.helpers.webapi_helpers.MyAPIKey.objects.get')
     def test_get_metrics_in_profiles_if_response_empty(
             self, mock_key, mock_get
     ):
@@ -2924,11 +3111,11 @@ class MetricsHelpersTests(TransactionTestCase):
             )
             self.assertEqual(metrics, {})
 
-    @patch('Poem.helpers.metrics_helpers.requests.put')
-    @patch('Poem.helpers.metrics_helpers.requests.get')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.put')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
     @patch('Poem.helpers.metrics_helpers.poem_models.MetricProfiles.objects.'
            'get')
-    @patch('Poem.helpers.metrics_helpers.MyAPIKey.objects.get')
+    @patch('Poem.helpers.webapi_helpers.MyAPIKey.objects.get')
     def test_delete_metrics_from_profiles(
             self, mock_key, mock_profile, mock_get, mock_put
     ):
@@ -2965,13 +3152,14 @@ class MetricsHelpersTests(TransactionTestCase):
             mock_put.assert_called_once_with(
                 'https://mock.api.url/11111111-2222-3333-4444-555555555555',
                 headers={'Accept': 'application/json', 'x-api-key': 'mock_key'},
-                data=json.dumps(data)
+                data=json.dumps(data),
+                timeout=180
             )
 
-    @patch('Poem.helpers.metrics_helpers.requests.get')
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
     @patch('Poem.helpers.metrics_helpers.poem_models.MetricProfiles.objects.'
            'get')
-    @patch('Poem.helpers.metrics_helpers.MyAPIKey.objects.get')
+    @patch('Poem.helpers.webapi_helpers.MyAPIKey.objects.get')
     def test_delete_metrics_from_profiles_wrong_token(
             self, mock_key, mock_profile, mock_get
     ):
@@ -3020,3 +3208,95 @@ class MetricsHelpersTests(TransactionTestCase):
             str(context.exception),
             'Error deleting metric from profile: Profile not found.'
         )
+
+
+class WebApiHelpersTests(TenantTestCase):
+    def setUp(self):
+        MyAPIKey.objects.create(name='WEB-API', token='mock_key')
+        self.url = 'https://mock.api.url'
+
+    def tearDown(self):
+        clear_webapi_data()
+
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    def test_get_webapi_data(self, mock_get):
+        mock_get.side_effect = mocked_web_api_metric_profiles
+        data = get_webapi_data(self.url)
+        mock_get.assert_called_once_with(
+            self.url,
+            headers={'Accept': 'application/json', 'x-api-key': 'mock_key'},
+            timeout=180
+        )
+        self.assertEqual(
+            data, mocked_web_api_metric_profiles().json()['data']
+        )
+
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    def test_get_webapi_data_returns_copy(self, mock_get):
+        mock_get.side_effect = mocked_web_api_metric_profiles
+        data = get_webapi_data(self.url)
+        data[0]['services'] = []
+        self.assertNotEqual(get_webapi_data(self.url)[0]['services'], [])
+        mock_get.assert_called_once()
+
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    def test_get_webapi_data_revalidated_with_etag(self, mock_get):
+        response = mocked_web_api_metric_profiles()
+        response.headers = {'ETag': '"mock-etag"'}
+        not_modified = MockResponse(None, 304)
+        mock_get.side_effect = [response, not_modified]
+        data1 = get_webapi_data(self.url)
+        data2 = get_webapi_data(self.url, max_age=0)
+        self.assertEqual(mock_get.call_count, 2)
+        mock_get.assert_called_with(
+            self.url,
+            headers={'Accept': 'application/json', 'x-api-key': 'mock_key',
+                     'If-None-Match': '"mock-etag"'},
+            timeout=180
+        )
+        self.assertEqual(data1, data2)
+
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    def test_get_webapi_data_if_invalidated(self, mock_get):
+        mock_get.side_effect = [
+            mocked_web_api_metric_profiles(),
+            mocked_web_api_metric_profiles_empty()
+        ]
+        get_webapi_data(self.url)
+        invalidate_webapi_data(self.url)
+        data = get_webapi_data(self.url)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(data, [])
+
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    def test_get_webapi_data_wrong_token(self, mock_get):
+        mock_get.side_effect = mocked_web_api_metric_profiles_wrong_token
+        self.assertRaises(
+            requests.exceptions.HTTPError, get_webapi_data, self.url
+        )
+
+    def test_get_webapi_token_if_key_changed(self):
+        self.assertEqual(get_webapi_token(), 'mock_key')
+        key = MyAPIKey.objects.get(name='WEB-API')
+        key.token = 'new_key'
+        key.save()
+        self.assertEqual(get_webapi_token(), 'new_key')
+
+    @patch('Poem.helpers.webapi_helpers.requests.Session.get')
+    def test_get_webapi_data_if_key_changed_elsewhere(self, mock_get):
+        mock_get.side_effect = [
+            mocked_web_api_metric_profiles_wrong_token(),
+            mocked_web_api_metric_profiles()
+        ]
+        self.assertEqual(get_webapi_token(), 'mock_key')
+        MyAPIKey.objects.filter(name='WEB-API').update(token='new_key')
+        data = get_webapi_data(self.url)
+        self.assertEqual(mock_get.call_count, 2)
+        mock_get.assert_called_with(
+            self.url,
+            headers={'Accept': 'application/json', 'x-api-key': 'new_key'},
+            timeout=180
+        )
+        self.assertEqual(
+            data, mocked_web_api_metric_profiles().json()['data']
+        )
@@ -692,3 +692,94 @@ class ListVersionsAPIViewTests(TenantTestCase):
                 }
             ]
         )
+
+    def test_get_all_probe_versions_paginated(self):
+        request = self.factory.get(
+            self.url + 'probe/', {'limit': 2, 'fields': 'name,version'}
+        )
+        force_authenticate(request, user=self.user)
+        response = self.view(request, 'probe')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [ver['id'] for ver in response.data['results']],
+            [self.ver3.id, self.ver1.id]
+        )
+        self.assertEqual(
+            response.data['results'][0]['fields'],
+            {'name': 'ams-publisher-probe', 'version': '0.1.11'}
+        )
+        self.assertEqual(
+            response.data['next'],
+            '{}:poem-probe (0.1.7)'.format(self.ver1.id)
+        )
+        request = self.factory.get(
+            self.url + 'probe/',
+            {'limit': 2, 'fields': 'name', 'cursor': response.data['next']}
+        )
+        force_authenticate(request, user=self.user)
+        response = self.view(request, 'probe')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['results'],
+            [
+                {
+                    'id': self.ver2.id,
+                    'object_repr': 'poem-probe-new (0.1.11)',
+                    'fields': {'name': 'poem-probe-new'},
+                    'user': 'testuser',
+                    'date_created': datetime.datetime.strftime(
+                        self.ver2.date_created, '%Y-%m-%d %H:%M:%S'
+                    ),
+                    'comment': 'Changed name, comment, description, '
+                               'repository and docurl.',
+                    'version': '0.1.11'
+                }
+            ]
+        )
+        self.assertEqual(response.data['next'], None)
+
+    def test_get_all_probe_versions_ordered_by_object_repr(self):
+        ver4 = admin_models.ProbeHistory.objects.create(
+            object_id=self.probe1,
+            name='poem-probe',
+            package=admin_models.Package.objects.get(
+                name='nagios-plugins-argo', version='0.1.11'
+            ),
+            description='Probe inspects POEM service.',
+            comment='Initial version.',
+            repository='https://github.com/ARGOeu/nagios-plugins-argo',
+            docurl='https://github.com/ARGOeu/nagios-plugins-argo/blob/'
+                   'master/README.md',
+            version_comment='Initial version.',
+            version_user='testuser'
+        )
+        request = self.factory.get(self.url + 'probe/', {'fields': 'name'})
+        force_authenticate(request, user=self.user)
+        response = self.view(request, 'probe')
+        self.assertEqual(
+            [ver['object_repr'] for ver in response.data],
+            [
+                'ams-publisher-probe (0.1.11)',
+                'poem-probe (0.1.11)',
+                'poem-probe (0.1.7)',
+                'poem-probe-new (0.1.11)'
+            ]
+        )
+        request = self.factory.get(
+            self.url + 'probe/',
+            {'limit': 1, 'cursor': '{}:poem-probe (0.1.11)'.format(ver4.id)}
+        )
+        force_authenticate(request, user=self.user)
+        response = self.view(request, 'probe')
+        self.assertEqual(
+            [ver['id'] for ver in response.data['results']], [self.ver1.id]
+        )
+
+    def test_get_all_probe_versions_with_unknown_fields(self):
+        request = self.factory.get(
+            self.url + 'probe/', {'fields': 'name,config'}
+        )
+        force_authenticate(request, user=self.user)
+        response = self.view(request, 'probe')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'detail': 'Unknown fields: config.'})
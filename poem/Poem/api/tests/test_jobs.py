@@ -0,0 +1,174 @@
+import datetime
+import json
+from io import StringIO
+
+from Poem.api import views_internal as views
+from Poem.helpers.job_helpers import enqueue_job, claim_job, run_job
+from Poem.poem_super_admin import models as admin_models
+from Poem.users.models import CustUser
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import force_authenticate
+from tenant_schemas.test.cases import TenantTestCase
+from tenant_schemas.test.client import TenantRequestFactory
+
+
+def mocked_job(name, progress=None):
+    progress(1, 2)
+    progress(2, 2)
+    return {'info': 'Hello {}, from {}.'.format(name, connection.schema_name)}
+
+
+def mocked_failed_job(progress=None):
+    raise Exception('Something went wrong')
+
+
+def mocked_abandoned_job(progress=None):
+    # other worker gives up on the job while it is still running
+    admin_models.Job.objects.filter(status=admin_models.Job.RUNNING).update(
+        status=admin_models.Job.FAILED
+    )
+    return {'info': 'Done anyway.'}
+
+
+class ListJobsAPIViewTests(TenantTestCase):
+    def setUp(self):
+        self.factory = TenantRequestFactory(self.tenant)
+        self.view = views.ListJobs.as_view()
+        self.url = '/api/v2/internal/jobs/'
+        self.user = CustUser.objects.create_user(username='testuser')
+
+        self.job = enqueue_job(mocked_job, {'name': 'test'}, user='testuser')
+
+    def test_get_queued_job(self):
+        request = self.factory.get(self.url + str(self.job.id))
+        force_authenticate(request, user=self.user)
+        response = self.view(request, self.job.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], self.job.id)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertEqual(response.data['progress'], 0)
+        self.assertEqual(response.data['total'], 0)
+        self.assertEqual(response.data['result'], {})
+        self.assertEqual(response.data['user'], 'testuser')
+        self.assertEqual(response.data['date_started'], '')
+        self.assertEqual(response.data['date_finished'], '')
+
+    def test_get_finished_job(self):
+        run_job(claim_job())
+        request = self.factory.get(self.url + str(self.job.id))
+        force_authenticate(request, user=self.user)
+        response = self.view(request, self.job.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(response.data['progress'], 2)
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual(
+            response.data['result'], {'info': 'Hello test, from test.'}
+        )
+        self.assertNotEqual(response.data['date_finished'], '')
+
+    def test_get_nonexisting_job(self):
+        request = self.factory.get(self.url + '999')
+        force_authenticate(request, user=self.user)
+        response = self.view(request, 999)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['detail'], 'Job not found')
+
+    def test_get_job_of_another_tenant(self):
+        admin_models.Job.objects.filter(id=self.job.id).update(
+            schema_name='other'
+        )
+        request = self.factory.get(self.url + str(self.job.id))
+        force_authenticate(request, user=self.user)
+        response = self.view(request, self.job.id)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class JobHelpersTests(TenantTestCase):
+    def test_enqueue_job(self):
+        job = enqueue_job(mocked_job, {'name': 'test'}, user='testuser')
+        self.assertEqual(job.func, 'Poem.api.tests.test_jobs.mocked_job')
+        self.assertEqual(json.loads(job.arguments), {'name': 'test'})
+        self.assertEqual(job.schema_name, 'test')
+        self.assertEqual(job.status, admin_models.Job.QUEUED)
+
+    def test_claim_jobs_in_order(self):
+        job1 = enqueue_job(mocked_job, {'name': 'first'})
+        job2 = enqueue_job(mocked_job, {'name': 'second'})
+        claimed = claim_job()
+        self.assertEqual(claimed.id, job1.id)
+        self.assertEqual(claimed.status, admin_models.Job.RUNNING)
+        self.assertIsNotNone(claimed.date_started)
+        self.assertEqual(claim_job().id, job2.id)
+        self.assertIsNone(claim_job())
+
+    def test_claim_job_fails_abandoned_running_jobs(self):
+        job1 = enqueue_job(mocked_job, {'name': 'first'})
+        job2 = enqueue_job(mocked_job, {'name': 'second'})
+        claim_job()
+        admin_models.Job.objects.filter(id=job1.id).update(
+            date_updated=timezone.now() - datetime.timedelta(seconds=61)
+        )
+        with self.settings(JOB_HEARTBEAT_TIMEOUT=60):
+            self.assertEqual(claim_job().id, job2.id)
+        job1.refresh_from_db()
+        self.assertEqual(job1.status, admin_models.Job.FAILED)
+        self.assertEqual(
+            json.loads(job1.result),
+            {'detail': 'Job has been abandoned by its worker.'}
+        )
+        self.assertIsNotNone(job1.date_finished)
+        job2.refresh_from_db()
+        self.assertEqual(job2.status, admin_models.Job.RUNNING)
+
+    def test_claim_job_keeps_long_running_jobs_reporting_progress(self):
+        job1 = enqueue_job(mocked_job, {'name': 'first'})
+        enqueue_job(mocked_job, {'name': 'second'})
+        claimed = claim_job()
+        admin_models.Job.objects.filter(id=job1.id).update(
+            date_started=timezone.now() - datetime.timedelta(hours=5)
+        )
+        claimed.set_progress(1, 2)
+        with self.settings(JOB_HEARTBEAT_TIMEOUT=60):
+            claim_job()
+        job1.refresh_from_db()
+        self.assertEqual(job1.status, admin_models.Job.RUNNING)
+
+    def test_run_job_keeps_abandoned_job_failed(self):
+        enqueue_job(mocked_abandoned_job, {})
+        job = run_job(claim_job())
+        self.assertEqual(job.status, admin_models.Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual(job.status, admin_models.Job.FAILED)
+        self.assertEqual(job.result, '')
+        self.assertIsNone(job.date_finished)
+
+    def test_run_failed_job(self):
+        enqueue_job(mocked_failed_job, {})
+        job = run_job(claim_job())
+        self.assertEqual(job.status, admin_models.Job.FAILED)
+        self.assertEqual(
+            json.loads(job.result), {'detail': 'Something went wrong'}
+        )
+
+    def test_run_jobs_command(self):
+        job1 = enqueue_job(mocked_job, {'name': 'test'})
+        job2 = enqueue_job(mocked_failed_job, {})
+        err = StringIO()
+        call_command('run_jobs', stdout=StringIO(), stderr=err)
+        self.assertEqual(
+            admin_models.Job.objects.get(id=job1.id).status,
+            admin_models.Job.DONE
+        )
+        self.assertEqual(
+            admin_models.Job.objects.get(id=job2.id).status,
+            admin_models.Job.FAILED
+        )
+        self.assertEqual(
+            err.getvalue(),
+            'TEST: Job {} (Poem.api.tests.test_jobs.mocked_failed_job) '
+            'failed: {{"detail": "Something went wrong"}}\n'.format(job2.id)
+        )
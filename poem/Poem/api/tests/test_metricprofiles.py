@@ -1,6 +1,5 @@
 import json
 from collections import OrderedDict
-from unittest.mock import patch
 
 from Poem.api import views_internal as views
 from Poem.poem import models as poem_models
@@ -12,7 +11,7 @@ from rest_framework.test import force_authenticate
 from tenant_schemas.test.cases import TenantTestCase
 from tenant_schemas.test.client import TenantRequestFactory
 
-from .utils_test import mocked_func, encode_data
+from .utils_test import encode_data
 
 
 class ListServiceFlavoursAPIViewTests(TenantTestCase):
@@ -130,9 +129,7 @@ class ListMetricProfilesAPIViewTests(TenantTestCase):
             content_type=self.ct
         )
 
-    @patch('Poem.api.internal_views.metricprofiles.sync_webapi')
-    def test_get_all_metric_profiles(self, func):
-        func.side_effect = mocked_func
+    def test_get_all_metric_profiles(self):
         request = self.factory.get(self.url)
         force_authenticate(request, user=self.user)
         response = self.view(request)
@@ -154,9 +151,7 @@ class ListMetricProfilesAPIViewTests(TenantTestCase):
             ]
         )
 
-    @patch('Poem.api.internal_views.metricprofiles.sync_webapi')
-    def test_get_metric_profile_by_name(self, func):
-        func.side_effect = mocked_func
+    def test_get_metric_profile_by_name(self):
         request = self.factory.get(self.url + 'TEST_PROFILE')
         force_authenticate(request, user=self.user)
         response = self.view(request, 'TEST_PROFILE')
@@ -170,9 +165,7 @@ class ListMetricProfilesAPIViewTests(TenantTestCase):
             ])
         )
 
-    @patch('Poem.api.internal_views.metricprofiles.sync_webapi')
-    def test_get_metric_profile_if_wrong_name(self, func):
-        func.side_effect = mocked_func
+    def test_get_metric_profile_if_wrong_name(self):
         request = self.factory.get(self.url + 'nonexisting')
         force_authenticate(request, user=self.user)
         response = self.view(request, 'nonexisting')
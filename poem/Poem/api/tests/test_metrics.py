@@ -4,6 +4,7 @@ from unittest.mock import patch, call
 
 import requests
 from Poem.api import views_internal as views
+from Poem.api.internal_views.metrics import package_metrictemplates
 from Poem.api.internal_views.utils import inline_metric_for_db
 from Poem.poem import models as poem_models
 from Poem.poem_super_admin import models as admin_models
@@ -220,7 +221,7 @@ class ListMetricAPIViewTests(TenantTestCase):
         force_authenticate(request, user=self.user)
         response = self.view(request)
         self.assertEqual(
-            response.data,
+            json.loads(b''.join(response.streaming_content)),
             [
                 {
                     'id': self.metric1.id,
@@ -1808,6 +1809,116 @@ class UpdateMetricsVersionsTests(TenantTestCase):
             }
         )
 
+    @patch(
+        'Poem.api.internal_views.metrics.package_metrictemplates',
+        wraps=package_metrictemplates
+    )
+    @patch('Poem.api.internal_views.metrics.get_metrics_in_profiles')
+    @patch('Poem.api.internal_views.metrics.update_metrics')
+    def test_update_metrics_versions_reuses_dry_run_plan(
+            self, mock_update, mock_get, mock_plan
+    ):
+        mock_update.side_effect = mocked_func
+        mock_get.return_value = {}
+        request = self.factory.get(self.url + 'nagios-plugins-argo-0.1.8')
+        request.tenant = self.tenant
+        force_authenticate(request, user=self.user)
+        response = self.view(request, 'nagios-plugins-argo-0.1.8')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = {
+            'name': self.package2.name,
+            'version': self.package2.version
+        }
+        content, content_type = encode_data(data)
+        request = self.factory.put(self.url, content, content_type=content_type)
+        request.tenant = self.tenant
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(mock_plan.call_count, 1)
+        self.assertEqual(mock_update.call_count, 2)
+        self.assertEqual(
+            response.data,
+            {
+                'updated': 'Metrics argo.AMS-Check, argo.AMSPublisher-Check '
+                           'have been successfully updated.'
+            }
+        )
+
+    @patch(
+        'Poem.api.internal_views.metrics.package_metrictemplates',
+        wraps=package_metrictemplates
+    )
+    @patch('Poem.api.internal_views.metrics.get_metrics_in_profiles')
+    @patch('Poem.api.internal_views.metrics.update_metrics')
+    def test_update_metrics_versions_if_metrics_changed_after_dry_run(
+            self, mock_update, mock_get, mock_plan
+    ):
+        mock_update.side_effect = mocked_func
+        mock_get.return_value = {}
+        request = self.factory.get(self.url + 'nagios-plugins-argo-0.1.8')
+        request.tenant = self.tenant
+        force_authenticate(request, user=self.user)
+        self.view(request, 'nagios-plugins-argo-0.1.8')
+        poem_models.Metric.objects.get(name='argo.AMSPublisher-Check').delete()
+        data = {
+            'name': self.package2.name,
+            'version': self.package2.version
+        }
+        content, content_type = encode_data(data)
+        request = self.factory.put(self.url, content, content_type=content_type)
+        request.tenant = self.tenant
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(mock_plan.call_count, 2)
+        self.assertEqual(mock_update.call_count, 1)
+        self.assertEqual(
+            response.data,
+            {
+                'updated': 'Metric argo.AMS-Check has been successfully '
+                           'updated.'
+            }
+        )
+
+    @patch(
+        'Poem.api.internal_views.metrics.package_metrictemplates',
+        wraps=package_metrictemplates
+    )
+    @patch('Poem.api.internal_views.metrics.get_metrics_in_profiles')
+    @patch('Poem.api.internal_views.metrics.update_metrics')
+    def test_update_metrics_versions_if_templates_changed_after_dry_run(
+            self, mock_update, mock_get, mock_plan
+    ):
+        mock_update.side_effect = mocked_func
+        mock_get.return_value = {}
+        request = self.factory.get(self.url + 'nagios-plugins-argo-0.1.8')
+        request.tenant = self.tenant
+        force_authenticate(request, user=self.user)
+        self.view(request, 'nagios-plugins-argo-0.1.8')
+        metrics_version = poem_models.ChangeCounter.objects.current(
+            'metrics'
+        ).version
+        admin_models.MetricTemplateHistory.objects.filter(
+            name='argo.AMS-Check'
+        ).first().save()
+        # metric template versions do not change tenant's metrics document
+        self.assertEqual(
+            poem_models.ChangeCounter.objects.current('metrics').version,
+            metrics_version
+        )
+        data = {
+            'name': self.package2.name,
+            'version': self.package2.version
+        }
+        content, content_type = encode_data(data)
+        request = self.factory.put(self.url, content, content_type=content_type)
+        request.tenant = self.tenant
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(mock_plan.call_count, 2)
+
     @patch('Poem.api.internal_views.metrics.get_metrics_in_profiles')
     @patch('Poem.api.internal_views.metrics.update_metrics')
     def test_update_metrics_version_if_metric_template_was_renamed_dry_run(
@@ -2130,3 +2241,70 @@ class UpdateMetricsVersionsTests(TenantTestCase):
         )
         mock_get.assert_called_once()
         self.assertFalse(mock_update.called)
+
+
+class MetricUsageTests(TenantTestCase):
+    def setUp(self):
+        self.mtype = poem_models.MetricType.objects.create(name='Active')
+        package = admin_models.Package.objects.create(
+            name='nagios-plugins-argo',
+            version='0.1.7'
+        )
+        probe = admin_models.Probe.objects.create(
+            name='ams-probe',
+            package=package,
+            description='Probe is inspecting AMS service.',
+            comment='Initial version.',
+            repository='https://github.com/ARGOeu/nagios-plugins-argo',
+            docurl='https://github.com/ARGOeu/nagios-plugins-argo/blob/master/'
+                   'README.md'
+        )
+        self.probeversion = admin_models.ProbeHistory.objects.create(
+            object_id=probe,
+            name=probe.name,
+            package=probe.package,
+            description=probe.description,
+            comment=probe.comment,
+            repository=probe.repository,
+            docurl=probe.docurl,
+            date_created=datetime.datetime.now(),
+            version_comment='Initial version.',
+            version_user='testuser'
+        )
+        self.metric = poem_models.Metric.objects.create(
+            name='argo.AMS-Check',
+            mtype=self.mtype,
+            probekey=self.probeversion
+        )
+
+    def test_metric_usage_if_metric_created(self):
+        usage = admin_models.MetricUsage.objects.get(
+            schema_name='test', metric_id=self.metric.id
+        )
+        self.assertEqual(usage.name, 'argo.AMS-Check')
+        self.assertEqual(usage.probekey, self.probeversion)
+        self.assertEqual(
+            admin_models.metric_schemas(name='argo.AMS-Check'), ['test']
+        )
+        self.assertEqual(
+            admin_models.metric_schemas(probekey=self.probeversion), ['test']
+        )
+        self.assertEqual(admin_models.metric_schemas(name='nonexisting'), [])
+
+    def test_metric_usage_if_metric_changed(self):
+        self.metric.name = 'argo.AMS-Check-new'
+        self.metric.probekey = None
+        self.metric.save()
+        usage = admin_models.MetricUsage.objects.get(
+            schema_name='test', metric_id=self.metric.id
+        )
+        self.assertEqual(usage.name, 'argo.AMS-Check-new')
+        self.assertEqual(usage.probekey, None)
+        self.assertEqual(admin_models.metric_schemas(name='argo.AMS-Check'), [])
+        self.assertEqual(
+            admin_models.metric_schemas(probekey=self.probeversion), []
+        )
+
+    def test_metric_usage_if_metric_deleted(self):
+        self.metric.delete()
+        self.assertFalse(admin_models.MetricUsage.objects.all().exists())
@@ -4,6 +4,7 @@ from unittest.mock import patch, call
 
 import requests
 from Poem.api import views_internal as views
+from Poem.api.internal_views.metrictemplates import delete_metric_templates
 from Poem.helpers.history_helpers import create_comment
 from Poem.helpers.versioned_comments import new_comment
 from Poem.poem import models as poem_models
@@ -12,6 +13,8 @@ from Poem.tenants.models import Tenant
 from Poem.users.models import CustUser
 from django.contrib.contenttypes.models import ContentType
 from django.core import serializers
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import force_authenticate
 from tenant_schemas.test.cases import TenantTestCase
@@ -291,7 +294,7 @@ class ListMetricTemplatesAPIViewTests(TenantTestCase):
         force_authenticate(request, user=self.user)
         response = self.view(request)
         self.assertEqual(
-            response.data,
+            json.loads(b''.join(response.streaming_content)),
             [
                 {
                     'id': self.metrictemplate1.id,
@@ -378,6 +381,36 @@ class ListMetricTemplatesAPIViewTests(TenantTestCase):
             ]
         )
 
+    def test_get_metric_template_list_number_of_queries(self):
+        request = self.factory.get(self.url)
+        force_authenticate(request, user=self.user)
+        with CaptureQueriesContext(connection) as queries1:
+            response = self.view(request)
+            data1 = json.loads(b''.join(response.streaming_content))
+
+        for i in range(5):
+            mt = admin_models.MetricTemplate.objects.create(
+                name='argo.AMS-Check-{}'.format(i),
+                mtype=self.template_active,
+                probekey=self.probeversion1,
+                probeexecutable='["ams-probe"]',
+                config='["maxCheckAttempts 3"]'
+            )
+            mt.tags.add(self.tag1, self.tag3)
+
+        request = self.factory.get(self.url)
+        force_authenticate(request, user=self.user)
+        with CaptureQueriesContext(connection) as queries2:
+            response = self.view(request)
+            data2 = json.loads(b''.join(response.streaming_content))
+
+        self.assertEqual(len(data1), 2)
+        self.assertEqual(len(data2), 7)
+        self.assertEqual(len(queries1), len(queries2))
+        self.assertEqual(len(queries2), 3)
+        self.assertEqual(data2[1]['ostag'], ['CentOS 6'])
+        self.assertEqual(data2[1]['tags'], ['internal', 'test_tag1'])
+
     def test_get_metrictemplate_by_name(self):
         request = self.factory.get(self.url + 'argo.AMS-Check')
         force_authenticate(request, user=self.user)
@@ -2277,7 +2310,11 @@ class ListMetricTemplatesForImportTests(TenantTestCase):
                     'ostag': ['CentOS 6', 'CentOS 7'],
                     'probeversion': 'ams-probe (0.1.11)',
                     'centos6_probeversion': 'ams-probe (0.1.11)',
-                    'centos7_probeversion': 'ams-probe (0.1.11)'
+                    'centos7_probeversion': 'ams-probe (0.1.11)',
+                    'ostag_probeversion': {
+                        'CentOS 6': 'ams-probe (0.1.11)',
+                        'CentOS 7': 'ams-probe (0.1.11)'
+                    }
                 },
                 {
                     'name': 'argo.EGI-Connectors-Check',
@@ -2286,7 +2323,11 @@ class ListMetricTemplatesForImportTests(TenantTestCase):
                     'ostag': ['CentOS 6', 'CentOS 7'],
                     'probeversion': 'check_nrpe (3.2.1)',
                     'centos6_probeversion': 'check_nrpe (3.2.0)',
-                    'centos7_probeversion': 'check_nrpe (3.2.1)'
+                    'centos7_probeversion': 'check_nrpe (3.2.1)',
+                    'ostag_probeversion': {
+                        'CentOS 6': 'check_nrpe (3.2.0)',
+                        'CentOS 7': 'check_nrpe (3.2.1)'
+                    }
                 },
                 {
                     'name': 'eu.seadatanet.org.nerc-sparql-check',
@@ -2295,7 +2336,10 @@ class ListMetricTemplatesForImportTests(TenantTestCase):
                     'ostag': ['CentOS 7'],
                     'probeversion': 'sdc-nerq-sparq (1.0.1)',
                     'centos6_probeversion': '',
-                    'centos7_probeversion': 'sdc-nerq-sparq (1.0.1)'
+                    'centos7_probeversion': 'sdc-nerq-sparq (1.0.1)',
+                    'ostag_probeversion': {
+                        'CentOS 7': 'sdc-nerq-sparq (1.0.1)'
+                    }
                 },
                 {
                     'name': 'org.apel.APEL-Pub',
@@ -2304,11 +2348,48 @@ class ListMetricTemplatesForImportTests(TenantTestCase):
                     'ostag': ['CentOS 6', 'CentOS 7'],
                     'probeversion': '',
                     'centos6_probeversion': '',
-                    'centos7_probeversion': ''
+                    'centos7_probeversion': '',
+                    'ostag_probeversion': {'CentOS 6': '', 'CentOS 7': ''}
                 }
             ]
         )
 
+    def test_get_metrictemplates_for_import_if_repos_changed(self):
+        tag3 = admin_models.OSTag.objects.create(name='Rocky 9')
+        repo3 = admin_models.YumRepo.objects.create(name='repo-3', tag=tag3)
+        admin_models.Package.objects.get(
+            name='nagios-plugins-argo', version='0.1.7'
+        ).repos.add(repo3)
+        admin_models.Package.objects.get(
+            name='nagios-plugins-nrpe', version='3.2.0'
+        ).repos.remove(admin_models.YumRepo.objects.get(name='repo-1'))
+        request = self.factory.get(self.url)
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(
+            response.data[0]['ostag'], ['CentOS 6', 'CentOS 7', 'Rocky 9']
+        )
+        self.assertEqual(
+            response.data[0]['ostag_probeversion'],
+            {
+                'CentOS 6': 'ams-probe (0.1.11)',
+                'CentOS 7': 'ams-probe (0.1.11)',
+                'Rocky 9': 'ams-probe (0.1.7)'
+            }
+        )
+        self.assertEqual(response.data[1]['ostag'], ['CentOS 7'])
+        self.assertEqual(response.data[1]['centos6_probeversion'], '')
+        self.assertEqual(
+            response.data[3]['ostag'], ['CentOS 6', 'CentOS 7', 'Rocky 9']
+        )
+
+    def test_get_metrictemplates_for_import_number_of_queries(self):
+        request = self.factory.get(self.url)
+        force_authenticate(request, user=self.user)
+        with self.assertNumQueries(4):
+            response = self.view(request)
+        self.assertEqual(len(response.data), 4)
+
 
 class CommentsTests(TenantTestCase):
     def test_new_comment_with_objects_change(self):
@@ -2876,6 +2957,107 @@ class BulkDeleteMetricTemplatesTests(TenantTestCase):
         )
         self.assertFalse(mock_delete.called)
 
+    @patch(
+        'Poem.api.internal_views.metrictemplates.delete_metrics_from_profile')
+    @patch('Poem.api.internal_views.metrictemplates.get_metrics_in_profiles')
+    def test_bulk_delete_metric_templates_in_same_profile(
+            self, mock_get, mock_delete
+    ):
+        mock_get.return_value = {
+            'argo.AMS-Check': ['PROFILE1'],
+            'test.AMS-Check': ['PROFILE1', 'PROFILE2']
+        }
+        mock_delete.side_effect = mocked_func
+        metric = poem_models.Metric.objects.create(
+            name='argo.AMS-Check',
+            mtype=self.metric.mtype,
+            probekey=self.metric.probekey,
+            group=self.metric.group
+        )
+        data = {
+            'metrictemplates': ['argo.AMS-Check', 'test.AMS-Check']
+        }
+        request = self.factory.post(self.url, data, format='json')
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(poem_models.Metric.objects.all().count(), 0)
+        self.assertEqual(
+            len(poem_models.TenantHistory.objects.filter(
+                object_id__in=[metric.id, self.metric.id]
+            )),
+            0
+        )
+        self.assertEqual(mock_delete.call_count, 2)
+        mock_delete.assert_has_calls([
+            call('PROFILE1', ['argo.AMS-Check', 'test.AMS-Check']),
+            call('PROFILE2', ['test.AMS-Check'])
+        ])
+
+    @patch(
+        'Poem.api.internal_views.metrictemplates.delete_metrics_from_profile')
+    @patch('Poem.api.internal_views.metrictemplates.get_metrics_in_profiles')
+    def test_delete_metric_templates_reports_progress_after_tenant_done(
+            self, mock_get, mock_delete
+    ):
+        mock_get.return_value = {'test.AMS-Check': ['PROFILE1', 'PROFILE2']}
+        mock_delete.side_effect = mocked_func
+        reported = []
+
+        def progress(done, total):
+            reported.append((
+                done, total, mock_delete.call_count,
+                poem_models.Metric.objects.filter(
+                    name='test.AMS-Check'
+                ).exists()
+            ))
+
+        delete_metric_templates(
+            ['argo.AMS-Check', 'test.AMS-Check'], progress=progress
+        )
+        self.assertEqual(reported, [(1, 1, 2, False)])
+
+    @patch(
+        'Poem.api.internal_views.metrictemplates.delete_metrics_from_profile')
+    @patch('Poem.api.internal_views.metrictemplates.get_metrics_in_profiles')
+    def test_delete_metric_templates_reports_progress_if_get_exception(
+            self, mock_get, mock_delete
+    ):
+        mock_get.side_effect = Exception('API key not found')
+        progress = []
+        delete_metric_templates(
+            ['test.AMS-Check'],
+            progress=lambda done, total: progress.append((done, total))
+        )
+        self.assertEqual(progress, [(1, 1)])
+        self.assertFalse(mock_delete.called)
+
+    def test_bulk_delete_metric_templates_async(self):
+        data = {
+            'metrictemplates': ['argo.AMS-Check', 'test.AMS-Check'],
+            'async': True
+        }
+        request = self.factory.post(self.url, data, format='json')
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = admin_models.Job.objects.get(id=response.data['job'])
+        self.assertEqual(
+            response.data['url'], '/api/v2/internal/jobs/{}'.format(job.id)
+        )
+        self.assertEqual(
+            job.func,
+            'Poem.api.internal_views.metrictemplates.delete_metric_templates'
+        )
+        self.assertEqual(
+            json.loads(job.arguments),
+            {'metrictemplates': ['argo.AMS-Check', 'test.AMS-Check']}
+        )
+        self.assertEqual(job.user, 'testuser')
+        self.assertEqual(job.status, admin_models.Job.QUEUED)
+        self.assertEqual(admin_models.MetricTemplate.objects.all().count(), 4)
+        poem_models.Metric.objects.get(name='test.AMS-Check')
+
 
 class MetricTagsTests(TenantTestCase):
     def setUp(self):
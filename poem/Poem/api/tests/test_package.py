@@ -407,6 +407,60 @@ class ListPackagesAPIViewTests(TenantTestCase):
             json.loads(metric_history[0].serialized_data)[0]['fields']
         self.assertEqual(serialized_data['probekey'], ['ams-probe', '0.1.7'])
 
+    def test_put_package_updates_all_metric_versions(self):
+        metric = poem_models.Metric.objects.get(name='argo.AMS-Check')
+        poem_models.TenantHistory.objects.create(
+            object_id=metric.id,
+            serialized_data=serializers.serialize(
+                'json', [metric],
+                use_natural_foreign_keys=True,
+                use_natural_primary_keys=True
+            ),
+            object_repr=metric.__str__(),
+            content_type=ContentType.objects.get_for_model(metric),
+            comment='[{"changed": {"fields": ["config"]}}]',
+            user=self.user.username
+        )
+        profile_data = json.dumps([{'fields': {'name': 'TEST_PROFILE'}}])
+        poem_models.TenantHistory.objects.create(
+            object_id=metric.id,
+            serialized_data=profile_data,
+            object_repr='TEST_PROFILE',
+            content_type=ContentType.objects.get_for_model(
+                poem_models.MetricProfiles
+            ),
+            comment='Initial version.',
+            user=self.user.username
+        )
+        data = {
+            'id': self.package1.id,
+            'name': 'nagios-plugins-argo2',
+            'version': '0.1.7',
+            'use_present_version': False,
+            'repos': ['repo-2 (CentOS 7)']
+        }
+        content, content_type = encode_data(data)
+        request = self.factory.put(self.url, content, content_type=content_type)
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        metric_history = poem_models.TenantHistory.objects.filter(
+            object_id=metric.id,
+            content_type=ContentType.objects.get_for_model(metric)
+        )
+        self.assertEqual(metric_history.count(), 2)
+        for version in metric_history:
+            serialized_data = \
+                json.loads(version.serialized_data)[0]['fields']
+            self.assertEqual(
+                serialized_data['probekey'], ['ams-probe', '0.1.7']
+            )
+            self.assertEqual(serialized_data['name'], 'argo.AMS-Check')
+        profile_history = poem_models.TenantHistory.objects.get(
+            object_repr='TEST_PROFILE'
+        )
+        self.assertEqual(profile_history.serialized_data, profile_data)
+
     def test_put_package_with_present_version(self):
         data = {
             'id': self.package1.id,
@@ -1,7 +1,10 @@
 import datetime
 import json
+from types import SimpleNamespace
+from unittest.mock import patch
 
 from Poem.api import views_internal as views
+from Poem.api.internal_views import tenanthistory
 from Poem.helpers.history_helpers import create_comment
 from Poem.poem import models as poem_models
 from Poem.poem_super_admin import models as admin_models
@@ -661,6 +664,53 @@ class ListTenantVersionsAPIViewTests(TenantTestCase):
             ]
         )
 
+    def test_get_metric_profile_versions_paginated(self):
+        request = self.factory.get(
+            self.url + 'metricprofile/TEST_PROFILE2', {'limit': 1}
+        )
+        force_authenticate(request, user=self.user)
+        response = self.view(request, 'metricprofile', 'TEST_PROFILE2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['id'], self.ver5.id)
+        self.assertEqual(response.data['next'], self.ver5.id)
+        request = self.factory.get(
+            self.url + 'metricprofile/TEST_PROFILE2',
+            {'limit': 1, 'cursor': response.data['next']}
+        )
+        force_authenticate(request, user=self.user)
+        response = self.view(request, 'metricprofile', 'TEST_PROFILE2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['id'], self.ver4.id)
+        self.assertEqual(
+            response.data['results'][0]['comment'], 'Initial version.'
+        )
+        self.assertEqual(response.data['next'], None)
+
+    def test_get_metric_profile_versions_with_invalid_limit(self):
+        request = self.factory.get(
+            self.url + 'metricprofile/TEST_PROFILE2', {'limit': 'all'}
+        )
+        force_authenticate(request, user=self.user)
+        response = self.view(request, 'metricprofile', 'TEST_PROFILE2')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data, {'detail': 'Invalid limit or cursor.'}
+        )
+
+    def test_get_metric_profile_versions_if_version_rewritten(self):
+        request = self.factory.get(self.url + 'metricprofile/TEST_PROFILE2')
+        force_authenticate(request, user=self.user)
+        response = self.view(request, 'metricprofile', 'TEST_PROFILE2')
+        self.assertEqual(response.data[1]['object_repr'], 'TEST_PROFILE')
+        self.ver4.object_repr = 'TEST_PROFILE3'
+        self.ver4.save()
+        request = self.factory.get(self.url + 'metricprofile/TEST_PROFILE2')
+        force_authenticate(request, user=self.user)
+        response = self.view(request, 'metricprofile', 'TEST_PROFILE2')
+        self.assertEqual(response.data[1]['object_repr'], 'TEST_PROFILE3')
+
     def test_get_nonexisting_metricprofile(self):
         request = self.factory.get(self.url + 'metricprofile/nonexisting')
         force_authenticate(request, user=self.user)
@@ -870,3 +920,61 @@ class ListTenantVersionsAPIViewTests(TenantTestCase):
                 }
             ]
         )
+
+
+class RenderedVersionsCacheTests(TenantTestCase):
+    def setUp(self):
+        tenanthistory._rendered_versions.clear()
+        tenanthistory._rendered_versions_bytes = 0
+
+    def tearDown(self):
+        tenanthistory._rendered_versions.clear()
+        tenanthistory._rendered_versions_bytes = 0
+
+    @staticmethod
+    def version(id, data='x' * 10):
+        return SimpleNamespace(
+            id=id, serialized_data=data, object_repr='', comment=''
+        )
+
+    @patch('Poem.api.internal_views.tenanthistory.render_version')
+    def test_least_recently_used_version_is_dropped(self, mock_render):
+        mock_render.side_effect = lambda obj, ver: {'id': ver.id}
+        ver1, ver2, ver3 = self.version(1), self.version(2), self.version(3)
+        with patch.object(tenanthistory, 'RENDERED_VERSIONS_CACHE_BYTES', 20):
+            tenanthistory.get_rendered_version('metric', ver1)
+            tenanthistory.get_rendered_version('metric', ver2)
+            tenanthistory.get_rendered_version('metric', ver1)
+            tenanthistory.get_rendered_version('metric', ver3)
+            self.assertEqual(mock_render.call_count, 3)
+            tenanthistory.get_rendered_version('metric', ver1)
+            self.assertEqual(mock_render.call_count, 3)
+            tenanthistory.get_rendered_version('metric', ver2)
+            self.assertEqual(mock_render.call_count, 4)
+
+    @patch('Poem.api.internal_views.tenanthistory.render_version')
+    def test_cache_is_limited_by_size_of_versions(self, mock_render):
+        mock_render.side_effect = lambda obj, ver: {'id': ver.id}
+        with patch.object(tenanthistory, 'RENDERED_VERSIONS_CACHE_BYTES', 25):
+            for i in range(5):
+                tenanthistory.get_rendered_version('metric', self.version(i))
+            self.assertEqual(len(tenanthistory._rendered_versions), 2)
+            tenanthistory.get_rendered_version(
+                'metric', self.version(5, 'x' * 25)
+            )
+            self.assertEqual(
+                list(tenanthistory._rendered_versions), [('test', 5)]
+            )
+            self.assertEqual(tenanthistory._rendered_versions_bytes, 25)
+
+    @patch('Poem.api.internal_views.tenanthistory.render_version')
+    def test_rewritten_version_is_rendered_again(self, mock_render):
+        mock_render.side_effect = \
+            lambda obj, ver: {'data': ver.serialized_data}
+        tenanthistory.get_rendered_version('metric', self.version(1))
+        rendered = tenanthistory.get_rendered_version(
+            'metric', self.version(1, 'y' * 12)
+        )
+        self.assertEqual(rendered, {'data': 'y' * 12})
+        self.assertEqual(mock_render.call_count, 2)
+        self.assertEqual(tenanthistory._rendered_versions_bytes, 12)
@@ -1,6 +1,5 @@
 import json
 from collections import OrderedDict
-from unittest.mock import patch
 
 from Poem.api import views_internal as views
 from Poem.poem import models as poem_models
@@ -12,7 +11,7 @@ from rest_framework.test import force_authenticate
 from tenant_schemas.test.cases import TenantTestCase
 from tenant_schemas.test.client import TenantRequestFactory
 
-from .utils_test import mocked_func, encode_data
+from .utils_test import encode_data
 
 
 class ListThresholdsProfilesAPIViewTests(TenantTestCase):
@@ -91,9 +90,7 @@ class ListThresholdsProfilesAPIViewTests(TenantTestCase):
             content_type=self.ct
         )
 
-    @patch('Poem.api.internal_views.thresholdsprofiles.sync_webapi')
-    def test_get_all_thresholds_profiles(self, func):
-        func.side_effect = mocked_func
+    def test_get_all_thresholds_profiles(self):
         request = self.factory.get(self.url)
         force_authenticate(request, user=self.user)
         response = self.view(request)
@@ -115,16 +112,12 @@ class ListThresholdsProfilesAPIViewTests(TenantTestCase):
             ]
         )
 
-    @patch('Poem.api.internal_views.thresholdsprofiles.sync_webapi')
-    def test_get_thresholds_profiles_if_no_authentication(self, func):
-        func.side_effect = mocked_func
+    def test_get_thresholds_profiles_if_no_authentication(self):
         request = self.factory.get(self.url)
         response = self.view(request)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
-    @patch('Poem.api.internal_views.thresholdsprofiles.sync_webapi')
-    def test_get_thresholds_profile_by_name(self, func):
-        func.side_effect = mocked_func
+    def test_get_thresholds_profile_by_name(self):
         request = self.factory.get(self.url + 'TEST_PROFILE')
         force_authenticate(request, user=self.user)
         response = self.view(request, 'TEST_PROFILE')
@@ -138,9 +131,7 @@ class ListThresholdsProfilesAPIViewTests(TenantTestCase):
             ])
         )
 
-    @patch('Poem.api.internal_views.thresholdsprofiles.sync_webapi')
-    def test_get_thresholds_profile_by_nonexisting_name(self, func):
-        func.side_effect = mocked_func
+    def test_get_thresholds_profile_by_nonexisting_name(self):
         request = self.factory.get(self.url + 'nonexisting')
         force_authenticate(request, user=self.user)
         response = self.view(request, 'nonexisting')
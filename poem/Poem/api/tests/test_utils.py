@@ -1,22 +1,116 @@
 import datetime
 import json
-from unittest.mock import patch
+from io import StringIO
+from unittest.mock import patch, call
+
+import requests
 
 from Poem.api.internal_views.utils import sync_webapi, \
-    get_tenant_resources
+    get_tenant_resources, one_value_inline, two_value_inline, \
+    two_value_inline_dict, iterate_by_name, stream_json
 from Poem.api.models import MyAPIKey
 from Poem.helpers.history_helpers import create_comment
+from Poem.helpers.webapi_helpers import clear_webapi_data
 from Poem.poem import models as poem_models
 from Poem.poem_super_admin import models as admin_models
 from Poem.users.models import CustUser
 from django.contrib.contenttypes.models import ContentType
 from django.core import serializers
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from tenant_schemas.test.cases import TenantTestCase
 from tenant_schemas.utils import get_public_schema_name
 
 from .utils_test import mocked_web_api_request
 
 
+class InlineFieldsTests(TenantTestCase):
+    def setUp(self):
+        self.input = json.dumps(
+            ['maxCheckAttempts 3', 'timeout  60', 'path', 'retryInterval ']
+        )
+
+    def test_one_value_inline(self):
+        self.assertEqual(one_value_inline('["argo-nagios-tools"]'),
+                         'argo-nagios-tools')
+        self.assertEqual(one_value_inline(''), '')
+
+    def test_two_value_inline(self):
+        self.assertEqual(
+            two_value_inline(self.input),
+            [
+                {'key': 'maxCheckAttempts', 'value': '3'},
+                {'key': 'timeout', 'value': ' 60'},
+                {'key': 'path', 'value': ''},
+                {'key': 'retryInterval', 'value': ''}
+            ]
+        )
+        self.assertEqual(two_value_inline(''), [])
+
+    def test_two_value_inline_returns_new_list(self):
+        result = two_value_inline(self.input)
+        result[0]['value'] = '4'
+        self.assertEqual(
+            two_value_inline(self.input)[0],
+            {'key': 'maxCheckAttempts', 'value': '3'}
+        )
+
+    def test_two_value_inline_dict(self):
+        self.assertEqual(
+            two_value_inline_dict(self.input),
+            {
+                'maxCheckAttempts': '3', 'timeout': ' 60', 'path': '',
+                'retryInterval': ''
+            }
+        )
+        self.assertEqual(two_value_inline_dict(''), {})
+
+
+class StreamingTests(TenantTestCase):
+    def setUp(self):
+        for name in ['tag3', 'tag1', 'tag5', 'tag2', 'tag4']:
+            admin_models.MetricTags.objects.create(name=name)
+
+    def test_iterate_by_name(self):
+        self.assertEqual(
+            [tag.name for tag in iterate_by_name(
+                admin_models.MetricTags.objects.all(), chunk_size=2
+            )],
+            ['tag1', 'tag2', 'tag3', 'tag4', 'tag5']
+        )
+
+    def test_iterate_by_name_in_code_point_order(self):
+        names = ['Tag-b', 'tag_a', 'TAG.c', 'tag-A', 'tagB', 'tag.a']
+        for name in names:
+            admin_models.MetricTags.objects.create(name=name)
+        self.assertEqual(
+            [tag.name for tag in iterate_by_name(
+                admin_models.MetricTags.objects.all(), chunk_size=2
+            )],
+            sorted(names + ['tag1', 'tag2', 'tag3', 'tag4', 'tag5'])
+        )
+
+    def test_iterate_by_name_if_empty(self):
+        self.assertEqual(
+            list(iterate_by_name(
+                admin_models.MetricTags.objects.filter(name='nonexisting')
+            )),
+            []
+        )
+
+    def test_stream_json(self):
+        items = [{'name': 'tag{}'.format(i), 'id': i} for i in range(5)]
+        response = stream_json(iter(items), chunk_size=2)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        content = b''.join(response.streaming_content)
+        self.assertEqual(json.loads(content), items)
+
+    def test_stream_json_if_empty(self):
+        response = stream_json(iter([]))
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+
 class SyncWebApiTests(TenantTestCase):
     def setUp(self):
         ct_mp = ContentType.objects.get_for_model(poem_models.MetricProfiles)
@@ -109,7 +203,10 @@ class SyncWebApiTests(TenantTestCase):
             groupname='EGI'
         )
 
-    @patch('requests.get')
+    def tearDown(self):
+        clear_webapi_data()
+
+    @patch('requests.Session.get')
     def test_sync_webapi_metricprofiles(self, func):
         func.side_effect = mocked_web_api_request
         self.assertEqual(poem_models.MetricProfiles.objects.all().count(), 2)
@@ -147,7 +244,33 @@ class SyncWebApiTests(TenantTestCase):
             [['dg.3GBridge', 'eu.egi.cloud.Swift-CRUD']]
         )
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
+    def test_sync_webapi_metricprofiles_unchanged_not_updated(self, func):
+        func.side_effect = mocked_web_api_request
+        with CaptureQueriesContext(connection) as queries:
+            sync_webapi('metric_profiles', poem_models.MetricProfiles)
+        self.assertFalse(
+            [q for q in queries.captured_queries
+             if q['sql'].startswith('UPDATE')]
+        )
+        self.assertEqual(
+            poem_models.MetricProfiles.objects.get(name='TEST_PROFILE'),
+            self.mp1
+        )
+
+    @patch('requests.Session.get')
+    def test_sync_webapi_metricprofiles_if_changed(self, func):
+        func.side_effect = mocked_web_api_request
+        self.mp1.name = 'OLD_PROFILE'
+        self.mp1.description = 'Old description'
+        self.mp1.save()
+        sync_webapi('metric_profiles', poem_models.MetricProfiles)
+        profile = poem_models.MetricProfiles.objects.get(id=self.mp1.id)
+        self.assertEqual(profile.name, 'TEST_PROFILE')
+        self.assertEqual(profile.description, '')
+        self.assertEqual(profile.groupname, 'EGI')
+
+    @patch('requests.Session.get')
     def test_sync_webapi_aggregationprofiles(self, func):
         func.side_effect = mocked_web_api_request
         self.assertEqual(poem_models.Aggregation.objects.all().count(), 2)
@@ -163,7 +286,7 @@ class SyncWebApiTests(TenantTestCase):
         )
         self.assertTrue(poem_models.Aggregation.objects.get(name='NEW_PROFILE'))
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_sync_webapi_thresholdsprofile(self, func):
         func.side_effect = mocked_web_api_request
         self.assertEqual(
@@ -184,6 +307,129 @@ class SyncWebApiTests(TenantTestCase):
         )
 
 
+class SyncWebApiCommandTests(TenantTestCase):
+    def setUp(self):
+        self.out = StringIO()
+        self.err = StringIO()
+
+    @patch('Poem.poem.management.commands.sync_webapi.sync_webapi')
+    def test_sync_all_resources(self, mock_sync):
+        with self.settings(
+            WEBAPI_METRIC='https://mock.api.url/metric',
+            WEBAPI_AGGREGATION='https://mock.api.url/aggregation',
+            WEBAPI_THRESHOLDS='https://mock.api.url/thresholds'
+        ):
+            call_command('sync_webapi', stdout=self.out, stderr=self.err)
+        self.assertEqual(mock_sync.call_count, 3)
+        mock_sync.assert_has_calls([
+            call('https://mock.api.url/metric', poem_models.MetricProfiles),
+            call('https://mock.api.url/aggregation', poem_models.Aggregation),
+            call(
+                'https://mock.api.url/thresholds',
+                poem_models.ThresholdsProfiles
+            )
+        ])
+        self.assertEqual(self.err.getvalue(), '')
+        for name in ['metricprofiles', 'aggregations', 'thresholdsprofiles']:
+            self.assertEqual(
+                poem_models.ChangeCounter.objects.get(
+                    name='sync-{}'.format(name)
+                ).counter, 0
+            )
+
+    @patch('Poem.poem.management.commands.sync_webapi.sync_webapi')
+    def test_sync_records_last_sync(self, mock_sync):
+        with self.settings(WEBAPI_METRIC='https://mock.api.url/metric'):
+            call_command(
+                'sync_webapi', resource=['metricprofiles'], stdout=self.out,
+                stderr=self.err
+            )
+            first = poem_models.ChangeCounter.objects.get(
+                name='sync-metricprofiles'
+            )
+            call_command(
+                'sync_webapi', resource=['metricprofiles'], stdout=self.out,
+                stderr=self.err
+            )
+        mock_sync.assert_called_with(
+            'https://mock.api.url/metric', poem_models.MetricProfiles
+        )
+        self.assertEqual(mock_sync.call_count, 2)
+        last = poem_models.ChangeCounter.objects.get(
+            name='sync-metricprofiles'
+        )
+        self.assertEqual(last.counter, 1)
+        self.assertGreaterEqual(last.last_modified, first.last_modified)
+        self.assertFalse(
+            poem_models.ChangeCounter.objects.filter(
+                name='sync-aggregations'
+            ).exists()
+        )
+
+    @patch('Poem.poem.management.commands.sync_webapi.sync_webapi')
+    def test_sync_if_webapi_error(self, mock_sync):
+        mock_sync.side_effect = requests.exceptions.HTTPError(
+            '401 Client Error: Unauthorized'
+        )
+        with self.settings(WEBAPI_METRIC='https://mock.api.url/metric'):
+            call_command(
+                'sync_webapi', resource=['metricprofiles'], stdout=self.out,
+                stderr=self.err
+            )
+        self.assertEqual(
+            self.err.getvalue(),
+            'TEST: Error synchronizing metricprofiles: 401 Client Error: '
+            'Unauthorized\n'
+        )
+        self.assertFalse(
+            poem_models.ChangeCounter.objects.filter(
+                name='sync-metricprofiles'
+            ).exists()
+        )
+
+    @patch('Poem.poem.management.commands.sync_webapi.sync_webapi')
+    def test_sync_continues_after_unexpected_error(self, mock_sync):
+        mock_sync.side_effect = [KeyError('data'), None, None]
+        with self.settings(
+            WEBAPI_METRIC='https://mock.api.url/metric',
+            WEBAPI_AGGREGATION='https://mock.api.url/aggregation',
+            WEBAPI_THRESHOLDS='https://mock.api.url/thresholds'
+        ):
+            call_command('sync_webapi', stdout=self.out, stderr=self.err)
+        self.assertEqual(mock_sync.call_count, 3)
+        self.assertEqual(
+            self.err.getvalue(),
+            'TEST: Unexpected error synchronizing metricprofiles: '
+            'KeyError(\'data\')\n'
+        )
+        self.assertFalse(
+            poem_models.ChangeCounter.objects.filter(
+                name='sync-metricprofiles'
+            ).exists()
+        )
+        self.assertTrue(
+            poem_models.ChangeCounter.objects.filter(
+                name='sync-aggregations'
+            ).exists()
+        )
+
+    @patch('Poem.poem.management.commands.sync_webapi.sync_webapi')
+    def test_sync_if_no_key(self, mock_sync):
+        mock_sync.side_effect = MyAPIKey.DoesNotExist
+        with self.settings(
+            WEBAPI_METRIC='https://mock.api.url/metric',
+            WEBAPI_AGGREGATION='https://mock.api.url/aggregation',
+            WEBAPI_THRESHOLDS='https://mock.api.url/thresholds'
+        ):
+            call_command('sync_webapi', stdout=self.out, stderr=self.err)
+        mock_sync.assert_called_once()
+        self.assertEqual(
+            self.err.getvalue(),
+            'TEST: No "WEB-API" key in the DB! Metricprofiles not '
+            'synchronized.\n'
+        )
+
+
 class BasicResourceInfoTests(TenantTestCase):
     def setUp(self) -> None:
         user = CustUser.objects.create_user(username='testuser')
@@ -6,7 +6,9 @@ from Poem.api import views
 from Poem.api.models import MyAPIKey
 from Poem.poem import models as poem_models
 from Poem.poem_super_admin import models as admin_models
+from django.db import connection
 from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from tenant_schemas.test.cases import TenantTestCase
 from tenant_schemas.test.client import TenantRequestFactory
@@ -737,6 +739,94 @@ class ListMetricsAPIViewTests(TenantTestCase):
             ]
         )
 
+    @patch('Poem.api.views.build_metricconfigs',
+           wraps=views.build_metricconfigs)
+    def test_list_metrics_is_built_only_once(self, mock_build):
+        request1 = self.factory.get(self.url, **{'HTTP_X_API_KEY': self.token})
+        response1 = self.view(request1)
+        request2 = self.factory.get(self.url, **{'HTTP_X_API_KEY': self.token})
+        response2 = self.view(request2)
+        self.assertEqual(mock_build.call_count, 1)
+        self.assertEqual(response1.data, response2.data)
+
+    @patch('Poem.api.views.build_metricconfigs',
+           wraps=views.build_metricconfigs)
+    def test_list_metrics_is_rebuilt_if_metric_changed(self, mock_build):
+        request1 = self.factory.get(self.url, **{'HTTP_X_API_KEY': self.token})
+        response1 = self.view(request1)
+        metric = poem_models.Metric.objects.get(name='test.EMPTY-metric')
+        metric.flags = '["OBSESS 1"]'
+        metric.save()
+        request2 = self.factory.get(self.url, **{'HTTP_X_API_KEY': self.token})
+        response2 = self.view(request2)
+        self.assertEqual(mock_build.call_count, 2)
+        self.assertEqual(response1.data[4]['test.EMPTY-metric']['flags'], {})
+        self.assertEqual(
+            response2.data[4]['test.EMPTY-metric']['flags'], {'OBSESS': '1'}
+        )
+
+    @patch('Poem.api.views.build_metricconfigs',
+           wraps=views.build_metricconfigs)
+    def test_list_metrics_is_rebuilt_if_metric_tags_changed(self, mock_build):
+        request1 = self.factory.get(self.url, **{'HTTP_X_API_KEY': self.token})
+        self.view(request1)
+        metric = poem_models.Metric.objects.get(name='test.EMPTY-metric')
+        metric.tags.add(admin_models.MetricTags.objects.get(name='internal'))
+        request2 = self.factory.get(self.url, **{'HTTP_X_API_KEY': self.token})
+        response2 = self.view(request2)
+        self.assertEqual(mock_build.call_count, 2)
+        self.assertEqual(
+            response2.data[4]['test.EMPTY-metric']['tags'], ['internal']
+        )
+
+    def test_list_metrics_not_modified(self):
+        request1 = self.factory.get(self.url, **{'HTTP_X_API_KEY': self.token})
+        response1 = self.view(request1)
+        self.assertEqual(response1.status_code, status.HTTP_200_OK)
+        self.assertTrue(response1.has_header('ETag'))
+        self.assertTrue(response1.has_header('Last-Modified'))
+        request2 = self.factory.get(
+            self.url, **{'HTTP_X_API_KEY': self.token,
+                         'HTTP_IF_NONE_MATCH': response1['ETag']}
+        )
+        response2 = self.view(request2)
+        self.assertEqual(response2.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response2['ETag'], response1['ETag'])
+
+    def test_list_metrics_modified(self):
+        request1 = self.factory.get(self.url, **{'HTTP_X_API_KEY': self.token})
+        response1 = self.view(request1)
+        metric = poem_models.Metric.objects.get(name='test.EMPTY-metric')
+        metric.delete()
+        request2 = self.factory.get(
+            self.url, **{'HTTP_X_API_KEY': self.token,
+                         'HTTP_IF_NONE_MATCH': response1['ETag']}
+        )
+        response2 = self.view(request2)
+        self.assertEqual(response2.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response2['ETag'], response1['ETag'])
+        self.assertEqual(len(response2.data), 4)
+
+    def test_list_tagged_metrics_not_modified(self):
+        request1 = self.factory.get(
+            self.url + '/internal', **{'HTTP_X_API_KEY': self.token}
+        )
+        response1 = self.view(request1, 'internal')
+        request2 = self.factory.get(
+            self.url + '/internal',
+            **{'HTTP_X_API_KEY': self.token,
+               'HTTP_IF_NONE_MATCH': response1['ETag']}
+        )
+        response2 = self.view(request2, 'internal')
+        self.assertEqual(response2.status_code, status.HTTP_304_NOT_MODIFIED)
+        request3 = self.factory.get(
+            self.url + '/test_tag1',
+            **{'HTTP_X_API_KEY': self.token,
+               'HTTP_IF_NONE_MATCH': response1['ETag']}
+        )
+        response3 = self.view(request3, 'test_tag1')
+        self.assertEqual(response3.status_code, status.HTTP_200_OK)
+
     def test_get_internal_metrics(self):
         request = self.factory.get(
             self.url + '/internal', **{'HTTP_X_API_KEY': self.token}
@@ -827,6 +917,88 @@ class ListReposAPIViewTests(TenantTestCase):
             }
         )
 
+    @patch('Poem.api.views.get_metrics_from_profile')
+    def test_list_repos_not_modified(self, mock_get_metrics):
+        mock_get_metrics.side_effect = mock_function
+        request1 = self.factory.get(
+            self.url + '/centos7',
+            **{'HTTP_X_API_KEY': self.token,
+               'HTTP_PROFILES': '[ARGO-MON, MON-TEST]'}
+        )
+        response1 = self.view(request1, 'centos7')
+        self.assertEqual(response1.status_code, status.HTTP_200_OK)
+        self.assertTrue(response1.has_header('ETag'))
+        self.assertTrue(response1.has_header('Last-Modified'))
+        request2 = self.factory.get(
+            self.url + '/centos7',
+            **{'HTTP_X_API_KEY': self.token,
+               'HTTP_PROFILES': '[ARGO-MON, MON-TEST]',
+               'HTTP_IF_NONE_MATCH': response1['ETag']}
+        )
+        response2 = self.view(request2, 'centos7')
+        self.assertEqual(response2.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @patch('Poem.api.views.get_metrics_from_profile')
+    def test_list_repos_modified_if_profiles_changed(self, mock_get_metrics):
+        mock_get_metrics.side_effect = mock_function
+        request1 = self.factory.get(
+            self.url + '/centos7',
+            **{'HTTP_X_API_KEY': self.token,
+               'HTTP_PROFILES': '[ARGO-MON, MON-TEST]'}
+        )
+        response1 = self.view(request1, 'centos7')
+        request2 = self.factory.get(
+            self.url + '/centos7',
+            **{'HTTP_X_API_KEY': self.token,
+               'HTTP_PROFILES': '[ARGO-MON]',
+               'HTTP_IF_NONE_MATCH': response1['ETag']}
+        )
+        response2 = self.view(request2, 'centos7')
+        self.assertEqual(response2.status_code, status.HTTP_200_OK)
+
+    @patch('Poem.api.views.get_metrics_from_profile')
+    def test_list_repos_modified_if_package_changed(self, mock_get_metrics):
+        mock_get_metrics.side_effect = mock_function
+        request1 = self.factory.get(
+            self.url + '/centos7',
+            **{'HTTP_X_API_KEY': self.token,
+               'HTTP_PROFILES': '[ARGO-MON, MON-TEST]'}
+        )
+        response1 = self.view(request1, 'centos7')
+        package = admin_models.Package.objects.get(
+            name='nagios-plugins-seadatacloud-nvs2'
+        )
+        package.repos.clear()
+        request2 = self.factory.get(
+            self.url + '/centos7',
+            **{'HTTP_X_API_KEY': self.token,
+               'HTTP_PROFILES': '[ARGO-MON, MON-TEST]',
+               'HTTP_IF_NONE_MATCH': response1['ETag']}
+        )
+        response2 = self.view(request2, 'centos7')
+        self.assertEqual(response2.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response2.data['missing_packages'],
+            ['nagios-plugins-seadatacloud-nvs2 (1.0.1)']
+        )
+
+    @patch('Poem.api.views.get_metrics_from_profile')
+    def test_list_repos_number_of_queries_does_not_depend_on_metrics(
+            self, mock_get_metrics
+    ):
+        mock_get_metrics.side_effect = mock_function
+        num_queries = []
+        for profiles in ['[TEST_PROMOO]', '[TEST_PROMOO]',
+                         '[ARGO-MON, MON-PASSIVE]']:
+            request = self.factory.get(
+                self.url + '/centos6',
+                **{'HTTP_X_API_KEY': self.token, 'HTTP_PROFILES': profiles}
+            )
+            with CaptureQueriesContext(connection) as context:
+                self.view(request, 'centos6')
+            num_queries.append(len(context.captured_queries))
+        self.assertEqual(num_queries[1], num_queries[2])
+
     def test_list_repos_if_no_profile_or_tag(self):
         request = self.factory.get(
             self.url,
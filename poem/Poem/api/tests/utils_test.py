@@ -33,6 +33,7 @@ class MockResponse:
     def __init__(self, data, status_code):
         self.data = data
         self.status_code = status_code
+        self.headers = dict()
 
         if self.status_code == 200:
             self.reason = 'OK'
@@ -22,6 +22,7 @@ urlpatterns = [
     path('updatemetricsversions/', views_internal.UpdateMetricsVersions.as_view(), name='updatemetricsversions'),
     path('updatemetricsversions/<str:pkg>', views_internal.UpdateMetricsVersions.as_view(), name='updatemetricsversions'),
     path('istenantschema/', views_internal.GetIsTenantSchema.as_view(), name='istenantschema'),
+    path('jobs/<int:job_id>', views_internal.ListJobs.as_view(), name='jobs'),
     path('metric/', views_internal.ListMetric.as_view(), name='metric'),
     path('public_metric/', views_internal.ListPublicMetric.as_view(), name='metric'),
     path('metric/<str:name>', views_internal.ListMetric.as_view(), name='metric'),
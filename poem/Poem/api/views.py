@@ -1,11 +1,18 @@
-import requests
+import calendar
+import hashlib
+
 from Poem.api.internal_views.utils import one_value_inline, \
     two_value_inline_dict
-from Poem.api.models import MyAPIKey
 from Poem.api.permissions import MyHasAPIKey
+from Poem.helpers.webapi_helpers import get_webapi_data
 from Poem.poem import models
 from Poem.poem_super_admin import models as admin_models
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Prefetch
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from rest_framework import status
 from rest_framework.exceptions import APIException
 from rest_framework.response import Response
@@ -19,10 +26,45 @@ class NotFound(APIException):
         self.code = code if code else detail
 
 
+METRICCONFIGS_CACHE_TIMEOUT = 3600
+
+
+def make_etag(*parts):
+    return quote_etag(
+        hashlib.sha1(
+            '|'.join([str(part) for part in parts]).encode('utf-8')
+        ).hexdigest()
+    )
+
+
+def get_not_modified(request, etag, last_modified=None):
+    """
+    Returns 304 response if client already has the representation with the
+    given validators, None otherwise.
+    """
+    if last_modified:
+        last_modified = calendar.timegm(last_modified.utctimetuple())
+
+    return get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(
+        calendar.timegm(last_modified.utctimetuple())
+    )
+
+    return response
+
+
 def build_metricconfigs():
     ret = []
 
-    metricsobjs = models.Metric.objects.all().order_by('name')
+    metricsobjs = models.Metric.objects.all().select_related(
+        'probekey'
+    ).prefetch_related('tags').order_by('name')
 
     for m in metricsobjs:
         mdict = dict()
@@ -100,15 +142,24 @@ def build_metricconfigs():
     return ret
 
 
-def get_metrics_from_profile(profile):
-    token = MyAPIKey.objects.get(name='WEB-API')
+def get_metricconfigs():
+    """
+    Returns metric configuration of the tenant from the cache, and builds it
+    only if metrics have been changed since it was last compiled.
+    """
+    counter = models.ChangeCounter.objects.current('metrics')
+    key = 'metricconfigs-{}-{}'.format(connection.schema_name, counter.version)
 
-    headers = {'Accept': 'application/json', 'x-api-key': token.token}
-    response = requests.get(
-        settings.WEBAPI_METRIC, headers=headers, timeout=180
-    )
-    response.raise_for_status()
-    data = response.json()['data']
+    metricconfigs = cache.get(key)
+    if metricconfigs is None:
+        metricconfigs = build_metricconfigs()
+        cache.set(key, metricconfigs, METRICCONFIGS_CACHE_TIMEOUT)
+
+    return metricconfigs
+
+
+def get_metrics_from_profile(profile):
+    data = get_webapi_data(settings.WEBAPI_METRIC)
 
     metrics = set()
     if data:
@@ -131,12 +182,22 @@ class ListMetrics(APIView):
     permission_classes = (MyHasAPIKey,)
 
     def get(self, request, tag=None):
+        counter = models.ChangeCounter.objects.current('metrics')
+        etag = make_etag(connection.schema_name, counter.version, tag)
+
+        not_modified = get_not_modified(request, etag, counter.last_modified)
+        if not_modified:
+            return set_validators(not_modified, etag, counter.last_modified)
+
         if tag:
             try:
                 admin_models.MetricTags.objects.get(name=tag)
                 metrics = models.Metric.objects.filter(tags__name=tag)
 
-                return Response(sorted([metric.name for metric in metrics]))
+                return set_validators(
+                    Response(sorted([metric.name for metric in metrics])),
+                    etag, counter.last_modified
+                )
 
             except admin_models.MetricTags.DoesNotExist:
                 return Response(
@@ -145,7 +206,9 @@ class ListMetrics(APIView):
                 )
 
         else:
-            return Response(build_metricconfigs())
+            return set_validators(
+                Response(get_metricconfigs()), etag, counter.last_modified
+            )
 
 
 class ListRepos(APIView):
@@ -177,29 +240,42 @@ class ListRepos(APIView):
             else:
                 raise NotFound(status=404, detail='YUM repo tag not found.')
 
-            packages = set()
-            for metric in metrics:
-                try:
-                    m = models.Metric.objects.get(name=metric)
-                    if m.probekey:
-                        packages.add(m.probekey.package)
+            # metric profiles are kept on WEB-API, and their changes are not
+            # tracked locally, so only the entity tag, which covers metrics
+            # from profiles, is used to decide whether data has changed
+            metrics_counter = models.ChangeCounter.objects.current('metrics')
+            repos_counter = models.ChangeCounter.objects.current('repos')
+            etag = make_etag(
+                connection.schema_name, tag, sorted(metrics),
+                metrics_counter.version, repos_counter.version
+            )
+            last_modified = max(
+                metrics_counter.last_modified, repos_counter.last_modified
+            )
 
-                except models.Metric.DoesNotExist:
-                    pass
+            not_modified = get_not_modified(request, etag)
+            if not_modified:
+                return set_validators(not_modified, etag, last_modified)
+
+            packages = admin_models.Package.objects.filter(
+                probehistory__metric__name__in=metrics
+            ).prefetch_related(
+                Prefetch(
+                    'repos',
+                    queryset=admin_models.YumRepo.objects.filter(tag=ostag),
+                    to_attr='ostag_repos'
+                )
+            ).distinct().order_by('name', 'version')
 
             data = dict()
             packagedict = dict()
             missing_packages = []
             for package in packages:
-                try:
-                    repo = package.repos.get(tag=ostag)
-
-                except admin_models.YumRepo.DoesNotExist:
-                    missing_packages.append(package.__str__())
-                    continue
+                if package.ostag_repos:
+                    packagedict.update({package: package.ostag_repos[0]})
 
                 else:
-                    packagedict.update({package: repo})
+                    missing_packages.append(package.__str__())
 
             for key, value in packagedict.items():
                 if value.name not in data:
@@ -229,4 +305,7 @@ class ListRepos(APIView):
                         }
                     )
 
-        return Response({'data': data, 'missing_packages': missing_packages})
+        return set_validators(
+            Response({'data': data, 'missing_packages': missing_packages}),
+            etag, last_modified
+        )
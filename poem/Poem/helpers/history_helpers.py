@@ -3,7 +3,6 @@ import json
 from Poem.poem import models as poem_models
 from Poem.poem_super_admin import models as admin_models
 from Poem.users.models import CustUser
-from deepdiff import DeepDiff
 from django.contrib.contenttypes.models import ContentType
 from django.core import serializers
 
@@ -112,220 +111,203 @@ def create_history(instance, user, comment=None):
     create_history_entry(instance, user, comment)
 
 
-def analyze_differences(old_data, new_data):
-    inlines = ['config', 'attribute', 'dependency', 'flags', 'files',
-               'parameter', 'fileparameter', 'dependancy']
+# inline fields are JSON lists of "key value" strings, and are compared key
+# by key
+INLINE_FIELDS = ['config', 'attribute', 'dependency', 'flags', 'files',
+                 'parameter', 'fileparameter', 'dependancy']
 
-    foreignkeys = ['probekey', 'package', 'group']
+# foreign keys are serialized as lists of natural key values, but are changed
+# as a whole
+FOREIGN_KEY_FIELDS = ['probekey', 'package', 'group']
+
+# items of aggregation groups and thresholds rules are identified in the
+# comment by the given key
+KEYED_LIST_FIELDS = {'groups': 'name', 'rules': 'metric'}
+
+
+def _canonical(item):
+    """
+    Returns item with lists nested in it sorted by canonical form of their
+    elements, so that items differing only in order of nested lists are
+    equal.
+    """
+    if isinstance(item, dict):
+        return dict((k, _canonical(v)) for k, v in item.items())
+
+    if isinstance(item, list):
+        return sorted(
+            (_canonical(element) for element in item),
+            key=lambda element: json.dumps(element, sort_keys=True)
+        )
+
+    return item
+
+
+def _list_difference(old, new):
+    """
+    Returns items only in old and items only in new list, regardless of their
+    order, or of order of lists nested in them.
+    """
+    def key(item):
+        return json.dumps(_canonical(item), sort_keys=True)
+
+    old_keys = set(key(item) for item in old)
+    new_keys = set(key(item) for item in new)
 
-    changed = []
-    added = []
     deleted = []
+    for item in old:
+        k = key(item)
+        if k not in new_keys:
+            deleted.append(item)
+            new_keys.add(k)
+
+    added = []
+    for item in new:
+        k = key(item)
+        if k not in old_keys:
+            added.append(item)
+            old_keys.add(k)
+
+    return deleted, added
+
+
+def _keyed_list_messages(field, deleted, added):
     msg = []
-    if old_data:
-        res = DeepDiff(old_data, new_data, ignore_order=True)
-
-        # I'm numbering how many times the for loop has passed because foreign
-        # keys are serialized in lists
-        passed = 0
-        added_groups = list()
-        deleted_groups = list()
-        added_rules = list()
-        deleted_rules = list()
-        if 'iterable_item_removed' in res:
-            for key, value in res['iterable_item_removed'].items():
-                field = key.split('[')[1][0:-1].strip('\'')
-                if field in foreignkeys:
-                    passed += 1
-                    pass
-                elif field == 'groups':
-                    deleted_groups.append(value['name'])
-                elif field == 'rules':
-                    deleted_rules.append(value['metric'])
-                else:
-                    msg.append(
-                        {
-                            'deleted': {
-                                'fields': [field], 'object': value
-                            }
-                        }
-                    )
+    deleted_keys = [item[KEYED_LIST_FIELDS[field]] for item in deleted]
+    for item in added:
+        name = item[KEYED_LIST_FIELDS[field]]
+        if name in deleted_keys:
+            deleted_keys.remove(name)
+            msg.append({'changed': {'fields': [field], 'object': [name]}})
 
-        if 'iterable_item_added' in res:
-            for key, value in res['iterable_item_added'].items():
-                field = key.split('[')[1][0:-1].strip('\'')
-                if field in foreignkeys:
-                    passed += 1
-                    pass
-                elif field == 'groups':
-                    added_groups.append(value['name'])
-                elif field == 'rules':
-                    added_rules.append(value['metric'])
-                else:
-                    msg.append(
-                        {
-                            'added': {
-                                'fields': [field], 'object': value
-                            }
-                        }
-                    )
+        else:
+            msg.append({'added': {'fields': [field], 'object': [name]}})
 
-        if added_groups or deleted_groups:
-            for item in added_groups:
-                if item in deleted_groups:
-                    deleted_groups.remove(item)
-                    msg.append(
-                        {
-                            'changed': {
-                                'fields': ['groups'], 'object': [item]
-                            }
-                        }
-                    )
+    for name in deleted_keys:
+        msg.append({'deleted': {'fields': [field], 'object': [name]}})
+
+    return msg
+
+
+def _inline_messages(field, old_value, new_value):
+    old = inline_models_to_dicts(old_value)
+    new = inline_models_to_dicts(new_value)
+
+    deleted = sorted(key for key in old if key not in new)
+    changed = sorted(key for key in old if key in new and old[key] != new[key])
+    added = sorted(key for key in new if key not in old)
+
+    msg = []
+    if deleted:
+        msg.append({'deleted': {'fields': [field], 'object': deleted}})
+
+    if changed:
+        msg.append({'changed': {'fields': [field], 'object': changed}})
+
+    if added:
+        msg.append({'added': {'fields': [field], 'object': added}})
+
+    return msg
 
-                else:
-                    msg.append(
-                        {
-                            'added': {
-                                'fields': ['groups'], 'object': [item]
-                            }
-                        }
-                    )
 
-            for item in deleted_groups:
-                msg.append(
-                    {
-                        'deleted': {
-                            'fields': ['groups'], 'object': [item]
-                        }
-                    }
+def analyze_differences(old_data, new_data):
+    """
+    Returns JSON comment describing changes between two serialized versions
+    of metric, metric template, probe or profile. Fields are compared
+    according to their type, so nested values are never walked as a whole.
+    """
+    if not old_data:
+        return 'Initial version.'
+
+    added = []
+    changed = []
+    deleted = []
+    items_deleted = []
+    items_added = []
+    keyed_msg = dict((field, []) for field in KEYED_LIST_FIELDS)
+    inline_msg = []
+
+    for field, new_value in new_data.items():
+        if field not in old_data:
+            added.append(field)
+            continue
+
+        old_value = old_data[field]
+        if old_value == new_value:
+            continue
+
+        if type(old_value) is not type(new_value):
+            if new_value is None:
+                deleted.append(field)
+
+            elif old_value is None:
+                added.append(field)
+
+            else:
+                changed.append(field)
+
+        elif isinstance(new_value, list):
+            if field in FOREIGN_KEY_FIELDS:
+                changed.append(field)
+                continue
+
+            deleted_items, added_items = _list_difference(old_value, new_value)
+
+            if field in KEYED_LIST_FIELDS:
+                keyed_msg[field] = _keyed_list_messages(
+                    field, deleted_items, added_items
                 )
 
-        if added_rules or deleted_rules:
-            for item in added_rules:
-                if item in deleted_rules:
-                    deleted_rules.remove(item)
-                    msg.append(
-                        {
-                            'changed': {
-                                'fields': ['rules'], 'object': [item]
-                            }
-                        }
+            else:
+                for item in deleted_items:
+                    items_deleted.append(
+                        {'deleted': {'fields': [field], 'object': item}}
                     )
 
-                else:
-                    msg.append(
-                        {
-                            'added': {
-                                'fields': ['rules'], 'object': [item]
-                            }
-                        }
+                for item in added_items:
+                    items_added.append(
+                        {'added': {'fields': [field], 'object': item}}
                     )
 
-            for item in deleted_rules:
-                msg.append(
-                    {
-                        'deleted': {
-                            'fields': ['rules'], 'object': [item]
-                        }
-                    }
-                )
+        elif field in INLINE_FIELDS:
+            inline_msg.extend(_inline_messages(field, old_value, new_value))
 
-        if passed > 0:
-            res = DeepDiff(old_data, new_data)
-
-        if 'dictionary_item_added' in res:
-            for item in res['dictionary_item_added']:
-                added.append(item.split('[')[1][0:-1].strip('\''))
-
-        if 'type_changes' in res:
-            for key, value in res['type_changes'].items():
-                field = key.split('[')[1][0:-1].strip('\'')
-
-                if value['new_value'] is None:
-                    deleted.append(field)
-
-                if value['old_value'] is None:
-                    added.append(field)
-
-                if not value['new_value'] is None and \
-                        not value['old_value'] is None:
-                    changed.append(field)
-
-        if 'values_changed' in res:
-            for key, value in res['values_changed'].items():
-                field = key.split('[')[1][1:-2]
-                try:
-                    if field in inlines:
-                        old = inline_models_to_dicts(value['old_value'])
-                        new = inline_models_to_dicts(value['new_value'])
-                        deleted_fields = []
-                        changed_fields = []
-                        added_fields = []
-                        res = DeepDiff(old, new, ignore_order=True)
-                        if 'values_changed' in res:
-                            for k, v in res['values_changed'].items():
-                                changed_fields.append(
-                                    k.split('[')[1][0:-1].strip('\'')
-                                )
-
-                        if 'dictionary_item_added' in res:
-                            for item in res['dictionary_item_added']:
-                                added_fields.append(
-                                    item.split('[')[1][0:-1].strip('\'')
-                                )
-
-                        if 'dictionary_item_removed' in res:
-                            for item in res['dictionary_item_removed']:
-                                deleted_fields.append(
-                                    item.split('[')[1][0:-1].strip('\'')
-                                )
-
-                        if deleted_fields:
-                            msg.append(
-                                {'deleted': {
-                                    'fields': [field],
-                                    'object': sorted(deleted_fields)
-                                }}
-                            )
-
-                        if changed_fields:
-                            msg.append(
-                                {'changed': {
-                                    'fields': [field],
-                                    'object': sorted(changed_fields)
-                                }}
-                            )
-
-                        if added_fields:
-                            msg.append(
-                                {'added': {'fields': [field],
-                                           'object': sorted(added_fields)}}
-                            )
-
-                    else:
-                        if not value['new_value']:
-                            deleted.append(field)
-
-                        elif not value['old_value']:
-                            added.append(field)
-
-                        else:
-                            if field != 'tags':
-                                changed.append(field)
-
-                except KeyError:
-                    pass
-
-        if added:
-            msg.append({'added': {'fields': sorted(list(set(added)))}})
-        if changed:
-            msg.append({'changed': {'fields': sorted(list(set(changed)))}})
-        if deleted:
-            msg.append({'deleted': {'fields': sorted(list(set(deleted)))}})
-
-        return json.dumps(msg)
-    else:
-        return 'Initial version.'
+        elif not new_value:
+            deleted.append(field)
+
+        elif not old_value:
+            added.append(field)
+
+        elif field != 'tags':
+            changed.append(field)
+
+    msg = items_deleted + items_added
+    for field in KEYED_LIST_FIELDS:
+        msg.extend(keyed_msg[field])
+    msg.extend(inline_msg)
+
+    if added:
+        msg.append({'added': {'fields': sorted(set(added))}})
+    if changed:
+        msg.append({'changed': {'fields': sorted(set(changed))}})
+    if deleted:
+        msg.append({'deleted': {'fields': sorted(set(deleted))}})
+
+    return json.dumps(msg)
+
+
+def get_version(history, offset=0):
+    """
+    Returns version at the given offset from the newest one, or None if there
+    are not so many versions. Only the requested version is loaded, using
+    index on object, creation date and id, which covers the whole ordering,
+    so the cost does not depend on the length of history.
+    """
+    versions = list(
+        history.order_by('-date_created', '-id')[offset:offset + 1]
+    )
+
+    return versions[0] if versions else None
 
 
 def create_comment(instance, ct=None, new_serialized_data=None):
@@ -335,29 +317,30 @@ def create_comment(instance, ct=None, new_serialized_data=None):
         else:
             history_model = admin_models.MetricTemplateHistory
 
-        history = history_model.objects.filter(object_id=instance) \
-            .order_by('-date_created')
+        latest = get_version(history_model.objects.filter(object_id=instance))
 
         new_data = to_dict(instance)
         if isinstance(instance, admin_models.Probe):
             del new_data['user'], new_data['datetime']
 
     else:
-        history = poem_models.TenantHistory.objects.filter(
-            object_id=instance.id,
-            content_type=ct
-        ).order_by('-date_created')
+        latest = get_version(
+            poem_models.TenantHistory.objects.filter(
+                object_id=instance.id,
+                content_type=ct
+            )
+        )
         new_data = serialized_data_to_dict(new_serialized_data)
 
-    if len(history) > 0:
+    if latest:
         if isinstance(
                 instance,
                 (poem_models.Metric, poem_models.MetricProfiles,
                  poem_models.Aggregation, poem_models.ThresholdsProfiles)
         ):
-            old_data = serialized_data_to_dict(history[0].serialized_data)
+            old_data = serialized_data_to_dict(latest.serialized_data)
         else:
-            old_data = to_dict(history[0])
+            old_data = to_dict(latest)
             del old_data['object_id'], old_data['version_comment'], \
                 old_data['version_user'], old_data['date_created']
     else:
@@ -373,15 +356,16 @@ def update_comment(instance):
     else:
         history_model = admin_models.MetricTemplateHistory
 
-    history = history_model.objects.filter(object_id=instance)\
-        .order_by('-date_created')
+    previous = get_version(
+        history_model.objects.filter(object_id=instance), offset=1
+    )
 
     new_data = to_dict(instance)
     if isinstance(instance, admin_models.Probe):
         del new_data['user'], new_data['datetime']
 
-    if len(history) > 1:
-        old_data = to_dict(history[1])
+    if previous:
+        old_data = to_dict(previous)
         del old_data['object_id'], old_data['version_comment'], \
             old_data['version_user'], old_data['date_created']
 
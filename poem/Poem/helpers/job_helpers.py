@@ -0,0 +1,91 @@
+import datetime
+import json
+
+from Poem.poem_super_admin.models import Job
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from tenant_schemas.utils import schema_context
+
+
+def enqueue_job(func, arguments, user=''):
+    """
+    Queues call of module level function func with the given dict of keyword
+    arguments, which must be JSON serializable. Job is run in schema of the
+    current tenant, and func is given progress(done, total) callable along
+    the arguments. Data returned by func is kept as job result.
+    """
+    return Job.objects.create(
+        func='{}.{}'.format(func.__module__, func.__qualname__),
+        arguments=json.dumps(arguments),
+        schema_name=connection.schema_name,
+        user=user
+    )
+
+
+def claim_job():
+    """
+    Marks the oldest queued job as running and returns it, or None if there
+    are no queued jobs. Jobs locked by other workers are skipped, so any
+    number of workers can claim jobs at the same time. Running jobs which
+    have not reported progress for JOB_HEARTBEAT_TIMEOUT seconds are marked
+    as failed, since their worker is gone; they are not run again, because
+    they might have been partially done.
+    """
+    now = timezone.now()
+    Job.objects.filter(
+        status=Job.RUNNING,
+        date_updated__lt=now - datetime.timedelta(
+            seconds=settings.JOB_HEARTBEAT_TIMEOUT
+        )
+    ).update(
+        status=Job.FAILED,
+        result=json.dumps({'detail': 'Job has been abandoned by its worker.'}),
+        date_finished=now
+    )
+
+    with transaction.atomic():
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            status=Job.QUEUED
+        ).order_by('id').first()
+
+        if job:
+            job.status = Job.RUNNING
+            job.date_started = now
+            job.date_updated = now
+            job.save()
+
+    return job
+
+
+def run_job(job):
+    """
+    Runs claimed job and stores its result, unless the job has meanwhile
+    been marked as abandoned, in which case it is left failed.
+    """
+    try:
+        func = import_string(job.func)
+
+        with schema_context(job.schema_name):
+            result = func(
+                progress=job.set_progress, **json.loads(job.arguments)
+            )
+
+        job.status = Job.DONE
+        job.result = json.dumps(result)
+
+    except Exception as e:
+        job.status = Job.FAILED
+        job.result = json.dumps({'detail': str(e)})
+
+    job.date_finished = timezone.now()
+    finished = Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(
+        status=job.status, result=job.result, progress=job.progress,
+        total=job.total, date_finished=job.date_finished
+    )
+
+    if not finished:
+        job.refresh_from_db()
+
+    return job
@@ -1,126 +1,181 @@
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from Poem.api.models import MyAPIKey
-from Poem.helpers.history_helpers import create_history
+from Poem.helpers.history_helpers import create_history, get_version
+from Poem.helpers.webapi_helpers import WEBAPI_POOL_SIZE, get_webapi_data, \
+    invalidate_webapi_data, webapi_put
 from Poem.poem import models as poem_models
 from Poem.poem_super_admin import models as admin_models
 from Poem.tenants.models import Tenant
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core import serializers
-from django.db import IntegrityError
+from django.db import connection, transaction
 from tenant_schemas.utils import schema_context, get_public_schema_name
 
+# number of tenants handled at the same time when changes are propagated
+TENANT_WORKERS = 4
+
 
 def import_metrics(metrictemplates, tenant, user):
     imported = []
     warn_imported = []
     not_imported = []
     unavailable = []
+
+    mts = dict(
+        (mt.name, mt) for mt in
+        admin_models.MetricTemplate.objects.filter(
+            name__in=metrictemplates
+        ).select_related('mtype', 'probekey__package').prefetch_related('tags')
+    )
+    mtypes = dict(
+        (mtype.name, mtype) for mtype in poem_models.MetricType.objects.all()
+    )
+    gr = poem_models.GroupOfMetrics.objects.get(name=tenant.name.upper())
+
+    # names of tenant's metrics, and packages they use, are updated with
+    # each metric imported
+    existing = set()
+    packages = set()
+    package_versions = dict()
+    for metric in poem_models.Metric.objects.select_related(
+            'probekey__package'
+    ).order_by('id'):
+        existing.add(metric.name)
+        if metric.probekey:
+            packages.add(metric.probekey.package)
+            package_versions.setdefault(
+                metric.probekey.package.name, metric.probekey.package
+            )
+
+    metrics = []
+    metrics_tags = []
     for template in metrictemplates:
         imported_different_version = False
-        mt = admin_models.MetricTemplate.objects.get(name=template)
-        mtype = poem_models.MetricType.objects.get(name=mt.mtype.name)
-        gr = poem_models.GroupOfMetrics.objects.get(
-            name=tenant.name.upper()
-        )
+        if template in mts:
+            mt = mts[template]
+        else:
+            mt = admin_models.MetricTemplate.objects.get(name=template)
 
-        packages = []
-        for m in poem_models.Metric.objects.all():
-            if m.probekey:
-                packages.append(m.probekey.package)
+        if mt.mtype.name in mtypes:
+            mtype = mtypes[mt.mtype.name]
+        else:
+            mtype = poem_models.MetricType.objects.get(name=mt.mtype.name)
 
-        package_names = [package.name for package in packages]
+        if mt.probekey:
+            if mt.probekey.package.name in package_versions and \
+                    mt.probekey.package not in packages:
+                try:
+                    ver = admin_models.ProbeHistory.objects.get(
+                        name=mt.probekey.name,
+                        package=package_versions[mt.probekey.package.name]
+                    )
 
-        try:
-            if mt.probekey:
-                if mt.probekey.package.name in package_names and \
-                        mt.probekey.package not in packages:
-                    package_version = [
-                        package for package in packages
-                        if package.name == mt.probekey.package.name
-                    ][0]
-                    try:
-                        ver = admin_models.ProbeHistory.objects.get(
-                            name=mt.probekey.name,
-                            package=package_version
+                    metrictemplate = \
+                        admin_models.MetricTemplateHistory.objects.get(
+                            name=mt.name, probekey=ver
                         )
+                    imported_different_version = True
 
-                        metrictemplate = \
-                            admin_models.MetricTemplateHistory.objects.get(
-                                name=mt.name, probekey=ver
-                            )
-                        imported_different_version = True
-
-                    except admin_models.ProbeHistory.DoesNotExist:
-                        unavailable.append(mt.name)
-                        continue
-
-                    except admin_models.MetricTemplateHistory.DoesNotExist:
-                        unavailable.append(mt.name)
-                        continue
-
-                else:
-                    metrictemplate = mt
-                    ver = mt.probekey
-
-                metric = poem_models.Metric.objects.create(
-                    name=metrictemplate.name,
-                    mtype=mtype,
-                    probekey=ver,
-                    description=metrictemplate.description,
-                    parent=metrictemplate.parent,
-                    group=gr,
-                    probeexecutable=metrictemplate.probeexecutable,
-                    config=metrictemplate.config,
-                    attribute=metrictemplate.attribute,
-                    dependancy=metrictemplate.dependency,
-                    flags=metrictemplate.flags,
-                    files=metrictemplate.files,
-                    parameter=metrictemplate.parameter,
-                    fileparameter=metrictemplate.fileparameter
-                )
-                new_tags = set([tag.name for tag in metrictemplate.tags.all()])
+                except admin_models.ProbeHistory.DoesNotExist:
+                    unavailable.append(mt.name)
+                    continue
 
-            else:
-                metric = poem_models.Metric.objects.create(
-                    name=mt.name,
-                    mtype=mtype,
-                    description=mt.description,
-                    parent=mt.parent,
-                    flags=mt.flags,
-                    group=gr
-                )
-                new_tags = set([tag.name for tag in mt.tags.all()])
+                except admin_models.MetricTemplateHistory.DoesNotExist:
+                    unavailable.append(mt.name)
+                    continue
 
-            old_tags = set([tag.name for tag in metric.tags.all()])
+            else:
+                metrictemplate = mt
+                ver = mt.probekey
+
+            metric = poem_models.Metric(
+                name=metrictemplate.name,
+                mtype=mtype,
+                probekey=ver,
+                description=metrictemplate.description,
+                parent=metrictemplate.parent,
+                group=gr,
+                probeexecutable=metrictemplate.probeexecutable,
+                config=metrictemplate.config,
+                attribute=metrictemplate.attribute,
+                dependancy=metrictemplate.dependency,
+                flags=metrictemplate.flags,
+                files=metrictemplate.files,
+                parameter=metrictemplate.parameter,
+                fileparameter=metrictemplate.fileparameter
+            )
 
-            if new_tags.difference(old_tags):
-                for tag_name in new_tags.difference(old_tags):
-                    metric.tags.add(
-                        admin_models.MetricTags.objects.get(name=tag_name)
-                    )
+        else:
+            metrictemplate = mt
+            metric = poem_models.Metric(
+                name=mt.name,
+                mtype=mtype,
+                description=mt.description,
+                parent=mt.parent,
+                flags=mt.flags,
+                group=gr
+            )
 
-            if old_tags.difference(new_tags):
-                for tag_name in old_tags.difference(new_tags):
-                    metric.tags.remove(
-                        admin_models.MetricTags.objects.get(name=tag_name)
-                    )
+        if metric.name in existing:
+            not_imported.append(mt.name)
+            continue
 
-            create_history(
-                metric, user.username, comment='Initial version.'
+        existing.add(metric.name)
+        if metric.probekey:
+            packages.add(metric.probekey.package)
+            package_versions.setdefault(
+                metric.probekey.package.name, metric.probekey.package
             )
 
-            if imported_different_version:
-                warn_imported.append(mt.name)
+        metrics.append(metric)
+        metrics_tags.append([tag.id for tag in metrictemplate.tags.all()])
 
-            else:
-                imported.append(mt.name)
+        if imported_different_version:
+            warn_imported.append(mt.name)
 
-        except IntegrityError:
-            not_imported.append(mt.name)
-            continue
+        else:
+            imported.append(mt.name)
+
+    if metrics:
+        with transaction.atomic():
+            poem_models.Metric.objects.bulk_create(metrics)
+            admin_models.MetricUsage.objects.bulk_create(
+                [poem_models.metric_usage(metric) for metric in metrics]
+            )
+
+            poem_models.Metric.tags.through.objects.bulk_create([
+                poem_models.Metric.tags.through(
+                    metric_id=metric.id, metrictags_id=tag
+                ) for metric, tags in zip(metrics, metrics_tags)
+                for tag in tags
+            ])
+
+            ct = ContentType.objects.get_for_model(poem_models.Metric)
+            poem_models.TenantHistory.objects.bulk_create([
+                poem_models.TenantHistory(
+                    object_id=metric.id,
+                    serialized_data=serializers.serialize(
+                        'json', [metric],
+                        use_natural_foreign_keys=True,
+                        use_natural_primary_keys=True
+                    ),
+                    object_repr=metric.__str__(),
+                    content_type=ct,
+                    comment='Initial version.',
+                    user=user.username
+                ) for metric in poem_models.Metric.objects.filter(
+                    id__in=[metric.id for metric in metrics]
+                ).select_related(
+                    'mtype', 'group', 'probekey__package'
+                ).prefetch_related('tags').order_by('id')
+            ])
+
+        # bulk_create() does not send signals
+        poem_models.bump_change_counter('metrics')
 
     return imported, warn_imported, not_imported, unavailable
 
@@ -128,17 +183,7 @@ def import_metrics(metrictemplates, tenant, user):
 def get_metrics_in_profiles(schema):
     with schema_context(schema):
         try:
-            token = MyAPIKey.objects.get(name='WEB-API')
-            headers = {
-                'Accept': 'application/json', 'x-api-key': token.token
-            }
-
-            response = requests.get(
-                settings.WEBAPI_METRIC, headers=headers, timeout=180
-            )
-            response.raise_for_status()
-
-            data = response.json()['data']
+            data = get_webapi_data(settings.WEBAPI_METRIC)
             metrics_dict = dict()
             for item in data:
                 for service in item['services']:
@@ -164,161 +209,230 @@ def get_metrics_in_profiles(schema):
             raise Exception('Error fetching WEB API data: API key not found.')
 
 
-def update_metrics(metrictemplate, name, probekey, user=''):
-    schemas = list(Tenant.objects.all().values_list('schema_name', flat=True))
-    schemas.remove(get_public_schema_name())
-
-    msgs = []
-    for schema in schemas:
+def _run_in_schema(schema, func, *args, **kwargs):
+    # used from worker threads, which have their own database connection
+    try:
         with schema_context(schema):
-            try:
-                met = poem_models.Metric.objects.get(
-                    name=name, probekey=probekey
-                )
-                met.name = metrictemplate.name
-                met.probekey = metrictemplate.probekey
-                met.probeexecutable = metrictemplate.probeexecutable
-                met.description = metrictemplate.description
-                met.parent = metrictemplate.parent
-                met.attribute = metrictemplate.attribute
-                met.dependancy = metrictemplate.dependency
-                met.flags = metrictemplate.flags
-                met.files = metrictemplate.files
-                met.parameter = metrictemplate.parameter
-                met.fileparameter = metrictemplate.fileparameter
-
-                if metrictemplate.config:
-                    for item in json.loads(metrictemplate.config):
-                        if item.split(' ')[0] == 'path':
-                            objpath = item
-
-                    metconfig = []
-                    for item in json.loads(met.config):
-                        if item.split(' ')[0] == 'path':
-                            metconfig.append(objpath)
-                        else:
-                            metconfig.append(item)
+            return func(*args, **kwargs)
+
+    finally:
+        connection.close()
+
+
+def for_each_tenant(func, *args, schemas=None, progress=None, **kwargs):
+    """
+    Calls func(schema, *args, **kwargs) in the schema of each tenant, or of
+    each of the given schemas, and returns the results in order of tenants.
+    Tenants are handled by a pool of worker threads, each of them using its
+    own database connection. Inside of transaction tenants are handled one
+    after another, since changes not yet committed are not visible to other
+    connections. If given, progress(done, total) is called as tenants are
+    done.
+    """
+    if schemas is None:
+        schemas = list(
+            Tenant.objects.all().values_list('schema_name', flat=True)
+        )
+        schemas.remove(get_public_schema_name())
 
-                    met.config = json.dumps(metconfig)
+    results = []
+    if connection.in_atomic_block or len(schemas) < 2:
+        for schema in schemas:
+            with schema_context(schema):
+                results.append(func(schema, *args, **kwargs))
 
-                met.save()
+            if progress:
+                progress(len(results), len(schemas))
 
-                new_tags = set([tag.name for tag in metrictemplate.tags.all()])
-                old_tags = set([tag.name for tag in met.tags.all()])
-                if new_tags.difference(old_tags):
-                    for tag_name in new_tags.difference(old_tags):
-                        met.tags.add(
-                            admin_models.MetricTags.objects.get(name=tag_name)
-                        )
+        return results
 
-                if old_tags.difference(new_tags):
-                    for tag_name in old_tags.difference(new_tags):
-                        met.tags.remove(
-                            admin_models.MetricTags.objects.get(name=tag_name)
-                        )
+    with ThreadPoolExecutor(
+            max_workers=min(TENANT_WORKERS, len(schemas))
+    ) as executor:
+        for result in executor.map(
+            lambda schema: _run_in_schema(
+                schema, func, schema, *args, **kwargs
+            ),
+            schemas
+        ):
+            results.append(result)
 
-                if met.probekey != probekey:
-                    create_history(met, user)
+            if progress:
+                progress(len(results), len(schemas))
 
-                else:
-                    history = poem_models.TenantHistory.objects.filter(
-                        object_id=met.id,
-                        content_type=ContentType.objects.get_for_model(
-                            poem_models.Metric
-                        )
-                    )[0]
-                    history.serialized_data = serializers.serialize(
-                        'json', [met],
-                        use_natural_foreign_keys=True,
-                        use_natural_primary_keys=True
-                    )
-                    history.object_repr = met.__str__()
-                    history.save()
+    return results
 
-                if name != met.name:
-                    msgs = update_metrics_in_profiles(name, met.name)
 
+def _update_tenant_metric(
+        schema, metrictemplate, name, probekey, user, tags, objpath
+):
+    try:
+        met = poem_models.Metric.objects.get(name=name, probekey=probekey)
+
+    except poem_models.Metric.DoesNotExist:
+        return False
+
+    met.name = metrictemplate.name
+    met.probekey = metrictemplate.probekey
+    met.probeexecutable = metrictemplate.probeexecutable
+    met.description = metrictemplate.description
+    met.parent = metrictemplate.parent
+    met.attribute = metrictemplate.attribute
+    met.dependancy = metrictemplate.dependency
+    met.flags = metrictemplate.flags
+    met.files = metrictemplate.files
+    met.parameter = metrictemplate.parameter
+    met.fileparameter = metrictemplate.fileparameter
+
+    if metrictemplate.config:
+        metconfig = []
+        for item in json.loads(met.config):
+            if item.split(' ')[0] == 'path' and objpath:
+                metconfig.append(objpath)
+            else:
+                metconfig.append(item)
 
-            except poem_models.Metric.DoesNotExist:
-                continue
+        met.config = json.dumps(metconfig)
 
-    return msgs
+    met.save()
 
+    old_tags = dict((tag.name, tag) for tag in met.tags.all())
+    new_tags = set(tags.keys()).difference(set(old_tags.keys()))
+    if new_tags:
+        met.tags.add(*[tags[tag_name] for tag_name in new_tags])
 
-def update_metrics_in_profiles(old_name, new_name):
-    error_msgs = []
-    if old_name == new_name:
-        pass
+    removed_tags = set(old_tags.keys()).difference(set(tags.keys()))
+    if removed_tags:
+        met.tags.remove(*[old_tags[tag_name] for tag_name in removed_tags])
+
+    if met.probekey != probekey:
+        create_history(met, user)
 
     else:
-        schemas = list(Tenant.objects.all().values_list(
-            'schema_name', flat=True
-        ))
-        schemas.remove(get_public_schema_name())
+        history = get_version(
+            poem_models.TenantHistory.objects.filter(
+                object_id=met.id,
+                content_type=ContentType.objects.get_for_model(
+                    poem_models.Metric
+                )
+            )
+        )
+        history.serialized_data = serializers.serialize(
+            'json', [met],
+            use_natural_foreign_keys=True,
+            use_natural_primary_keys=True
+        )
+        history.object_repr = met.__str__()
+        history.save()
 
-        for schema in schemas:
-            with schema_context(schema):
-                try:
-                    token = MyAPIKey.objects.get(name='WEB-API')
-                    headers = {
-                        'Accept': 'application/json', 'x-api-key': token.token
-                    }
+    return name != met.name
 
-                    response = requests.get(
-                        settings.WEBAPI_METRIC, headers=headers, timeout=180
-                    )
-                    response.raise_for_status()
-
-                    data = response.json()['data']
-
-                    for profile in data:
-                        flag = 0
-                        new_services = []
-                        for service in profile['services']:
-                            new_metrics = []
-                            if 'metrics' in service:
-                                for metric in service['metrics']:
-                                    if metric == old_name:
-                                        flag += 1
-                                        new_metrics.append(new_name)
-                                    else:
-                                        new_metrics.append(metric)
-                            new_services.append({
-                                'service': service['service'],
-                                'metrics': new_metrics
-                            })
-
-                        if flag > 0:
-                            new_data = {
-                                'id': profile['id'],
-                                'name': profile['name'],
-                                'description': profile['description'],
-                                'services': new_services
-                            }
-                            response = requests.put(
-                                settings.WEBAPI_METRIC + '/' + profile['id'],
-                                headers=headers,
-                                data=json.dumps(new_data)
-                            )
-                            response.raise_for_status()
-
-                except requests.exceptions.HTTPError as e:
-                    error_msgs.append(
-                        '{}: Error trying to update metric in metric profiles: '
-                        '{}.\nPlease update metric profiles manually.'.format(
-                            schema.upper(), e
-                        )
-                    )
-                    continue
 
-                except MyAPIKey.DoesNotExist:
-                    error_msgs.append(
-                        '{}: No "WEB-API" key in the DB!'
-                        '\nPlease update metric profiles manually.'.format(
-                            schema.upper()
-                        )
-                    )
-                    continue
+def update_metrics(metrictemplate, name, probekey, user='', progress=None):
+    tags = dict((tag.name, tag) for tag in metrictemplate.tags.all())
+
+    objpath = None
+    if metrictemplate.config:
+        for item in json.loads(metrictemplate.config):
+            if item.split(' ')[0] == 'path':
+                objpath = item
+
+    renamed = for_each_tenant(
+        _update_tenant_metric, metrictemplate, name, probekey, user, tags,
+        objpath,
+        schemas=admin_models.metric_schemas(name=name, probekey=probekey),
+        progress=progress
+    )
+
+    msgs = []
+    if any(renamed):
+        msgs = update_metrics_in_profiles(name, metrictemplate.name)
+
+    return msgs
+
+
+def _update_tenant_profiles(schema, old_name, new_name):
+    try:
+        # profiles are about to be written back, so they are always
+        # revalidated
+        data = get_webapi_data(settings.WEBAPI_METRIC, max_age=0)
+
+        new_profiles = []
+        for profile in data:
+            flag = 0
+            new_services = []
+            for service in profile['services']:
+                new_metrics = []
+                if 'metrics' in service:
+                    for metric in service['metrics']:
+                        if metric == old_name:
+                            flag += 1
+                            new_metrics.append(new_name)
+                        else:
+                            new_metrics.append(metric)
+                new_services.append({
+                    'service': service['service'],
+                    'metrics': new_metrics
+                })
+
+            if flag > 0:
+                new_profiles.append({
+                    'id': profile['id'],
+                    'name': profile['name'],
+                    'description': profile['description'],
+                    'services': new_services
+                })
+
+        if new_profiles:
+            try:
+                with ThreadPoolExecutor(
+                        max_workers=min(WEBAPI_POOL_SIZE, len(new_profiles))
+                ) as executor:
+                    responses = list(executor.map(
+                        lambda new_data: _run_in_schema(
+                            schema, webapi_put,
+                            settings.WEBAPI_METRIC + '/' + new_data['id'],
+                            data=json.dumps(new_data)
+                        ),
+                        new_profiles
+                    ))
+
+            finally:
+                invalidate_webapi_data(settings.WEBAPI_METRIC)
+
+            for response in responses:
+                response.raise_for_status()
+
+    except requests.exceptions.HTTPError as e:
+        return [
+            '{}: Error trying to update metric in metric profiles: '
+            '{}.\nPlease update metric profiles manually.'.format(
+                schema.upper(), e
+            )
+        ]
+
+    except MyAPIKey.DoesNotExist:
+        return [
+            '{}: No "WEB-API" key in the DB!'
+            '\nPlease update metric profiles manually.'.format(
+                schema.upper()
+            )
+        ]
+
+    return []
+
+
+def update_metrics_in_profiles(old_name, new_name):
+    """
+    Renames metric in metric profiles of all the tenants. Tenants are handled
+    at the same time, and so are the profiles of each tenant.
+    """
+    error_msgs = []
+    if old_name != new_name:
+        for msgs in for_each_tenant(
+                _update_tenant_profiles, old_name, new_name
+        ):
+            error_msgs += msgs
 
     return error_msgs
 
@@ -326,20 +440,14 @@ def update_metrics_in_profiles(old_name, new_name):
 def delete_metrics_from_profile(profile, metrics):
     try:
         profile_id = poem_models.MetricProfiles.objects.get(name=profile).apiid
-        token = MyAPIKey.objects.get(name='WEB-API')
-        headers = {
-            'Accept': 'application/json', 'x-api-key': token.token
-        }
         if settings.WEBAPI_METRIC.endswith('/'):
             url = settings.WEBAPI_METRIC + profile_id
 
         else:
             url = settings.WEBAPI_METRIC + '/' + profile_id
 
-        response = requests.get(url, headers=headers, timeout=180)
-        response.raise_for_status()
-
-        data = response.json()['data'][0]
+        # profile is about to be written back, so it is always revalidated
+        data = get_webapi_data(url, max_age=0)[0]
 
         for metric in metrics:
             for item in data['services']:
@@ -356,10 +464,9 @@ def delete_metrics_from_profile(profile, metrics):
             'services': data['services']
         }
 
-        response = requests.put(
-            url, headers=headers, data=json.dumps(send_data)
-        )
+        response = webapi_put(url, data=json.dumps(send_data))
         response.raise_for_status()
+        invalidate_webapi_data(settings.WEBAPI_METRIC)
 
     except MyAPIKey.DoesNotExist:
         raise Exception(
@@ -0,0 +1,202 @@
+import copy
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from Poem.api.models import MyAPIKey
+from django.db import connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# number of seconds WEB-API data is used without asking WEB-API again
+WEBAPI_CACHE_TIMEOUT = 60
+
+# number of seconds tenant token is used without reading it from database
+WEBAPI_TOKEN_TIMEOUT = 300
+
+WEBAPI_TIMEOUT = 180
+WEBAPI_POOL_SIZE = 10
+WEBAPI_RETRIES = 3
+WEBAPI_BACKOFF_FACTOR = 0.5
+
+# maximum number of requests sent to the same host at the same time, by all
+# the tenants together
+WEBAPI_HOST_CONCURRENCY = 10
+
+_cache = dict()
+_locks = dict()
+_locks_lock = threading.Lock()
+_sessions = dict()
+_tokens = dict()
+_host_limits = dict()
+
+
+def _get_lock(key):
+    with _locks_lock:
+        if key not in _locks:
+            _locks[key] = threading.Lock()
+
+        return _locks[key]
+
+
+def _get_host_limit(url):
+    host = urlparse(url).netloc
+
+    with _locks_lock:
+        if host not in _host_limits:
+            _host_limits[host] = threading.BoundedSemaphore(
+                WEBAPI_HOST_CONCURRENCY
+            )
+
+        return _host_limits[host]
+
+
+def _is_fresh(entry, max_age):
+    return entry and time.monotonic() - entry['fetched'] < max_age
+
+
+def get_webapi_session():
+    """
+    Returns tenant's session with pool of keep-alive connections to WEB-API.
+    Failed connections and responses with 502, 503 and 504 status codes are
+    retried with exponential backoff.
+    """
+    schema = connection.schema_name
+
+    with _locks_lock:
+        if schema not in _sessions:
+            retries = Retry(
+                total=WEBAPI_RETRIES,
+                backoff_factor=WEBAPI_BACKOFF_FACTOR,
+                status_forcelist=(502, 503, 504),
+                method_whitelist=frozenset(['GET', 'PUT']),
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(
+                pool_connections=WEBAPI_POOL_SIZE,
+                pool_maxsize=WEBAPI_POOL_SIZE,
+                max_retries=retries
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[schema] = session
+
+        return _sessions[schema]
+
+
+def get_webapi_token():
+    schema = connection.schema_name
+
+    entry = _tokens.get(schema)
+    if _is_fresh(entry, WEBAPI_TOKEN_TIMEOUT):
+        return entry['token']
+
+    token = MyAPIKey.objects.get(name='WEB-API').token
+    _tokens[schema] = {'token': token, 'fetched': time.monotonic()}
+
+    return token
+
+
+def _webapi_request(method, url, headers=None, **kwargs):
+    request_headers = {
+        'Accept': 'application/json', 'x-api-key': get_webapi_token()
+    }
+    if headers:
+        request_headers.update(headers)
+
+    session = get_webapi_session()
+    with _get_host_limit(url):
+        response = getattr(session, method)(
+            url, headers=request_headers, timeout=WEBAPI_TIMEOUT, **kwargs
+        )
+
+    # token might have been changed in another process, so the one from the
+    # database is tried once more before giving up
+    if response.status_code == requests.codes.unauthorized and \
+            connection.schema_name in _tokens:
+        _tokens.pop(connection.schema_name, None)
+        token = get_webapi_token()
+
+        if token != request_headers['x-api-key']:
+            request_headers.update({'x-api-key': token})
+            with _get_host_limit(url):
+                response = getattr(session, method)(
+                    url, headers=request_headers, timeout=WEBAPI_TIMEOUT,
+                    **kwargs
+                )
+
+    return response
+
+
+def webapi_get(url, headers=None):
+    return _webapi_request('get', url, headers=headers)
+
+
+def webapi_put(url, data):
+    return _webapi_request('put', url, data=data)
+
+
+def get_webapi_data(url, max_age=WEBAPI_CACHE_TIMEOUT):
+    """
+    Returns data field of WEB-API response for the given url. Responses are
+    cached per tenant for max_age seconds, and revalidated afterwards using
+    entity tag. Concurrent requests for the same url wait for the one
+    already sent to WEB-API instead of sending their own.
+    """
+    key = (connection.schema_name, url)
+
+    entry = _cache.get(key)
+    if _is_fresh(entry, max_age):
+        return copy.deepcopy(entry['data'])
+
+    with _get_lock(key):
+        entry = _cache.get(key)
+        if _is_fresh(entry, max_age):
+            return copy.deepcopy(entry['data'])
+
+        headers = dict()
+        if entry and entry['etag']:
+            headers.update({'If-None-Match': entry['etag']})
+
+        response = webapi_get(url, headers=headers)
+
+        if entry and entry['etag'] and \
+                response.status_code == requests.codes.not_modified:
+            entry['fetched'] = time.monotonic()
+
+        else:
+            response.raise_for_status()
+            entry = {
+                'data': response.json()['data'],
+                'etag': response.headers.get('ETag'),
+                'fetched': time.monotonic()
+            }
+            _cache[key] = entry
+
+        return copy.deepcopy(entry['data'])
+
+
+def invalidate_webapi_data(url):
+    """
+    Drops cached WEB-API responses of the tenant for the given url and urls
+    of single resources under it.
+    """
+    for key in list(_cache.keys()):
+        if key[0] == connection.schema_name and key[1].startswith(url):
+            _cache.pop(key, None)
+
+
+def clear_webapi_data():
+    _cache.clear()
+    _tokens.clear()
+
+
+@receiver(post_save, sender=MyAPIKey)
+@receiver(post_delete, sender=MyAPIKey)
+def webapi_token_changed(sender, instance, **kwargs):
+    if instance.name == 'WEB-API':
+        _tokens.pop(connection.schema_name, None)
@@ -0,0 +1,119 @@
+from django.db import models, IntegrityError
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from Poem.poem.models import Metric
+from Poem.poem_super_admin import models as admin_models
+from Poem.tenants.models import Tenant
+
+from tenant_schemas.utils import schema_context, get_public_schema_name
+
+
+class ChangeCounterManager(models.Manager):
+    def get_by_natural_key(self, name):
+        return self.get(name=name)
+
+    def current(self, name):
+        try:
+            return self.get(name=name)
+
+        except self.model.DoesNotExist:
+            try:
+                return self.create(name=name)
+
+            except IntegrityError:
+                return self.get(name=name)
+
+    def bump(self, name):
+        updated = self.filter(name=name).update(
+            counter=F('counter') + 1, last_modified=timezone.now()
+        )
+
+        if not updated:
+            self.current(name)
+
+
+class ChangeCounter(models.Model):
+    """
+    Change counter is incremented every time tenant resource with the given
+    name is changed. It is used to tell whether the data precompiled from
+    that resource is still valid without having to rebuild it.
+    """
+    name = models.CharField(max_length=128, unique=True)
+    counter = models.PositiveIntegerField(default=0)
+    last_modified = models.DateTimeField(default=timezone.now)
+
+    objects = ChangeCounterManager()
+
+    class Meta:
+        app_label = 'poem'
+
+    def __str__(self):
+        return u'%s (%s)' % (self.name, self.counter)
+
+    def natural_key(self):
+        return (self.name,)
+
+    @property
+    def version(self):
+        return '{}-{}'.format(
+            self.counter, self.last_modified.strftime('%Y%m%d%H%M%S%f')
+        )
+
+
+def bump_change_counter(name, all_tenants=False):
+    if all_tenants:
+        schemas = list(
+            Tenant.objects.exclude(
+                schema_name=get_public_schema_name()
+            ).values_list('schema_name', flat=True)
+        )
+
+        for schema in schemas:
+            with schema_context(schema):
+                ChangeCounter.objects.bump(name)
+
+    else:
+        ChangeCounter.objects.bump(name)
+
+
+@receiver(post_save, sender=Metric)
+@receiver(post_delete, sender=Metric)
+def metric_changed(sender, instance, **kwargs):
+    bump_change_counter('metrics')
+
+
+@receiver(m2m_changed, sender=Metric.tags.through)
+def metric_tags_changed(sender, instance, action, **kwargs):
+    if action in ['post_add', 'post_remove', 'post_clear']:
+        bump_change_counter('metrics')
+
+
+@receiver(post_save, sender=admin_models.MetricTags)
+@receiver(post_delete, sender=admin_models.MetricTags)
+@receiver(post_save, sender=admin_models.ProbeHistory)
+@receiver(post_delete, sender=admin_models.ProbeHistory)
+def metric_public_data_changed(sender, instance, **kwargs):
+    bump_change_counter('metrics', all_tenants=True)
+
+
+@receiver(post_save, sender=admin_models.MetricTemplateHistory)
+@receiver(post_delete, sender=admin_models.MetricTemplateHistory)
+def metrictemplate_history_changed(sender, instance, **kwargs):
+    bump_change_counter('metrictemplates', all_tenants=True)
+
+
+@receiver(post_save, sender=admin_models.Package)
+@receiver(post_delete, sender=admin_models.Package)
+@receiver(post_save, sender=admin_models.YumRepo)
+@receiver(post_delete, sender=admin_models.YumRepo)
+def repos_public_data_changed(sender, instance, **kwargs):
+    bump_change_counter('repos', all_tenants=True)
+
+
+@receiver(m2m_changed, sender=admin_models.Package.repos.through)
+def package_repos_changed(sender, instance, action, **kwargs):
+    if action in ['post_add', 'post_remove', 'post_clear']:
+        bump_change_counter('repos', all_tenants=True)
@@ -1,15 +1,12 @@
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import connection, models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
-import json
-
 from Poem.poem.models import Metric
 from Poem.poem_super_admin import models as admin_models
-from Poem.tenants.models import Tenant
 
-from tenant_schemas.utils import schema_context, get_public_schema_name
+from tenant_schemas.utils import schema_context
 
 
 class TenantHistoryManager(models.Manager):
@@ -23,7 +20,7 @@ class TenantHistory(models.Model):
     models; unlike History model which stores versions in public Postgres
     schema.
     """
-    object_id = models.CharField(max_length=191)
+    object_id = models.PositiveIntegerField()
     serialized_data = models.TextField()
     object_repr = models.TextField()
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
@@ -35,34 +32,58 @@ class TenantHistory(models.Model):
 
     class Meta:
         app_label = 'poem'
+        indexes = [
+            models.Index(
+                fields=[
+                    'content_type', 'object_id', '-date_created', '-id'
+                ],
+                name='tenanthistory_object_idx'
+            )
+        ]
 
     def natural_key(self):
         return (self.object_repr,)
 
 
+def update_metric_history_probekeys(probekeys):
+    """
+    Sets probe name and version in all the history versions of tenant's
+    metrics using the given probe versions. Serialized data is rewritten in
+    the database with one query, instead of being loaded and saved version
+    by version.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE {history} AS history
+            SET serialized_data = jsonb_set(
+                history.serialized_data::jsonb, '{{0,fields,probekey}}',
+                jsonb_build_array(probe.name, package.version)
+            )::text
+            FROM {metric} AS metric
+            JOIN {probe} AS probe ON probe.id = metric.probekey_id
+            JOIN {package} AS package ON package.id = probe.package_id
+            WHERE history.content_type_id = %s
+            AND history.object_id = metric.id
+            AND metric.probekey_id = ANY(%s)
+            """.format(
+                history=TenantHistory._meta.db_table,
+                metric=Metric._meta.db_table,
+                probe=admin_models.ProbeHistory._meta.db_table,
+                package=admin_models.Package._meta.db_table
+            ),
+            [ContentType.objects.get_for_model(Metric).id, list(probekeys)]
+        )
+
+
 @receiver(post_save, sender=admin_models.Package)
 def update_metric_history(sender, instance, created, **kwargs):
     if not created:
-        schemas = list(
-            Tenant.objects.all().values_list('schema_name', flat=True)
+        probekeys = list(
+            admin_models.ProbeHistory.objects.filter(
+                package=instance
+            ).values_list('id', flat=True)
         )
-        schemas.remove(get_public_schema_name())
-        probes = admin_models.ProbeHistory.objects.filter(
-            package=instance
-        )
-        for schema in schemas:
+        for schema in admin_models.metric_schemas(probekey__package=instance):
             with schema_context(schema):
-                for probe in probes:
-                    metrics = Metric.objects.filter(probekey=probe)
-                    for metric in metrics:
-                        vers = TenantHistory.objects.filter(
-                            object_id=metric.id
-                        ).order_by('-date_created')
-
-                        for ver in vers:
-                            serialized_data = json.loads(ver.serialized_data)
-                            serialized_data[0]['fields']['probekey'] = [
-                                probe.name, probe.package.version
-                            ]
-                            ver.serialized_data = json.dumps(serialized_data)
-                            ver.save()
+                update_metric_history_probekeys(probekeys)
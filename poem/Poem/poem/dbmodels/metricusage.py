@@ -0,0 +1,28 @@
+from django.db import connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from Poem.poem.models import Metric
+from Poem.poem_super_admin.models import MetricUsage
+
+
+def metric_usage(metric):
+    return MetricUsage(
+        schema_name=connection.schema_name, metric_id=metric.id,
+        name=metric.name, probekey_id=metric.probekey_id
+    )
+
+
+@receiver(post_save, sender=Metric)
+def metric_saved(sender, instance, **kwargs):
+    MetricUsage.objects.update_or_create(
+        schema_name=connection.schema_name, metric_id=instance.id,
+        defaults={'name': instance.name, 'probekey_id': instance.probekey_id}
+    )
+
+
+@receiver(post_delete, sender=Metric)
+def metric_deleted(sender, instance, **kwargs):
+    MetricUsage.objects.filter(
+        schema_name=connection.schema_name, metric_id=instance.id
+    ).delete()
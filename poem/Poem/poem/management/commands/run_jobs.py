@@ -0,0 +1,40 @@
+import time
+
+from Poem.helpers.job_helpers import claim_job, run_job
+from Poem.poem_super_admin.models import Job
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = """Run jobs queued by POEM until there are no more of them. Jobs
+              are taken from the database, so any number of workers can be
+              run at the same time."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int,
+            help='Keep running, and check for new jobs every given number '
+                 'of seconds.'
+        )
+
+    def handle(self, *args, **kwargs):
+        while True:
+            job = claim_job()
+
+            if job:
+                run_job(job)
+
+                if job.status == Job.FAILED:
+                    self.stderr.write(
+                        '{}: Job {} ({}) failed: {}'.format(
+                            job.schema_name.upper(), job.id, job.func,
+                            job.result
+                        )
+                    )
+
+                continue
+
+            if not kwargs['interval']:
+                break
+
+            time.sleep(kwargs['interval'])
@@ -0,0 +1,95 @@
+import time
+
+import requests
+from Poem.api.internal_views.utils import sync_webapi
+from Poem.api.models import MyAPIKey
+from Poem.poem import models as poem_models
+from Poem.tenants.models import Tenant
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from tenant_schemas.utils import schema_context, get_public_schema_name
+
+
+def webapi_resources():
+    return {
+        'metricprofiles': (settings.WEBAPI_METRIC, poem_models.MetricProfiles),
+        'aggregations': (settings.WEBAPI_AGGREGATION, poem_models.Aggregation),
+        'thresholdsprofiles': (
+            settings.WEBAPI_THRESHOLDS, poem_models.ThresholdsProfiles
+        )
+    }
+
+
+class Command(BaseCommand):
+    help = """Synchronize metric, aggregation and thresholds profiles with
+              WEB-API. If run for public schema, profiles of all the tenants
+              are synchronized. Time of the last successful synchronization
+              of each resource is kept in change counter named
+              "sync-<resource>"."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--resource', action='append', type=str,
+            choices=list(webapi_resources().keys())
+        )
+        parser.add_argument(
+            '--interval', type=int,
+            help='Repeat synchronization every given number of seconds.'
+        )
+
+    def sync_tenant(self, schema, resources):
+        for name in resources:
+            api, model = webapi_resources()[name]
+
+            try:
+                sync_webapi(api, model)
+                poem_models.ChangeCounter.objects.bump('sync-{}'.format(name))
+
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.stderr.write(
+                    '{}: Error synchronizing {}: {}'.format(
+                        schema.upper(), name, e
+                    )
+                )
+
+            except MyAPIKey.DoesNotExist:
+                self.stderr.write(
+                    '{}: No "WEB-API" key in the DB! {} not '
+                    'synchronized.'.format(schema.upper(), name.capitalize())
+                )
+                break
+
+            # error in one tenant's resource must not stop synchronization of
+            # the others, nor the loop run with --interval
+            except Exception as e:
+                self.stderr.write(
+                    '{}: Unexpected error synchronizing {}: {!r}'.format(
+                        schema.upper(), name, e
+                    )
+                )
+
+    def sync(self, resources):
+        if connection.schema_name == get_public_schema_name():
+            schemas = list(
+                Tenant.objects.all().values_list('schema_name', flat=True)
+            )
+            schemas.remove(get_public_schema_name())
+
+            for schema in schemas:
+                with schema_context(schema):
+                    self.sync_tenant(schema, resources)
+
+        else:
+            self.sync_tenant(connection.schema_name, resources)
+
+    def handle(self, *args, **kwargs):
+        resources = kwargs['resource'] or list(webapi_resources().keys())
+
+        while True:
+            self.sync(resources)
+
+            if not kwargs['interval']:
+                break
+
+            time.sleep(kwargs['interval'])
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poem', '0018_changecounter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tenanthistory',
+            name='object_id',
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name='tenanthistory',
+            index=models.Index(fields=['content_type', 'object_id', '-date_created'], name='tenanthistory_object_idx'),
+        ),
+    ]
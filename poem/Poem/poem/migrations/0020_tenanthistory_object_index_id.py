@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poem', '0019_tenanthistory_object_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='tenanthistory',
+            name='tenanthistory_object_idx',
+        ),
+        migrations.AddIndex(
+            model_name='tenanthistory',
+            index=models.Index(fields=['content_type', 'object_id', '-date_created', '-id'], name='tenanthistory_object_idx'),
+        ),
+    ]
@@ -5,3 +5,5 @@ from Poem.poem.dbmodels.metricprofiles import *
 from Poem.poem.dbmodels.user import *
 from Poem.poem.dbmodels.history import *
 from Poem.poem.dbmodels.thresholdsprofiles import *
+from Poem.poem.dbmodels.changecounters import *
+from Poem.poem.dbmodels.metricusage import *
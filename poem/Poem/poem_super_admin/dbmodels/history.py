@@ -8,7 +8,7 @@ class HistoryManager(models.Manager):
 
 
 class History(models.Model):
-    object_id = models.CharField(max_length=191)
+    object_id = models.PositiveIntegerField()
     serialized_data = models.TextField()
     object_repr = models.TextField()
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
@@ -18,6 +18,14 @@ class History(models.Model):
 
     class Meta:
         app_label = 'poem_super_admin'
+        indexes = [
+            models.Index(
+                fields=[
+                    'content_type', 'object_id', '-date_created', '-id'
+                ],
+                name='history_object_idx'
+            )
+        ]
 
     def natural_key(self):
         return (self.object_repr,)
@@ -0,0 +1,49 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    Long running operation queued to be run outside of HTTP request by
+    poem-runjobs workers. Workers take jobs from this table, so nothing
+    besides the database is needed to run them.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    func = models.CharField(max_length=256)
+    arguments = models.TextField()
+    schema_name = models.CharField(max_length=63)
+    user = models.CharField(max_length=32, blank=True)
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=QUEUED, db_index=True
+    )
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    result = models.TextField(blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_started = models.DateTimeField(null=True, blank=True)
+    date_finished = models.DateTimeField(null=True, blank=True)
+    date_updated = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'poem_super_admin'
+
+    def __str__(self):
+        return u'%s (%s)' % (self.func, self.status)
+
+    def set_progress(self, progress, total):
+        self.progress = progress
+        self.total = total
+        self.date_updated = timezone.now()
+        Job.objects.filter(pk=self.pk).update(
+            progress=progress, total=total, date_updated=self.date_updated
+        )
@@ -95,6 +95,12 @@ class MetricTemplateHistory(models.Model):
     class Meta:
         app_label = 'poem_super_admin'
         unique_together = [['name', 'probekey']]
+        indexes = [
+            models.Index(
+                fields=['object_id', '-date_created', '-id'],
+                name='mthistory_latest_idx'
+            )
+        ]
 
     def __str__(self):
         if self.probekey:
@@ -0,0 +1,44 @@
+from django.db import models
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from Poem.poem_super_admin.dbmodels.probes import ProbeHistory
+from Poem.tenants.models import Tenant
+
+
+class MetricUsage(models.Model):
+    """
+    Index of tenants' metrics kept in public schema, so that changes made
+    across tenants only need to visit schemas where the metric exists. It is
+    kept current by signals of Metric model.
+    """
+    schema_name = models.CharField(max_length=63)
+    metric_id = models.PositiveIntegerField()
+    name = models.CharField(max_length=128, db_index=True)
+    probekey = models.ForeignKey(
+        ProbeHistory, blank=True, null=True, on_delete=models.SET_NULL
+    )
+
+    class Meta:
+        app_label = 'poem_super_admin'
+        unique_together = [['schema_name', 'metric_id']]
+
+    def __str__(self):
+        return u'%s (%s)' % (self.name, self.schema_name)
+
+
+def metric_schemas(**kwargs):
+    """
+    Returns schema names of tenants having metrics matching the given
+    lookups, e.g. metric_schemas(name='argo.AMS-Check').
+    """
+    return list(
+        MetricUsage.objects.filter(**kwargs).order_by(
+            'schema_name'
+        ).values_list('schema_name', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=Tenant)
+def tenant_deleted(sender, instance, **kwargs):
+    MetricUsage.objects.filter(schema_name=instance.schema_name).delete()
@@ -0,0 +1,105 @@
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from Poem.poem_super_admin.dbmodels.metrictemplates import MetricTemplate, \
+    MetricTemplateHistory
+from Poem.poem_super_admin.dbmodels.probes import ProbeHistory
+from Poem.poem_super_admin.dbmodels.yumrepos import OSTag, YumRepo, Package
+
+
+class MetricTemplateOSTag(models.Model):
+    """
+    Index of OS tags metric template is available for, together with the
+    newest probe version available for each of them. It is rebuilt when
+    metric template history, packages or repos change.
+    """
+    metrictemplate = models.ForeignKey(MetricTemplate, on_delete=models.CASCADE)
+    tag = models.ForeignKey(OSTag, on_delete=models.CASCADE)
+    probekey = models.ForeignKey(ProbeHistory, on_delete=models.CASCADE)
+
+    class Meta:
+        app_label = 'poem_super_admin'
+        unique_together = [['metrictemplate', 'tag']]
+
+    def __str__(self):
+        return u'%s (%s)' % (self.metrictemplate.name, self.tag.name)
+
+
+def update_metrictemplate_ostags(metrictemplates=None):
+    """
+    Rebuilds OS tags index for metric templates with the given ids, or for
+    all the metric templates if ids are not given.
+    """
+    versions = MetricTemplateHistory.objects.filter(probekey__isnull=False)
+    index = MetricTemplateOSTag.objects.all()
+    if metrictemplates is not None:
+        versions = versions.filter(object_id__in=metrictemplates)
+        index = index.filter(metrictemplate__in=metrictemplates)
+
+    entries = dict()
+    for metrictemplate, probekey, tag in versions.order_by(
+        'object_id', '-date_created', '-id'
+    ).values_list('object_id', 'probekey', 'probekey__package__repos__tag'):
+        if tag:
+            entries.setdefault((metrictemplate, tag), probekey)
+
+    with transaction.atomic():
+        index.delete()
+        MetricTemplateOSTag.objects.bulk_create([
+            MetricTemplateOSTag(
+                metrictemplate_id=metrictemplate, tag_id=tag,
+                probekey_id=probekey
+            ) for (metrictemplate, tag), probekey in entries.items()
+        ])
+
+
+def metrictemplates_with_packages(packages):
+    return list(
+        MetricTemplateHistory.objects.filter(
+            probekey__package__in=packages
+        ).values_list('object_id', flat=True).distinct()
+    )
+
+
+@receiver(post_save, sender=MetricTemplateHistory)
+def metrictemplate_history_changed(sender, instance, **kwargs):
+    update_metrictemplate_ostags([instance.object_id_id])
+
+
+@receiver(post_save, sender=ProbeHistory)
+def probe_history_changed(sender, instance, created, **kwargs):
+    if not created:
+        update_metrictemplate_ostags(
+            metrictemplates_with_packages([instance.package_id])
+        )
+
+
+@receiver(post_save, sender=YumRepo)
+def repo_changed(sender, instance, created, **kwargs):
+    if not created:
+        update_metrictemplate_ostags(
+            metrictemplates_with_packages(
+                instance.package_set.values_list('id', flat=True)
+            )
+        )
+
+
+@receiver(post_delete, sender=YumRepo)
+def repo_deleted(sender, instance, **kwargs):
+    # packages the repo was assigned to are no longer known at this point
+    update_metrictemplate_ostags()
+
+
+@receiver(m2m_changed, sender=Package.repos.through)
+def package_repos_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ['post_add', 'post_remove']:
+        if reverse:
+            packages = pk_set
+        else:
+            packages = [instance.pk]
+
+        update_metrictemplate_ostags(metrictemplates_with_packages(packages))
+
+    elif action == 'post_clear':
+        update_metrictemplate_ostags()
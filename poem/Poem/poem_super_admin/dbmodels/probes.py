@@ -53,6 +53,12 @@ class ProbeHistory(models.Model):
     class Meta:
         app_label = 'poem_super_admin'
         unique_together = [['name', 'package']]
+        indexes = [
+            models.Index(
+                fields=['object_id', '-date_created', '-id'],
+                name='probehistory_latest_idx'
+            )
+        ]
 
     def __str__(self):
         return u'%s (%s)' % (self.name, self.package.version)
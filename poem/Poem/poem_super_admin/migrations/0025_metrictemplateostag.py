@@ -0,0 +1,51 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_metrictemplate_ostags(apps, schema_editor):
+    MetricTemplateHistory = apps.get_model(
+        'poem_super_admin', 'MetricTemplateHistory'
+    )
+    MetricTemplateOSTag = apps.get_model(
+        'poem_super_admin', 'MetricTemplateOSTag'
+    )
+
+    entries = dict()
+    for metrictemplate, probekey, tag in MetricTemplateHistory.objects.filter(
+        probekey__isnull=False
+    ).order_by('object_id', '-date_created', '-id').values_list(
+        'object_id', 'probekey', 'probekey__package__repos__tag'
+    ):
+        if tag:
+            entries.setdefault((metrictemplate, tag), probekey)
+
+    MetricTemplateOSTag.objects.bulk_create([
+        MetricTemplateOSTag(
+            metrictemplate_id=metrictemplate, tag_id=tag, probekey_id=probekey
+        ) for (metrictemplate, tag), probekey in entries.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poem_super_admin', '0024_metrictemplatehistory_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricTemplateOSTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metrictemplate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='poem_super_admin.MetricTemplate')),
+                ('probekey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='poem_super_admin.ProbeHistory')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='poem_super_admin.OSTag')),
+            ],
+            options={
+                'unique_together': {('metrictemplate', 'tag')},
+            },
+        ),
+        migrations.RunPython(
+            populate_metrictemplate_ostags, migrations.RunPython.noop
+        ),
+    ]
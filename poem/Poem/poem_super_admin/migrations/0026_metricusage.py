@@ -0,0 +1,58 @@
+from django.db import migrations, models
+import django.db.models.deletion
+from tenant_schemas.utils import get_public_schema_name
+
+
+def populate_metric_usage(apps, schema_editor):
+    Tenant = apps.get_model('tenants', 'Tenant')
+    MetricUsage = apps.get_model('poem_super_admin', 'MetricUsage')
+
+    entries = []
+    with schema_editor.connection.cursor() as cursor:
+        for schema in Tenant.objects.exclude(
+            schema_name=get_public_schema_name()
+        ).values_list('schema_name', flat=True):
+            # tenant apps might not have been migrated yet
+            cursor.execute(
+                'SELECT to_regclass(%s)', ['"{}".poem_metric'.format(schema)]
+            )
+            if cursor.fetchone()[0] is None:
+                continue
+
+            cursor.execute(
+                'SELECT id, name, probekey_id FROM "{}".poem_metric'.format(
+                    schema
+                )
+            )
+            for metric_id, name, probekey in cursor.fetchall():
+                entries.append(MetricUsage(
+                    schema_name=schema, metric_id=metric_id, name=name,
+                    probekey_id=probekey
+                ))
+
+    MetricUsage.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0001_initial'),
+        ('poem_super_admin', '0025_metrictemplateostag'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricUsage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('schema_name', models.CharField(max_length=63)),
+                ('metric_id', models.PositiveIntegerField()),
+                ('name', models.CharField(db_index=True, max_length=128)),
+                ('probekey', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='poem_super_admin.ProbeHistory')),
+            ],
+            options={
+                'unique_together': {('schema_name', 'metric_id')},
+            },
+        ),
+        migrations.RunPython(populate_metric_usage, migrations.RunPython.noop),
+    ]
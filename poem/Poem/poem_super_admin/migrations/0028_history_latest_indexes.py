@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poem_super_admin', '0027_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='probehistory',
+            index=models.Index(fields=['object_id', '-date_created'], name='probehistory_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metrictemplatehistory',
+            index=models.Index(fields=['object_id', '-date_created'], name='mthistory_latest_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poem_super_admin', '0028_history_latest_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='history',
+            name='object_id',
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name='history',
+            index=models.Index(fields=['content_type', 'object_id', '-date_created'], name='history_object_idx'),
+        ),
+    ]
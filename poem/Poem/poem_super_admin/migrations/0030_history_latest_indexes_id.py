@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poem_super_admin', '0029_history_object_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='probehistory',
+            name='probehistory_latest_idx',
+        ),
+        migrations.AddIndex(
+            model_name='probehistory',
+            index=models.Index(fields=['object_id', '-date_created', '-id'], name='probehistory_latest_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='metrictemplatehistory',
+            name='mthistory_latest_idx',
+        ),
+        migrations.AddIndex(
+            model_name='metrictemplatehistory',
+            index=models.Index(fields=['object_id', '-date_created', '-id'], name='mthistory_latest_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poem_super_admin', '0030_history_latest_indexes_id'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='history',
+            name='history_object_idx',
+        ),
+        migrations.AddIndex(
+            model_name='history',
+            index=models.Index(fields=['content_type', 'object_id', '-date_created', '-id'], name='history_object_idx'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poem_super_admin', '0031_history_object_index_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='date_updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
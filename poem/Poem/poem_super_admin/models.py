@@ -2,3 +2,6 @@ from Poem.poem_super_admin.dbmodels.history import *
 from Poem.poem_super_admin.dbmodels.yumrepos import *
 from Poem.poem_super_admin.dbmodels.probes import *
 from Poem.poem_super_admin.dbmodels.metrictemplates import *
+from Poem.poem_super_admin.dbmodels.ostags import *
+from Poem.poem_super_admin.dbmodels.metricusage import *
+from Poem.poem_super_admin.dbmodels.jobs import *
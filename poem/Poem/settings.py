@@ -184,6 +184,11 @@ REST_FRAMEWORK = {
 }
 API_KEY_CUSTOM_HEADER = 'HTTP_X_API_KEY'
 
+# Jobs run by poem-runjobs workers; running job which has not reported its
+# progress for the given number of seconds is considered abandoned by its
+# worker (killed, restarted during deploy, ...)
+JOB_HEARTBEAT_TIMEOUT = 3600
+
 # Django development server settings
 # MEDIA_URL = '/poem_media/'
 # MEDIA_ROOT = '{}/usr/share/poem/media/'.format(VENV)
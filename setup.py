@@ -31,7 +31,8 @@ setup(name=NAME,
       ),
       scripts=['bin/poem-syncservtype', 'bin/poem-db', 'bin/poem-genseckey',
                'bin/poem-manage', 'bin/poem-token', 'bin/poem-tenant',
-               'bin/poem-clearsessions'],
+               'bin/poem-clearsessions', 'bin/poem-syncwebapi',
+               'bin/poem-runjobs'],
       data_files=[
           ('etc/poem', ['etc/poem.conf.template', 'etc/poem_logging.conf']),
           ('etc/cron.d/', ['cron/poem-sync', 'cron/poem-clearsessions', 'cron/poem-db_backup']),